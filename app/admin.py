@@ -1,5 +1,6 @@
 # app/admin.py
-from datetime import datetime, timedelta
+import os
+from datetime import datetime
 
 from aiogram import F
 from aiogram.types import (
@@ -10,17 +11,17 @@ from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
 )
-from aiogram.types.input_file import BufferedInputFile
+from aiogram.types.input_file import FSInputFile
+from aiogram.exceptions import TelegramBadRequest
 
-from .config import ADMIN_IDS
-from .database import Session
-from .models import Subscription, Payment
-from .reports import build_payments_xlsx, payments_stats
-from .antispam import allow_click, allow_message
-from .services import ensure_user, list_payments_since
+from .config import ADMIN_IDS, STATS_TZ
+from .models import Payment
+from .exports import export_payments_xlsx
+from .services import ensure_user, payment_stats, stats_day_start, payments_query, keyset_page, get_user_by_pay_code
 
-from .services import deactivate_subscription
+from .services import deactivate_subscription, extend_subscription
 from .config import GROUP_ID, CHANNEL_ID
+from .sender import sender
 
 # =========================
 # Pastki ADMIN MENU (doim turadi)
@@ -56,16 +57,77 @@ def stats_inline_kb():
 async def safe_edit_or_send(call: CallbackQuery, text: str, reply_markup=None):
     try:
         await call.message.edit_text(text, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        # o‘zgarmagan sahifa — yangi xabar yubormaymiz
+        if "message is not modified" in str(e):
+            return
+        await call.message.answer(text, reply_markup=reply_markup)
     except Exception:
         await call.message.answer(text, reply_markup=reply_markup)
 
 
-async def load_last_30_simple():
-    """Oxirgi 30 ta to‘lov (oddiy ro‘yxat)"""
-    from sqlalchemy import select
-    async with Session() as s:
-        res = await s.execute(select(Payment).order_by(Payment.id.desc()).limit(30))
-        return res.scalars().all()
+# =========================
+# To‘lovlar browser (keyset)
+# =========================
+# callback: pb:<yo‘nalish>:<cursor>:<provider>:<status>:<tg_id>
+#   n — cursor’dan eskiroq (id < cursor; 0 — birinchi sahifa), p — yangiroq (id > cursor)
+PB_PAGE = 10
+PB_PROVIDERS = ("", "payme", "click", "admin")
+PB_STATUSES = ("", "success", "cancelled")
+
+
+def pb_data(direction: str, cursor: int, provider: str, status: str, tg_id: int | None) -> str:
+    return f"pb:{direction}:{cursor}:{provider}:{status}:{tg_id or ''}"
+
+
+def _cycle(options: tuple, cur: str) -> str:
+    return options[(options.index(cur) + 1) % len(options)] if cur in options else options[0]
+
+
+async def load_payments_page(direction: str, cursor: int, provider: str, status: str, tg_id: int | None):
+    """returns: (qatorlar — yangisi birinchi, yangiroq bormi, eskiroq bormi). Bitta so‘rov."""
+    q = payments_query(provider=provider or None, status=status or None, tg_id=tg_id)
+    if direction == "p" and cursor:
+        rows = await keyset_page(q, Payment.id, after_id=cursor, limit=PB_PAGE + 1)
+        if rows:
+            return rows[:PB_PAGE][::-1], len(rows) > PB_PAGE, True
+        cursor = 0  # yangiroq hech narsa yo‘q — boshiga
+
+    rows = await keyset_page(q, Payment.id, before_id=cursor or None, limit=PB_PAGE + 1, desc=True)
+    return rows[:PB_PAGE], bool(cursor), len(rows) > PB_PAGE
+
+
+def payments_page_view(rows, has_newer: bool, has_older: bool, provider: str, status: str, tg_id: int | None):
+    flt = ", ".join(x for x in (provider, status, tg_id and f"user {tg_id}") if x) or "hammasi"
+    body = "\n".join(
+        f"#{r[0]} | {r[1]:%m-%d %H:%M} | {r[2]} | {r[4]} | {r[5]} so'm | {r[6]}"
+        for r in rows
+    ) or "To‘lovlar yo‘q"
+    text = f"📊 <b>To‘lovlar</b> ({flt})\n\n{body}"
+
+    nav = []
+    if rows and has_newer:
+        nav.append(InlineKeyboardButton(
+            text="⬅️ Yangiroq", callback_data=pb_data("p", rows[0][0], provider, status, tg_id)))
+    if rows and has_older:
+        nav.append(InlineKeyboardButton(
+            text="Eskiroq ➡️", callback_data=pb_data("n", rows[-1][0], provider, status, tg_id)))
+
+    kb = [nav] if nav else []
+    kb.append([
+        InlineKeyboardButton(
+            text=f"🏷 {provider or 'provider: hammasi'}",
+            callback_data=pb_data("n", 0, _cycle(PB_PROVIDERS, provider), status, tg_id)),
+        InlineKeyboardButton(
+            text=f"📌 {status or 'status: hammasi'}",
+            callback_data=pb_data("n", 0, provider, _cycle(PB_STATUSES, status), tg_id)),
+    ])
+    last = [InlineKeyboardButton(text="🔄 Boshiga", callback_data=pb_data("n", 0, provider, status, tg_id))]
+    if tg_id:
+        last.append(InlineKeyboardButton(
+            text=f"❌ user {tg_id}", callback_data=pb_data("n", 0, provider, status, None)))
+    kb.append(last)
+    return text, InlineKeyboardMarkup(inline_keyboard=kb)
 
 
 # =========================
@@ -74,24 +136,20 @@ async def load_last_30_simple():
 def register_admin(dp):
 
     # /admin
-    @dp.message(F.text == "/admin")
+    @dp.message(F.text == "/admin", flags={"throttle": 1.0})
     async def admin_panel(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=1.0):
-            return
         await msg.answer(
             "👑 <b>Admin panel</b>\nPastdagi menyudan tanlang 👇",
             reply_markup=admin_reply_kb()
         )
 
     # 👑 Mening PAY CODE (ADMIN)
-    @dp.message(F.text == "👑 Mening PAY CODE")
+    @dp.message(F.text == "👑 Mening PAY CODE", flags={"throttle": 0.8})
     async def admin_my_paycode(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=0.8):
-            return
 
         u = await ensure_user(msg.from_user.id)
         await msg.answer(
@@ -101,16 +159,15 @@ def register_admin(dp):
         )
 
     # Buyruqlar
-    @dp.message(F.text == "ℹ️ Buyruqlar")
+    @dp.message(F.text == "ℹ️ Buyruqlar", flags={"throttle": 0.8})
     async def admin_help(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=0.8):
-            return
         await msg.answer(
             "👑 <b>Admin buyruqlari</b>\n\n"
             "/admin — admin panel\n"
-            "/give USER_ID KUN — obuna berish\n\n"
+            "/give USER_ID KUN — obuna berish\n"
+            "/payments TG_ID|PAY_CODE — user to‘lovlari\n\n"
             "Pastki menyu:\n"
             "🎁 Obuna berish\n"
             "📊 To‘lovlar\n"
@@ -120,12 +177,10 @@ def register_admin(dp):
         )
 
     # Obuna berish hint
-    @dp.message(F.text == "🎁 Obuna berish")
+    @dp.message(F.text == "🎁 Obuna berish", flags={"throttle": 0.8})
     async def admin_give_hint(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=0.8):
-            return
         await msg.answer(
             "🎁 <b>Obuna berish</b>\n\n"
             "<code>/give USER_ID KUN</code>\n"
@@ -134,12 +189,10 @@ def register_admin(dp):
             reply_markup=admin_reply_kb()
         )
         # Bekor qilish hint (tugma bosilganda)
-    @dp.message(F.text == "❌ Obunani bekor qilish")
+    @dp.message(F.text == "❌ Obunani bekor qilish", flags={"throttle": 0.8})
     async def cancel_hint(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=0.8):
-            return
 
         await msg.answer(
             "❌ <b>Obunani bekor qilish</b>\n\n"
@@ -151,12 +204,10 @@ def register_admin(dp):
         )
 
           # /cancel TG_ID
-    @dp.message(F.text.startswith("/cancel"))
+    @dp.message(F.text.startswith("/cancel"), flags={"throttle": 1.0})
     async def cancel_sub(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=1.0):
-            return
 
         parts = msg.text.split()
         if len(parts) != 2:
@@ -169,7 +220,7 @@ def register_admin(dp):
             await msg.answer("Xato: TG_ID raqam bo‘lishi kerak.", reply_markup=admin_reply_kb())
             return
 
-        # 1) DB: obunani bekor qilish
+        # 1) DB: obunani bekor qilish (kesh ham shu yerda yangilanadi)
         await deactivate_subscription(tg_id)
 
         # 2) Guruh + kanaldan chiqarish (kick)
@@ -178,8 +229,8 @@ def register_admin(dp):
             if not chat_id:
                 continue
             try:
-                await bot.ban_chat_member(chat_id, tg_id)
-                await bot.unban_chat_member(chat_id, tg_id)
+                await sender.ban_chat_member(chat_id, tg_id)
+                await sender.unban_chat_member(chat_id, tg_id)
                 kicked.append(name)
             except Exception:
                 # user u yerda bo‘lmasligi mumkin yoki botda huquq yetishmasligi mumkin
@@ -187,7 +238,7 @@ def register_admin(dp):
 
         # 3) Userga xabar (private bo‘lsa)
         try:
-            await bot.send_message(
+            await sender.send_message(
                 tg_id,
                 "❌ Obunangiz bekor qilindi.\n"
                 "Guruh/kanalga kirish yopildi.\n\n"
@@ -204,12 +255,10 @@ def register_admin(dp):
             )
 
     # /give USER_ID DAYS
-    @dp.message(F.text.startswith("/give"))
+    @dp.message(F.text.startswith("/give"), flags={"throttle": 1.0})
     async def give(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=1.0):
-            return
 
         parts = msg.text.split()
         if len(parts) != 3:
@@ -223,71 +272,76 @@ def register_admin(dp):
             await msg.answer("Xato: USER_ID va KUN raqam bo‘lishi kerak.", reply_markup=admin_reply_kb())
             return
 
-        now = datetime.utcnow()
-
-        async with Session() as s:
-            sub = await s.get(Subscription, uid)
-            if sub and sub.active and sub.expires_at > now:
-                sub.expires_at = sub.expires_at + timedelta(days=days)
-            else:
-                if not sub:
-                    sub = Subscription(tg_id=uid, expires_at=now + timedelta(days=days), active=True)
-                    s.add(sub)
-                else:
-                    sub.expires_at = now + timedelta(days=days)
-                    sub.active = True
-                    sub.warned_3d = False
-                    sub.warned_1d = False
-                    sub.last_renewal_notice = None
-
-            await s.commit()
+        await extend_subscription(uid, days)
 
         await msg.answer("✅ Obuna berildi", reply_markup=admin_reply_kb())
 
-    # To‘lovlar (oxirgi 30)
-    @dp.message(F.text == "📊 To‘lovlar")
+    # To‘lovlar (browser, birinchi sahifa)
+    @dp.message(F.text == "📊 To‘lovlar", flags={"throttle": 0.8})
     async def payments(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=0.8):
+
+        page = await load_payments_page("n", 0, "", "", None)
+        text, kb = payments_page_view(*page, "", "", None)
+        await msg.answer(text, reply_markup=kb)
+
+    # /payments TG_ID yoki PAY_CODE — bitta user to‘lovlari
+    @dp.message(F.text.startswith("/payments"), flags={"throttle": 1.0})
+    async def payments_by_user(msg: Message):
+        if msg.from_user.id not in ADMIN_IDS:
             return
 
-        items = await load_last_30_simple()
-        if not items:
-            await msg.answer("📊 To‘lovlar yo‘q", reply_markup=admin_reply_kb())
+        parts = msg.text.split()
+        if len(parts) != 2 or not parts[1].isdigit():
+            await msg.answer("Format: /payments TG_ID yoki PAY_CODE", reply_markup=admin_reply_kb())
             return
 
-        text = "\n".join(
-            f"{p.created_at:%m-%d %H:%M} | {p.tg_id} | {p.provider} | {p.amount} so'm | {p.status}"
-            for p in items
-        )
-        await msg.answer("📊 <b>Oxirgi 30 ta to‘lov</b>\n\n" + text, reply_markup=admin_reply_kb())
+        # 8 xonali son pay_code ham bo‘lishi mumkin — avval shuni tekshiramiz
+        u = await get_user_by_pay_code(parts[1]) if len(parts[1]) == 8 else None
+        tg_id = u.tg_id if u else int(parts[1])
+
+        page = await load_payments_page("n", 0, "", "", tg_id)
+        text, kb = payments_page_view(*page, "", "", tg_id)
+        await msg.answer(text, reply_markup=kb)
+
+    @dp.callback_query(F.data.startswith("pb:"), flags={"throttle": 0.5})
+    async def payments_browse(call: CallbackQuery):
+        if call.from_user.id not in ADMIN_IDS:
+            await call.answer("Ruxsat yo‘q", show_alert=True)
+            return
+
+        try:
+            _, direction, cursor, provider, status, tg_id = call.data.split(":")
+            cursor = int(cursor)
+            tg_id = int(tg_id) if tg_id else None
+        except ValueError:
+            await call.answer()
+            return
+
+        page = await load_payments_page(direction, cursor, provider, status, tg_id)
+        text, kb = payments_page_view(*page, provider, status, tg_id)
+        await safe_edit_or_send(call, text, reply_markup=kb)
+        await call.answer()
 
     # Statistika entry
-    @dp.message(F.text == "📈 Statistika")
+    @dp.message(F.text == "📈 Statistika", flags={"throttle": 0.8})
     async def stats_entry(msg: Message):
         if msg.from_user.id not in ADMIN_IDS:
             return
-        if not allow_message(msg.from_user.id, delay=0.8):
-            return
         await msg.answer("📈 <b>Statistika</b>\nTanlang 👇", reply_markup=stats_inline_kb())
 
     # STAT: today
-    @dp.callback_query(F.data == "stats:today")
+    @dp.callback_query(F.data == "stats:today", flags={"throttle": 1.5})
     async def stats_today(call: CallbackQuery):
         if call.from_user.id not in ADMIN_IDS:
             await call.answer("Ruxsat yo‘q", show_alert=True)
             return
-        if not allow_click(call.from_user.id, delay=1.5):
-            await call.answer("⏳", show_alert=False)
-            return
 
-        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        rows = await list_payments_since(start)
-        st = payments_stats(rows)
+        st = await payment_stats(days=1)
 
         text = (
-            "📈 <b>Bugungi statistika (UTC)</b>\n\n"
+            f"📈 <b>Bugungi statistika ({STATS_TZ})</b>\n\n"
             f"ALL: {st.get('all', {}).get('count', 0)} ta | {st.get('all', {}).get('sum', 0):,} so'm\n"
             f"PAYME: {st.get('payme', {}).get('count', 0)} ta | {st.get('payme', {}).get('sum', 0):,} so'm\n"
             f"CLICK: {st.get('click', {}).get('count', 0)} ta | {st.get('click', {}).get('sum', 0):,} so'm\n"
@@ -296,21 +350,16 @@ def register_admin(dp):
         await call.answer()
 
     # STAT: 30d
-    @dp.callback_query(F.data == "stats:30d")
+    @dp.callback_query(F.data == "stats:30d", flags={"throttle": 1.5})
     async def stats_30d(call: CallbackQuery):
         if call.from_user.id not in ADMIN_IDS:
             await call.answer("Ruxsat yo‘q", show_alert=True)
             return
-        if not allow_click(call.from_user.id, delay=1.5):
-            await call.answer("⏳", show_alert=False)
-            return
 
-        start = datetime.utcnow() - timedelta(days=30)
-        rows = await list_payments_since(start)
-        st = payments_stats(rows)
+        st = await payment_stats(days=30)
 
         text = (
-            "📈 <b>Oxirgi 30 kun statistika (UTC)</b>\n\n"
+            f"📈 <b>Oxirgi 30 kun statistika ({STATS_TZ})</b>\n\n"
             f"ALL: {st.get('all', {}).get('count', 0)} ta | {st.get('all', {}).get('sum', 0):,} so'm\n"
             f"PAYME: {st.get('payme', {}).get('count', 0)} ta | {st.get('payme', {}).get('sum', 0):,} so'm\n"
             f"CLICK: {st.get('click', {}).get('count', 0)} ta | {st.get('click', {}).get('sum', 0):,} so'm\n"
@@ -319,56 +368,52 @@ def register_admin(dp):
         await call.answer()
 
     # XLSX: today
-    @dp.callback_query(F.data == "xlsx:today")
+    @dp.callback_query(F.data == "xlsx:today", flags={"throttle": 2.0})
     async def xlsx_today(call: CallbackQuery):
         if call.from_user.id not in ADMIN_IDS:
             await call.answer("Ruxsat yo‘q", show_alert=True)
             return
-        if not allow_click(call.from_user.id, delay=2.0):
-            await call.answer("⏳", show_alert=False)
-            return
 
-        start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        rows = await list_payments_since(start)
-        data = build_payments_xlsx(rows, "Today")
+        # statistika bilan bir xil kun chegarasi (STATS_TZ)
+        start = stats_day_start(days=1)
+        await call.answer("⏳ Tayyorlanmoqda...")
+        path = await export_payments_xlsx(start, "Today")
         fname = f"payments_today_{datetime.utcnow():%Y%m%d_%H%M}.xlsx"
 
-        await call.message.answer_document(
-            BufferedInputFile(data, filename=fname),
-            caption="📄 Bugungi Excel hisobot"
-        )
-        await call.answer()
+        try:
+            await call.message.answer_document(
+                FSInputFile(path, filename=fname),
+                caption="📄 Bugungi Excel hisobot"
+            )
+        finally:
+            os.unlink(path)
 
     # XLSX: 30d
-    @dp.callback_query(F.data == "xlsx:30d")
+    @dp.callback_query(F.data == "xlsx:30d", flags={"throttle": 2.0})
     async def xlsx_30d(call: CallbackQuery):
         if call.from_user.id not in ADMIN_IDS:
             await call.answer("Ruxsat yo‘q", show_alert=True)
             return
-        if not allow_click(call.from_user.id, delay=2.0):
-            await call.answer("⏳", show_alert=False)
-            return
 
-        start = datetime.utcnow() - timedelta(days=30)
-        rows = await list_payments_since(start)
-        data = build_payments_xlsx(rows, "Last 30 days")
+        start = stats_day_start(days=30)
+        await call.answer("⏳ Tayyorlanmoqda...")
+        path = await export_payments_xlsx(start, "Last 30 days")
         fname = f"payments_30d_{datetime.utcnow():%Y%m%d_%H%M}.xlsx"
 
-        await call.message.answer_document(
-            BufferedInputFile(data, filename=fname),
-            caption="📄 Oxirgi 30 kun Excel hisobot"
-        )
-        await call.answer()
+        try:
+            await call.message.answer_document(
+                FSInputFile(path, filename=fname),
+                caption="📄 Oxirgi 30 kun Excel hisobot"
+            )
+        finally:
+            os.unlink(path)
 
     # Back
-    @dp.callback_query(F.data == "stats:back")
+    @dp.callback_query(F.data == "stats:back", flags={"throttle": 1.0})
     async def stats_back(call: CallbackQuery):
         if call.from_user.id not in ADMIN_IDS:
             await call.answer("Ruxsat yo‘q", show_alert=True)
             return
-        if not allow_click(call.from_user.id, delay=1.0):
-            await call.answer("⏳", show_alert=False)
-            return
 
         await safe_edit_or_send(call, "📈 <b>Statistika</b>\nTanlang 👇", reply_markup=stats_inline_kb())
         await call.answer()
@@ -1,23 +1,82 @@
 # app/antispam.py
+"""
+Anti-spam dispatcher middleware sifatida.
+
+Handler o‘z kechikishini flag orqali beradi:
+
+    @dp.message(F.text == "...", flags={"throttle": 1.5})
+    @dp.callback_query(F.data == "...", flags={"throttle": 2.0, "throttle_alert": "⏳ Sekinroq 🙂"})
+
+Cheklangan update handler’ga (va DB’ga) yetib bormaydi.
+"""
 import time
-from collections import defaultdict
-
-# user_id -> last_time
-_last_click = defaultdict(float)
-_last_msg = defaultdict(float)
-
-def allow_click(user_id: int, delay: float = 2.0) -> bool:
-    """Inline tugmalar (callback) uchun anti-spam"""
-    now = time.time()
-    if now - _last_click[user_id] < delay:
-        return False
-    _last_click[user_id] = now
-    return True
-
-def allow_message(user_id: int, delay: float = 1.0) -> bool:
-    """Oddiy message bosishlar uchun (menu) anti-spam"""
-    now = time.time()
-    if now - _last_msg[user_id] < delay:
-        return False
-    _last_msg[user_id] = now
-    return True
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery
+
+
+class TtlStore:
+    """
+    user_id -> oxirgi ruxsat berilgan vaqt.
+
+    Ikki avlod: har ``ttl`` soniyada eskisi butunlay tashlanadi, shuning uchun
+    xotira faqat oxirgi 2*ttl ichida faol bo‘lgan userlar soniga bog‘liq.
+    ttl eng katta kechikishdan kichik bo‘lmasligi kerak.
+    """
+
+    def __init__(self, ttl: float, now: float | None = None):
+        self.ttl = ttl
+        self._cur: dict[int, float] = {}
+        self._old: dict[int, float] = {}
+        self._rotate_at = (time.monotonic() if now is None else now) + ttl
+
+    def last(self, key: int, now: float) -> float:
+        if now >= self._rotate_at:
+            self._old, self._cur = self._cur, {}
+            self._rotate_at = now + self.ttl
+        t = self._cur.get(key)
+        if t is None:
+            t = self._old.get(key, 0.0)
+        return t
+
+    def touch(self, key: int, now: float):
+        self._cur[key] = now
+
+    def __len__(self):
+        return len(self._cur) + len(self._old)
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    """Inner middleware: filtrlar mos kelgandan keyin, handlerdan oldin ishlaydi"""
+
+    def __init__(self, ttl: float = 10.0):
+        self.store = TtlStore(ttl)
+        self.rejected = 0
+
+    async def __call__(self, handler, event, data):
+        delay = get_flag(data, "throttle")
+        user = data.get("event_from_user")
+        if not delay or user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        if now - self.store.last(user.id, now) < delay:
+            self.rejected += 1
+            if isinstance(event, CallbackQuery):
+                alert = get_flag(data, "throttle_alert")
+                await event.answer(alert or "⏳", show_alert=bool(alert))
+            return None
+
+        self.store.touch(user.id, now)
+        return await handler(event, data)
+
+
+# xabarlar va inline tugmalar alohida hisoblanadi (avvalgidek)
+message_throttle = ThrottleMiddleware()
+click_throttle = ThrottleMiddleware()
+
+
+def setup_antispam(dp):
+    dp.message.middleware(message_throttle)
+    dp.callback_query.middleware(click_throttle)
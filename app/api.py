@@ -1,30 +1,59 @@
+import time
+
+_IMPORT_T0 = time.perf_counter()
+
+import asyncio
+import hmac
 import re
-from time import time
+from datetime import date, datetime
 
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from aiogram.types import Update
 
 from .config import (
     PUBLIC_BASE_URL, WEBHOOK_TOKEN,
     CLICK_SECRET, PAYME_SECRET,
-    ALLOWED_WEBHOOK_IPS, PAYME_AMOUNT_MULTIPLIER
+    ALLOWED_WEBHOOK_IPS,
+    WEBHOOK_RATE_LIMIT, WEBHOOK_RATE_WINDOW,
+    INTERNAL_TOKEN, TG_UPDATE_MODE,
 )
-from .database import engine, Base
+from .database import prewarm_pool, pool_stats
+from .migrations import run_migrations
+from .models import Payment, Txn
 from .payments import verify_click_signature, verify_payme_basic_auth
 from .services import (
     get_user_by_pay_code,
-    upsert_subscription,
-    add_payment,
     expected_amount_uzs,
     guess_plan_by_amount,
     get_or_create_txn,
     update_txn_state,
+    complete_payment,
+    backfill_payment_daily,
+    payments_query,
+    txns_query,
 )
-from .main import bot, dp, send_invites, setup_bot, start_scheduler, stop_bot
+from .main import bot, dp, notify_invite_outbox, setup_bot, start_scheduler, stop_bot
+from .sender import sender
+from .updates import update_queue
+from .ratelimit import RateLimiter, IpAllowlist
+from .cache import user_cache, sub_cache
+from .exports import iter_csv_gz
+from . import payme
+from .capture import webhook_capture
+from .reports import PAYMENT_HEADERS
+from .metrics import render_prometheus
+from .sqlstats import top_statements
+from .telemetry import RouteMetricsMiddleware, register_collectors
 
 
 app = FastAPI()
-_rate = {}
+# app.api import’i (aiogram, fastapi, sqlalchemy ...) — startup logida ko‘rinadi
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_T0
+webhook_limiter = RateLimiter(WEBHOOK_RATE_LIMIT, WEBHOOK_RATE_WINDOW)
+webhook_allowlist = IpAllowlist(ALLOWED_WEBHOOK_IPS)
+app.add_middleware(RouteMetricsMiddleware)
+register_collectors(webhook_limiter)
 
 
 # ------------------- health -------------------
@@ -33,6 +62,107 @@ async def health():
     return {"ok": True}
 
 
+# ------------------- internal -------------------
+def require_internal(req: Request):
+    # INTERNAL_TOKEN bo‘lmasa yoki mos kelmasa — endpoint yo‘qdek (404)
+    auth = req.headers.get("authorization", "")
+    if not INTERNAL_TOKEN or not hmac.compare_digest(auth, f"Bearer {INTERNAL_TOKEN}"):
+        raise HTTPException(status_code=404)
+
+
+@app.get("/internal/sender")
+async def internal_sender(req: Request):
+    require_internal(req)
+    return sender.stats()
+
+
+@app.get("/internal/updates")
+async def internal_updates(req: Request):
+    require_internal(req)
+    return {"mode": TG_UPDATE_MODE, **update_queue.stats()}
+
+
+@app.get("/internal/pool")
+async def internal_pool(req: Request):
+    require_internal(req)
+    return pool_stats()
+
+
+@app.get("/metrics")
+async def metrics(req: Request):
+    # Prometheus text format; scrape’da Authorization: Bearer INTERNAL_TOKEN
+    require_internal(req)
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/internal/sql")
+async def internal_sql(req: Request, limit: int = 20, sort: str = "total"):
+    """normallashtirilgan SQL bo‘yicha: ?sort=total|count|max|avg"""
+    require_internal(req)
+    try:
+        return top_statements(limit, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/internal/cache")
+async def internal_cache(req: Request):
+    require_internal(req)
+    return {"users": user_cache.stats(), "subscriptions": sub_cache.stats()}
+
+
+# ------------------- CSV export -------------------
+TXN_HEADERS = [
+    "txn_id", "created_at_utc", "performed_at_utc", "tg_id", "provider", "ext_id",
+    "amount_uzs", "plan_days", "state",
+]
+
+
+def as_datetime(v: datetime | date | None) -> datetime | None:
+    # ?since=2024-01-01 ham, ?since=2024-01-01T10:00 ham bo‘laveradi
+    if v is None or isinstance(v, datetime):
+        return v
+    return datetime(v.year, v.month, v.day)
+
+
+def csv_gz_response(body, name: str) -> StreamingResponse:
+    fname = f"{name}_{datetime.utcnow():%Y%m%d_%H%M}.csv.gz"
+    return StreamingResponse(
+        body,
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{fname}"'},
+    )
+
+
+@app.get("/internal/export/payments.csv.gz")
+async def export_payments_csv(
+    req: Request,
+    since: datetime | date | None = None,
+    until: datetime | date | None = None,
+    provider: str | None = None,
+    status: str | None = None,
+    tg_id: int | None = None,
+):
+    """since/until — UTC (until kirmaydi): ?since=2024-01-01&until=2024-02-01&provider=payme"""
+    require_internal(req)
+    q = payments_query(as_datetime(since), as_datetime(until), provider, status, tg_id)
+    return csv_gz_response(iter_csv_gz(q, Payment.id, PAYMENT_HEADERS), "payments")
+
+
+@app.get("/internal/export/txns.csv.gz")
+async def export_txns_csv(
+    req: Request,
+    since: datetime | date | None = None,
+    until: datetime | date | None = None,
+    provider: str | None = None,
+    state: str | None = None,
+):
+    """state — Txn.state (created/prepared/performed/cancelled)"""
+    require_internal(req)
+    q = txns_query(as_datetime(since), as_datetime(until), provider, state)
+    return csv_gz_response(iter_csv_gz(q, Txn.id, TXN_HEADERS), "txns")
+
+
 # ------------------- antifraud -------------------
 def get_client_ip(req: Request) -> str:
     xff = req.headers.get("x-forwarded-for")
@@ -42,22 +172,13 @@ def get_client_ip(req: Request) -> str:
 
 
 def ip_allowed(req: Request) -> bool:
-    if not ALLOWED_WEBHOOK_IPS:
+    if not webhook_allowlist:
         return True
-    allowed = {ip.strip() for ip in ALLOWED_WEBHOOK_IPS.split(",") if ip.strip()}
-    return get_client_ip(req) in allowed
+    return webhook_allowlist.allows(get_client_ip(req))
 
 
-def rate_limit_ok(ip: str, limit: int = 40, window: int = 60) -> bool:
-    now = time()
-    arr = _rate.get(ip, [])
-    arr = [t for t in arr if now - t < window]
-    if len(arr) >= limit:
-        _rate[ip] = arr
-        return False
-    arr.append(now)
-    _rate[ip] = arr
-    return True
+def rate_limit_ok(ip: str) -> bool:
+    return webhook_limiter.allow(ip)
 
 
 def anti_fraud_guard(req: Request):
@@ -72,7 +193,15 @@ def anti_fraud_guard(req: Request):
 @app.post("/tg/webhook")
 async def telegram_webhook(req: Request):
     data = await req.json()
+    webhook_capture.record("/tg/webhook", data)
     update = Update.model_validate(data)
+
+    if update_queue.running:
+        # darhol javob; to‘lib qolsa 503 — Telegram keyinroq qayta yuboradi
+        if not await update_queue.submit(update):
+            raise HTTPException(status_code=503, detail="Update queue is full")
+        return {"ok": True}
+
     await dp.feed_update(bot, update)
     return {"ok": True}
 
@@ -85,6 +214,7 @@ async def click_webhook(token: str, req: Request):
 
     anti_fraud_guard(req)
     data = await req.json()
+    webhook_capture.record("/click/{token}", data)
 
     # test rejimda CLICK_SECRET="dummy" bo‘lsa sign tekshirmaydi
     if CLICK_SECRET != "dummy":
@@ -118,7 +248,12 @@ async def click_webhook(token: str, req: Request):
     if CLICK_SECRET != "dummy" and amount_uzs != exp_amount:
         return {"error": -2, "error_note": "Incorrect amount"}
 
-    await get_or_create_txn("click", click_trans_id, u.tg_id, plan_days, amount_uzs)
+    txn = await get_or_create_txn("click", click_trans_id, u.tg_id, plan_days, amount_uzs)
+    # prepare’dagi txn boshqa foydalanuvchi/summa bilan perform qilinmasin
+    if txn.tg_id != u.tg_id:
+        return {"error": -4, "error_note": "PAY CODE does not match transaction"}
+    if txn.amount_uzs != amount_uzs:
+        return {"error": -2, "error_note": "Incorrect amount"}
 
     # action==0 (prepare), action==1 (perform)
     if action == 0:
@@ -126,16 +261,21 @@ async def click_webhook(token: str, req: Request):
         return {"error": 0, "error_note": "Success"}
 
     if action == 1:
-        await update_txn_state("click", click_trans_id, "performed")
-        exp = await upsert_subscription(u.tg_id, plan_days)
-        await add_payment(u.tg_id, "click", amount_uzs, "success", plan_days, ext_id=click_trans_id)
-        await send_invites(u.tg_id)
-        return {"error": 0, "error_note": "Success", "expires_at_utc": exp.isoformat()}
+        # DB ishlari bitta tranzaksiyada; invite’larni outbox worker yuboradi.
+        # Takroriy action==1 — yozuvsiz, saqlangan natija qaytadi
+        done = await complete_payment("click", click_trans_id)
+        if done.state == "cancelled":
+            return {"error": -9, "error_note": "Transaction cancelled"}
+        if not done.ok:
+            return {"error": -6, "error_note": "Transaction does not exist"}
+        notify_invite_outbox()
+        exp = done.expires_at.isoformat() if done.expires_at else None
+        return {"error": 0, "error_note": "Success", "expires_at_utc": exp}
 
     return {"error": -3, "error_note": "Unknown action"}
 
 
-# ------------------- payme webhook (JSON-RPC minimal) -------------------
+# ------------------- payme webhook (JSON-RPC) -------------------
 @app.post("/payme/{token}")
 async def payme_webhook(token: str, req: Request):
     if token != WEBHOOK_TOKEN:
@@ -143,84 +283,103 @@ async def payme_webhook(token: str, req: Request):
 
     anti_fraud_guard(req)
 
-    # prod rejimda basic auth kerak; testda PAYME_SECRET="dummy"
-    if PAYME_SECRET != "dummy":
-        if not verify_payme_basic_auth(req.headers, PAYME_SECRET):
-            raise HTTPException(status_code=401, detail="Unauthorized")
-
-    data = await req.json()
-    method = data.get("method")
-    params = data.get("params", {}) or {}
-
-    account = params.get("account", {}) or {}
-    raw = str(account.get("pay_code") or account.get("user_id") or "").strip()
-    pay_code = re.sub(r"\D", "", raw)
-
-    amount_tiyin = int(params.get("amount", 0) or 0)
-    amount_uzs = amount_tiyin // PAYME_AMOUNT_MULTIPLIER if amount_tiyin else 0
-
-    if not pay_code:
-        return {"error": {"code": -31050, "message": "Empty PAY CODE"}}
+    # Payme protokoli: xatolar ham HTTP 200 + JSON-RPC error
+    try:
+        data = await req.json()
+    except ValueError:
+        return payme.rpc_error(None, -32700)
+    if not isinstance(data, dict):
+        return payme.rpc_error(None, -32600)
+    req_id = data.get("id")
 
-    u = await get_user_by_pay_code(pay_code)
-    if not u:
-        return {"error": {"code": -31050, "message": "Invalid PAY CODE"}}
+    # prod rejimda basic auth kerak; testda PAYME_SECRET="dummy"
+    strict = PAYME_SECRET != "dummy"
+    if strict and not verify_payme_basic_auth(req.headers, PAYME_SECRET):
+        return payme.rpc_error(req_id, -32504)
 
-    plan_days = int(account.get("plan_days", 0) or 0)
-    if plan_days not in (7, 30, 90):
-        guessed = guess_plan_by_amount(amount_uzs)
-        if not guessed:
-            return {"error": {"code": -31001, "message": "Unknown plan by amount"}}
-        plan_days = guessed
+    webhook_capture.record("/payme/{token}", data)
 
-    exp_amount = expected_amount_uzs(plan_days)
-
-    if method == "CheckPerformTransaction":
-        if PAYME_SECRET != "dummy" and amount_uzs != exp_amount:
-            return {"error": {"code": -31001, "message": "Incorrect amount"}}
-        return {"result": {"allow": True}}
+    if data.get("method") == "GetStatement":
+        try:
+            since, until = payme.statement_range(data.get("params") or {})
+        except payme.PaymeError as e:
+            return payme.rpc_error(req_id, e.code, e.data)
+        return StreamingResponse(payme.iter_statement(req_id, since, until), media_type="application/json")
 
-    if method == "PerformTransaction":
-        payme_txn_id = str(params.get("id") or data.get("id") or "payme-txn")
-        await get_or_create_txn("payme", payme_txn_id, u.tg_id, plan_days, amount_uzs)
+    return await payme.dispatch(data, strict)
 
-        if PAYME_SECRET != "dummy" and amount_uzs != exp_amount:
-            return {"error": {"code": -31001, "message": "Incorrect amount"}}
 
-        await update_txn_state("payme", payme_txn_id, "performed")
-        exp = await upsert_subscription(u.tg_id, plan_days)
-        await add_payment(u.tg_id, "payme", amount_uzs, "success", plan_days, ext_id=payme_txn_id)
-        await send_invites(u.tg_id)
+# ------------------- startup/shutdown -------------------
+WEBHOOK_ALLOWED_UPDATES = ["message", "callback_query", "chat_member", "my_chat_member"]
 
-        return {"result": {"transaction": payme_txn_id, "state": 2, "expires_at_utc": exp.isoformat()}}
 
-    return {"error": {"code": -32601, "message": "Method not found"}}
+async def timed(phases: dict, name: str, aw):
+    t0 = time.perf_counter()
+    try:
+        return await aw
+    finally:
+        phases[name] = time.perf_counter() - t0
+
+
+async def ensure_webhook() -> str:
+    """
+    Webhook allaqachon shu URL va allowed_updates bilan turgan bo‘lsa — tegmaymiz
+    (har restartda drop_pending_updates navbatdagi update’larni yo‘qotardi).
+    returns: "unchanged" | "set" | "error"
+    """
+    url = f"{PUBLIC_BASE_URL}/tg/webhook"
+    try:
+        info = await bot.get_webhook_info()
+        if info.url == url and set(info.allowed_updates or ()) == set(WEBHOOK_ALLOWED_UPDATES):
+            return "unchanged"
+        await bot.set_webhook(url, allowed_updates=WEBHOOK_ALLOWED_UPDATES, drop_pending_updates=True)
+        return "set"
+    except Exception as e:
+        # Xato bo‘lsa ham server yiqilmasin:
+        print("WEBHOOK SET ERROR:", repr(e))
+        return "error"
+
+
+async def init_db(phases: dict):
+    # pool prewarm migratsiyalar bilan parallel (versiya joriy bo‘lsa — bitta SELECT)
+    applied, _ = await asyncio.gather(
+        timed(phases, "migrations", run_migrations()),
+        timed(phases, "pool_prewarm", prewarm_pool()),
+    )
+    if applied:
+        print("migrations applied:", applied)
+    filled = await timed(phases, "rollup_backfill", backfill_payment_daily())
+    if filled:
+        print("payment_daily backfill:", ", ".join(filled))
 
 
-# ------------------- startup/shutdown -------------------
 @app.on_event("startup")
 async def startup():
-    # 1) DB init
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    t0 = time.perf_counter()
+    phases: dict[str, float] = {"imports": IMPORT_SECONDS}
 
-    # 2) dp ga handlerlarni ulash
+    # 1) dp ga handlerlarni ulash
     setup_bot()
+    if TG_UPDATE_MODE == "queue":
+        update_queue.start(lambda update: dp.feed_update(bot, update))
+    phases["handlers"] = time.perf_counter() - t0
 
-    # 3) Telegram webhook set (MUHIM: try/except!)
+    # 2) DB va Telegram webhook bir-biriga bog‘liq emas — parallel
+    webhook = "disabled"
     if PUBLIC_BASE_URL:
-        try:
-            await bot.set_webhook(
-                f"{PUBLIC_BASE_URL}/tg/webhook",
-                allowed_updates=["message", "callback_query", "chat_member", "my_chat_member"],
-                drop_pending_updates=True
-            )
-        except Exception as e:
-            # Xato bo‘lsa ham server yiqilmasin:
-            print("WEBHOOK SET ERROR:", repr(e))
-
-    # 4) scheduler
+        _, webhook = await asyncio.gather(init_db(phases), timed(phases, "webhook", ensure_webhook()))
+    else:
+        await init_db(phases)
+
+    # 3) scheduler
+    t = time.perf_counter()
     start_scheduler(app)
+    phases["scheduler"] = time.perf_counter() - t
+
+    print(
+        f"startup {time.perf_counter() - t0:.3f}s (webhook: {webhook}): "
+        + ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in phases.items())
+    )
 
 
 @app.on_event("shutdown")
@@ -232,4 +391,11 @@ async def shutdown():
     except Exception:
         pass
 
+    worker = getattr(app.state, "invite_worker", None)
+    if worker:
+        worker.cancel()
+
+    await update_queue.stop()
+    webhook_capture.close()
+
     await stop_bot()
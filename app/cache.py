@@ -0,0 +1,103 @@
+# app/cache.py
+"""Jarayon ichidagi kichik keshlar (LRU + TTL)."""
+import time
+from collections import OrderedDict
+
+from .config import USER_CACHE_SIZE, USER_CACHE_TTL, SUB_CACHE_SIZE, SUB_CACHE_TTL
+
+MISSING = object()
+
+
+class LruTtlCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # har bir invalidate’da oshadi — eski o‘qish yangi yozuvni bosib ketmasin
+        self.version = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        value, expires = item
+        if expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set_if_unchanged(self, key, value, version: int):
+        """Read-through to‘ldirish: o‘qish davomida yozuv bo‘lmagan bo‘lsagina"""
+        if self.version == version:
+            self.set(key, value)
+
+    def invalidate(self, key, value=MISSING):
+        """Yozuvdan keyin: yangi qiymatni qo‘yadi yoki kalitni o‘chiradi"""
+        self.version += 1
+        if value is MISSING:
+            self._data.pop(key, None)
+        else:
+            self.set(key, value)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class UserCache:
+    """tg_id -> User va pay_code -> User (pay_code berilgandan keyin o‘zgarmaydi)"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.by_tg = LruTtlCache(maxsize, ttl)
+        self.by_code = LruTtlCache(maxsize, ttl)
+
+    def get_by_tg(self, tg_id: int):
+        return self.by_tg.get(tg_id, None)
+
+    def get_by_code(self, pay_code: str):
+        return self.by_code.get(pay_code, None)
+
+    def put(self, user):
+        self.by_tg.set(user.tg_id, user)
+        self.by_code.set(user.pay_code, user)
+
+    def clear(self):
+        self.by_tg.clear()
+        self.by_code.clear()
+
+    def stats(self) -> dict:
+        return {"by_tg_id": self.by_tg.stats(), "by_pay_code": self.by_code.stats()}
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+# tg_id -> SubStatus yoki None (obuna yo‘q — bu ham keshlanadi)
+sub_cache = LruTtlCache(SUB_CACHE_SIZE, SUB_CACHE_TTL)
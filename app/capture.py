@@ -0,0 +1,206 @@
+# app/capture.py
+"""
+Webhook body’larini yozib olish (WEBHOOK_CAPTURE_PATH) — dev’da qayta
+o‘ynatish uchun (python -m bench.load --replay ...).
+
+Fayl append-only JSON lines: {"t": unix vaqt, "route": "/click/{token}", "body": {...}}.
+Yozishdan oldin tozalanadi:
+- tg_id / user id va PAY CODE’lar kalitli hash bilan soxtalashtiriladi
+  (bitta user — bitta soxta id, tartib va takrorlar saqlanadi)
+- ism, username, erkin matn, kontakt/media yozilmaydi; menyu tugmalari,
+  /buyruqlar va callback_data qoladi (ichidagi tg_id ham soxtalashtiriladi)
+- imzo / auth maydonlari tashlanadi
+Token (URL’dagi) va header’lar umuman yozilmaydi.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import time
+
+from .config import WEBHOOK_CAPTURE_PATH, WEBHOOK_CAPTURE_SAMPLE, WEBHOOK_CAPTURE_SALT
+
+log = logging.getLogger(__name__)
+
+# bot menyusi (main.py / admin.py) — bu matnlar shaxsiy emas, replay uchun kerak
+MENU_TEXTS = {
+    "💳 To‘lov qilish", "👤 Obunam", "🔄 Yangilash", "ℹ️ Yordam",
+    "🎁 Obuna berish", "📊 To‘lovlar", "📈 Statistika", "ℹ️ Buyruqlar",
+    "👑 Mening PAY CODE", "❌ Obunani bekor qilish",
+}
+MESSAGE_KEYS = ("message_id", "date", "chat", "from", "text", "entities", "new_chat_members", "left_chat_member")
+CLICK_KEYS = ("click_trans_id", "service_id", "merchant_trans_id", "amount", "action", "sign_time", "plan_days", "error")
+
+
+class Pseudonymizer:
+    def __init__(self, salt: bytes):
+        self.salt = salt
+
+    def _digest(self, value) -> int:
+        return int.from_bytes(hmac.new(self.salt, str(value).encode(), hashlib.sha256).digest()[:8], "big")
+
+    def user_id(self, v):
+        # manfiy — guruh/kanal (bizning GROUP_ID/CHANNEL_ID), o‘zgarmaydi
+        if not isinstance(v, int) or v < 0:
+            return v
+        return 7_000_000_000 + self._digest(v) % 1_000_000_000
+
+    def pay_code(self, v):
+        s = str(v or "")
+        if not s:
+            return v
+        return str(self._digest(s) % 10 ** len(s)).zfill(len(s))
+
+
+def _text(v):
+    if not isinstance(v, str):
+        return v
+    if v in MENU_TEXTS:
+        return v
+    if v.startswith("/"):
+        return v.split()[0]  # faqat buyruq, argumentlarsiz
+    return "x" * min(len(v), 64)
+
+
+def _callback_data(v, p: Pseudonymizer):
+    # admin to‘lovlar browser’i: pb:<yo‘nalish>:<cursor>:<provider>:<status>:<tg_id>
+    if isinstance(v, str) and v.startswith("pb:"):
+        parts = v.split(":")
+        if len(parts) == 6 and parts[5].isdigit():
+            parts[5] = str(p.user_id(int(parts[5])))
+            return ":".join(parts)
+    return v
+
+
+def _user(u: dict, p: Pseudonymizer) -> dict:
+    return {
+        "id": p.user_id(u.get("id")),
+        "is_bot": u.get("is_bot", False),
+        "first_name": "user",
+        "language_code": u.get("language_code"),
+    }
+
+
+def _chat(c: dict, p: Pseudonymizer) -> dict:
+    out = {"id": p.user_id(c.get("id")), "type": c.get("type")}
+    if c.get("type") == "private":
+        out["first_name"] = "user"
+    elif c.get("title"):
+        out["title"] = "chat"
+    return out
+
+
+def _message(m: dict, p: Pseudonymizer) -> dict:
+    out = {k: m[k] for k in MESSAGE_KEYS if k in m}
+    if "chat" in out:
+        out["chat"] = _chat(out["chat"], p)
+    if "from" in out:
+        out["from"] = _user(out["from"], p)
+    if "text" in out:
+        out["text"] = _text(out["text"])
+        if out["text"] != m["text"]:
+            out.pop("entities", None)
+    if "new_chat_members" in out:
+        out["new_chat_members"] = [_user(u, p) for u in out["new_chat_members"]]
+    if "left_chat_member" in out:
+        out["left_chat_member"] = _user(out["left_chat_member"], p)
+    return out
+
+
+def _member(cm: dict, p: Pseudonymizer) -> dict:
+    return {**cm, "user": _user(cm.get("user") or {}, p)}
+
+
+def sanitize_update(data: dict, p: Pseudonymizer) -> dict:
+    out = {"update_id": data.get("update_id")}
+    if "message" in data:
+        out["message"] = _message(data["message"], p)
+    if "callback_query" in data:
+        cq = data["callback_query"]
+        out["callback_query"] = {
+            "id": cq.get("id"),
+            "from": _user(cq.get("from") or {}, p),
+            "chat_instance": cq.get("chat_instance", ""),
+            "data": _callback_data(cq.get("data"), p),
+            **({"message": _message(cq["message"], p)} if cq.get("message") else {}),
+        }
+    for key in ("chat_member", "my_chat_member"):
+        if key in data:
+            ev = data[key]
+            out[key] = {
+                "chat": _chat(ev.get("chat") or {}, p),
+                "from": _user(ev.get("from") or {}, p),
+                "date": ev.get("date"),
+                "old_chat_member": _member(ev.get("old_chat_member") or {}, p),
+                "new_chat_member": _member(ev.get("new_chat_member") or {}, p),
+            }
+    return out
+
+
+def sanitize_click(data: dict, p: Pseudonymizer) -> dict:
+    out = {k: data[k] for k in CLICK_KEYS if k in data}
+    if "merchant_trans_id" in out:
+        out["merchant_trans_id"] = p.pay_code(out["merchant_trans_id"])
+    return out
+
+
+def sanitize_payme(data: dict, p: Pseudonymizer) -> dict:
+    params = dict(data.get("params") or {})
+    account = dict(params.get("account") or {})
+    for k in ("pay_code", "user_id"):
+        if k in account:
+            account[k] = p.pay_code(account[k])
+    if account:
+        params["account"] = account
+    return {"id": data.get("id"), "method": data.get("method"), "params": params}
+
+
+SANITIZERS = {
+    "/tg/webhook": sanitize_update,
+    "/click/{token}": sanitize_click,
+    "/payme/{token}": sanitize_payme,
+}
+
+
+class WebhookCapture:
+    """
+    Sinxron append (bufferli fayl): bitta qator ~mikrosekundlar, flush —
+    bufer to‘lganda va close() da. Yiqilishda oxirgi bir necha KB yo‘qolishi
+    mumkin — replay uchun farqi yo‘q.
+    """
+
+    def __init__(self, path: str, sample: float = 1.0, salt: bytes = b""):
+        self.path = path
+        self.sample = sample
+        self.pseudo = Pseudonymizer(salt or os.urandom(16))
+        self.written = 0
+        self._f = None
+
+    def __bool__(self):
+        return bool(self.path)
+
+    def record(self, route: str, data: dict):
+        if not self.path or (self.sample < 1.0 and random.random() >= self.sample):
+            return
+        try:
+            body = SANITIZERS[route](data, self.pseudo)
+            if self._f is None:
+                self._f = open(self.path, "a", encoding="utf-8")
+            self._f.write(json.dumps({"t": round(time.time(), 3), "route": route, "body": body},
+                                     ensure_ascii=False) + "\n")
+            self.written += 1
+        except Exception as e:
+            # capture webhook javobiga hech qachon ta’sir qilmasin
+            log.warning("webhook capture: %r", e)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+webhook_capture = WebhookCapture(
+    WEBHOOK_CAPTURE_PATH, WEBHOOK_CAPTURE_SAMPLE, WEBHOOK_CAPTURE_SALT.encode(),
+)
@@ -1,5 +1,6 @@
 # app/config.py
 import os
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,6 +9,10 @@ def _get_int(name: str, default: int = 0) -> int:
     v = (os.getenv(name, "") or "").strip()
     return int(v) if v else default
 
+def _get_float(name: str, default: float = 0.0) -> float:
+    v = (os.getenv(name, "") or "").strip()
+    return float(v) if v else default
+
 def _get_set_int(name: str) -> set[int]:
     raw = (os.getenv(name, "") or "").strip()
     if not raw:
@@ -15,6 +20,8 @@ def _get_set_int(name: str) -> set[int]:
     return {int(x.strip()) for x in raw.split(",") if x.strip()}
 
 BOT_TOKEN = (os.getenv("BOT_TOKEN", "") or "").strip()
+# Bot API server (default api.telegram.org); lokal simulyator: python -m bench.tgsim
+TELEGRAM_API_URL = (os.getenv("TELEGRAM_API_URL", "") or "").rstrip("/")
 
 # ADMIN_IDS="123,456"
 ADMIN_IDS = _get_set_int("ADMIN_IDS")
@@ -31,7 +38,75 @@ WEBHOOK_TOKEN = (os.getenv("WEBHOOK_TOKEN", "change-me") or "change-me").strip()
 PAYME_PAY_URL = (os.getenv("PAYME_PAY_URL", "") or "").strip()
 CLICK_PAY_URL = (os.getenv("CLICK_PAY_URL", "") or "").strip()
 
-ALLOWED_WEBHOOK_IPS = (os.getenv("ALLOWED_WEBHOOK_IPS", "") or "").strip()
+ALLOWED_WEBHOOK_IPS = (os.getenv("ALLOWED_WEBHOOK_IPS", "") or "").strip()  # IP yoki CIDR, vergul bilan
+WEBHOOK_RATE_LIMIT = max(_get_int("WEBHOOK_RATE_LIMIT", 40), 1)   # so‘rov
+WEBHOOK_RATE_WINDOW = max(_get_int("WEBHOOK_RATE_WINDOW", 60), 1) # soniya
+
+# muddati o‘tganlarni chiqarishda bir vaqtda nechta ban so‘rovi yuborilsin
+KICK_CONCURRENCY = max(_get_int("KICK_CONCURRENCY", 8), 1)
+
+# obuna tugashi haqida eslatma jobi necha daqiqada bir ishlaydi
+REMINDER_INTERVAL_MIN = max(_get_int("REMINDER_INTERVAL_MIN", 5), 1)
+
+# tg_id <-> pay_code keshi (app/cache.py)
+USER_CACHE_SIZE = _get_int("USER_CACHE_SIZE", 50000)
+USER_CACHE_TTL = _get_int("USER_CACHE_TTL", 3600)  # soniya
+
+# obuna holati keshi (active + expires_at)
+SUB_CACHE_SIZE = _get_int("SUB_CACHE_SIZE", 100000)
+SUB_CACHE_TTL = _get_int("SUB_CACHE_TTL", 300)
+
+# invite outbox worker
+INVITE_POLL_SEC = max(_get_int("INVITE_POLL_SEC", 5), 1)
+INVITE_MAX_ATTEMPTS = max(_get_int("INVITE_MAX_ATTEMPTS", 12), 1)
+INVITE_RETRY_BASE_SEC = max(_get_int("INVITE_RETRY_BASE_SEC", 10), 1)
+
+# Telegram'ga chiquvchi navbat (app/sender.py)
+TG_GLOBAL_RATE = _get_float("TG_GLOBAL_RATE", 30.0)   # so‘rov/soniya, hamma chatlar
+TG_CHAT_RATE = _get_float("TG_CHAT_RATE", 1.0)        # xabar/soniya, bitta chat
+TG_MAX_INFLIGHT = max(_get_int("TG_MAX_INFLIGHT", 16), 1)
+
+# /tg/webhook: "inline" — feed_update tugaguncha kutadi,
+# "queue" — navbatga qo‘yib darhol javob beradi (app/updates.py)
+TG_UPDATE_MODE = (os.getenv("TG_UPDATE_MODE", "inline") or "inline").strip().lower()
+TG_UPDATE_WORKERS = max(_get_int("TG_UPDATE_WORKERS", 8), 1)
+TG_UPDATE_QUEUE_SIZE = max(_get_int("TG_UPDATE_QUEUE_SIZE", 1000), 1)
+TG_UPDATE_PUT_TIMEOUT = _get_float("TG_UPDATE_PUT_TIMEOUT", 2.0)  # navbat to‘la bo‘lsa kutish, s
+
+# statistikada kun chegarasi shu vaqt zonasida (Postgres tz nomi)
+STATS_TZ = (os.getenv("STATS_TZ", "Asia/Tashkent") or "Asia/Tashkent").strip()
+# xato nom har to‘lov commit’ini (rollup SQL) yiqitadi — startup’da to‘xtaymiz
+try:
+    ZoneInfo(STATS_TZ)
+except (ZoneInfoNotFoundError, ValueError):
+    raise RuntimeError(f"STATS_TZ noto‘g‘ri vaqt zonasi: {STATS_TZ!r}")
+# payment_daily rollup shu zonalar uchun yuritiladi
+STATS_ROLLUP_TZS = tuple(dict.fromkeys(["UTC", "Asia/Tashkent", STATS_TZ]))
+
+# DB connection pool (app/database.py)
+DB_POOL_SIZE = max(_get_int("DB_POOL_SIZE", 5), 1)
+DB_MAX_OVERFLOW = max(_get_int("DB_MAX_OVERFLOW", 10), 0)
+DB_POOL_TIMEOUT = _get_float("DB_POOL_TIMEOUT", 30.0)     # bo‘sh ulanish kutish, s
+DB_POOL_RECYCLE = _get_int("DB_POOL_RECYCLE", 1800)       # s; -1 — o‘chiq
+DB_PRE_PING = _get_int("DB_PRE_PING", 1) == 1             # har checkout’da ping (+1 round trip)
+DB_POOL_PREWARM = _get_int("DB_POOL_PREWARM", DB_POOL_SIZE)
+# asyncpg prepared statement keshi (ulanish boshiga). Default 100 — Postgres’ga
+# to‘g‘ridan-to‘g‘ri ulanish uchun; pgbouncer (transaction mode) orqasida 0 qo‘ying —
+# shunda asyncpg’ning o‘z keshi ham o‘chadi va statement nomlari takrorlanmaydi (database.py)
+DB_STATEMENT_CACHE_SIZE = max(_get_int("DB_STATEMENT_CACHE_SIZE", 100), 0)
+
+# SQL instrumentatsiya (app/sqlstats.py)
+SQL_SLOW_MS = _get_float("SQL_SLOW_MS", 200.0)        # bundan sekin so‘rov — WARNING log
+SQL_QUERY_WARN = _get_int("SQL_QUERY_WARN", 10)       # bitta update/HTTP so‘rovda shundan ko‘p — WARNING
+
+# webhook body’larini tozalab yozib olish (app/capture.py); bo‘sh — o‘chiq
+WEBHOOK_CAPTURE_PATH = (os.getenv("WEBHOOK_CAPTURE_PATH", "") or "").strip()
+WEBHOOK_CAPTURE_SAMPLE = _get_float("WEBHOOK_CAPTURE_SAMPLE", 1.0)   # 0..1
+# soxta id’lar uchun kalit; bo‘sh bo‘lsa har restartda yangi (id’lar run’lar orasida bog‘lanmaydi)
+WEBHOOK_CAPTURE_SALT = (os.getenv("WEBHOOK_CAPTURE_SALT", "") or "").strip()
+
+# /internal/* endpointlar uchun (Authorization: Bearer ...). Bo‘sh bo‘lsa — o‘chiq
+INTERNAL_TOKEN = (os.getenv("INTERNAL_TOKEN", "") or "").strip()
 
 PLAN_PRICES_UZS = {
     7: int(os.getenv("PLAN_7", "20000")),
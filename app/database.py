@@ -1,6 +1,19 @@
+import asyncio
 import os
+import time
+from uuid import uuid4
+
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .config import (
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_PRE_PING,
+    DB_POOL_PREWARM, DB_STATEMENT_CACHE_SIZE,
+)
+from .metrics import Histogram
+from .sqlstats import instrument_engine
 
 DATABASE_URL = (os.getenv("DATABASE_URL", "") or "").strip()
 if not DATABASE_URL:
@@ -13,6 +26,93 @@ if DATABASE_URL.startswith("postgres://"):
 elif DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-engine = create_async_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+
+
+class PoolMetrics:
+    """Pool qayta yaratilsa (dispose) ham saqlanib qoladi"""
+
+    def __init__(self):
+        self.checkout = Histogram()  # ulanish olish vaqti (kutish + yangi ulanish)
+        self.waits = 0               # pool to‘la — bo‘shashini kutgan checkout’lar
+        self.timeouts = 0
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Checkout vaqti, kutishlar va timeout’lar. Public pool event’larida
+    "checkout boshlandi" hodisasi yo‘q, shuning uchun QueuePool._do_get
+    o‘raladi — private API: SQLAlchemy requirements.txt’da pin qilingan,
+    tests/test_database.py versiya o‘zgarsa buzilishni ushlaydi.
+    """
+
+    def _do_get(self):
+        if self._max_overflow > -1 and self._overflow >= self._max_overflow and self._pool.empty():
+            pool_metrics.waits += 1
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.checkout.observe(time.perf_counter() - t0)
+
+
+connect_args = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+if DB_STATEMENT_CACHE_SIZE == 0:
+    # pgbouncer transaction mode: ulanish tranzaksiyalar orasida almashadi —
+    # asyncpg’ning o‘z keshi ham o‘chadi, nomlangan statement’lar to‘qnashmaydi
+    connect_args["statement_cache_size"] = 0
+    connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_PRE_PING,
+    connect_args=connect_args,
+)
+instrument_engine(engine)
+# bitta statement’li atomar yozuvlar uchun: BEGIN/COMMIT round trip’lari yo‘q
+autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
 Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
+
+
+async def prewarm_pool(n: int | None = None) -> int:
+    """
+    Pool’ga n ta ulanishni oldindan ochadi (default — DB_POOL_PREWARM), birinchi
+    so‘rovlar TCP/auth kutmasin. returns: ochilganlar soni
+    """
+    # pool_size’dan ortig‘i (overflow) qaytarilganda baribir yopiladi
+    n = min(DB_POOL_PREWARM if n is None else n, engine.pool.size())
+    # hammasi bir vaqtda ushlab turiladi — aks holda pool bitta ulanishni qayta beradi
+    conns = await asyncio.gather(*(engine.connect().start() for _ in range(n)), return_exceptions=True)
+    ok = [c for c in conns if not isinstance(c, BaseException)]
+    await asyncio.gather(*(c.close() for c in ok))
+    return len(ok)
+
+
+def pool_stats() -> dict:
+    p = engine.pool
+    return {
+        "size": p.size(),
+        "checked_out": p.checkedout(),
+        "checked_in": p.checkedin(),
+        "overflow": p.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "timeout_s": DB_POOL_TIMEOUT,
+        "recycle_s": DB_POOL_RECYCLE,
+        "pre_ping": DB_PRE_PING,
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "waits": pool_metrics.waits,
+        "timeouts": pool_metrics.timeouts,
+        "checkout": pool_metrics.checkout.snapshot(),
+    }
@@ -0,0 +1,104 @@
+# app/exports.py
+"""
+Eksportlar event loop’ni to‘smasdan.
+
+XLSX: DB’dan server-side cursor bilan batch-batch o‘qiladi, openpyxl
+(write-only) alohida thread’da temp faylga yozadi. Orada chegaralangan
+queue — writer sekin bo‘lsa o‘qish ham to‘xtab turadi.
+
+CSV (gzip): keyset sahifalar bilan o‘qilib, HTTP javobga oqim bo‘lib ketadi.
+
+Ikkalasida ham xotira qator soniga bog‘liq emas.
+"""
+import asyncio
+import csv
+import io
+import os
+import queue
+import tempfile
+import zlib
+from contextlib import aclosing
+from datetime import datetime
+
+from .reports import write_payments_xlsx
+from .services import stream_payments_since, keyset_page
+
+_DONE = object()
+
+# bir vaqtda bitta eksport: openpyxl CPU’ni band qiladi
+_export_lock = asyncio.Lock()
+
+
+async def export_payments_xlsx(since: datetime, title: str, batch: int = 2000, max_batches: int = 4) -> str:
+    """
+    Temp .xlsx fayl yo‘lini qaytaradi. Faylni chaqiruvchi o‘chiradi.
+    """
+    fd, path = tempfile.mkstemp(prefix="payments_", suffix=".xlsx")
+    os.close(fd)
+
+    q: queue.Queue = queue.Queue(maxsize=max_batches)
+
+    def batches():
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            yield item
+
+    async with _export_lock:
+        writer = asyncio.create_task(asyncio.to_thread(write_payments_xlsx, batches(), title, path))
+        try:
+            async with aclosing(stream_payments_since(since, batch=batch)) as parts:
+                async for part in parts:
+                    if not await _put(q, part, writer):
+                        break  # writer yiqildi — xatosi pastda chiqadi
+            await _put(q, _DONE, writer)
+            await writer
+        except BaseException:
+            await _put(q, _DONE, writer)
+            await asyncio.gather(writer, return_exceptions=True)
+            os.unlink(path)
+            raise
+    return path
+
+
+async def _put(q: queue.Queue, item, writer: asyncio.Task) -> bool:
+    """Navbat to‘la bo‘lsa loop’ni to‘smasdan kutadi; writer tugagan bo‘lsa False"""
+    while not writer.done():
+        try:
+            q.put_nowait(item)
+            return True
+        except queue.Full:
+            await asyncio.sleep(0.005)
+    return False
+
+
+# ------------------- CSV (gzip) -------------------
+async def iter_csv_gz(q, id_col, headers: list[str], batch: int = 5000):
+    """
+    q: services.payments_query / txns_query (birinchi ustun — id).
+    gzip bo‘laklarini beradi; StreamingResponse’ga to‘g‘ridan-to‘g‘ri.
+    """
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 — gzip sarlavhasi bilan
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(headers)
+
+    after_id = None
+    while True:
+        rows = await keyset_page(q, id_col, after_id=after_id, limit=batch)
+        if rows:
+            w.writerows(rows)
+            after_id = rows[-1][0]
+
+        data = buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+        # zlib katta buferda GIL’ni qo‘yib yuboradi
+        chunk = await asyncio.to_thread(z.compress, data) if data else b""
+        if chunk:
+            yield chunk
+        if len(rows) < batch:
+            break
+
+    yield z.flush()
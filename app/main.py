@@ -1,4 +1,5 @@
 import asyncio
+import logging
 from datetime import datetime, timedelta
 
 from aiogram import Bot, Dispatcher, F
@@ -9,30 +10,51 @@ from aiogram.types import (
     ChatMemberUpdated,
 )
 from aiogram.filters import Command
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from .config import (
-    BOT_TOKEN, GROUP_ID, CHANNEL_ID,
+    BOT_TOKEN, TELEGRAM_API_URL, GROUP_ID, CHANNEL_ID,
     PLAN_PRICES_UZS, PAYME_PAY_URL, CLICK_PAY_URL,
-    ADMIN_IDS,
+    ADMIN_IDS, KICK_CONCURRENCY, REMINDER_INTERVAL_MIN, INVITE_POLL_SEC,
 )
-from .database import Session
 from .admin import register_admin, admin_reply_kb
 from .services import (
     ensure_user,
-    deactivate_subscription,
-    get_active_subscriptions,
+    due_expired_subscriptions,
+    expire_subscriptions,
+    claim_due_reminders,
+    get_subscription_status,
+    claim_invite_jobs,
+    mark_invite_delivered,
+    mark_invite_failed,
     expected_amount_uzs,
     normalize_plan_days,
 )
-from .models import Subscription
-from .antispam import allow_click, allow_message
+from .antispam import setup_antispam
+from .metrics import timed_job
+from .telemetry import setup_bot_metrics
 from .user_ui import user_reply_kb
+from .sender import sender, HIGH, NORMAL, LOW
+
+
+log = logging.getLogger(__name__)
 
 
 # ================= BOT / DISPATCHER =================
-bot = Bot(BOT_TOKEN, parse_mode="HTML")
+def make_session():
+    if not TELEGRAM_API_URL:
+        return None  # aiogram default: api.telegram.org
+    return AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+
+
+bot = Bot(BOT_TOKEN, session=make_session(), parse_mode="HTML")
 dp = Dispatcher()
+setup_antispam(dp)
+# antispam’dan keyin: throttle qilinganlar handler vaqtiga kirmaydi
+setup_bot_metrics(dp, bot)
+sender.bind(bot)
 
 
 # ================= UI =================
@@ -54,13 +76,10 @@ def plans_keyboard():
 
 
 # ================= /START =================
-@dp.message(Command("start"))
+@dp.message(Command("start"), flags={"throttle": 1.0})
 async def start_cmd(msg: Message):
     user_id = msg.from_user.id
 
-    if not allow_message(user_id, delay=1.0):
-        return
-
     # 👑 ADMIN
     if user_id in ADMIN_IDS:
         await msg.answer(
@@ -81,12 +100,10 @@ async def start_cmd(msg: Message):
 
 
 # ================= USER MENU =================
-@dp.message(F.text == "💳 To‘lov qilish")
+@dp.message(F.text == "💳 To‘lov qilish", flags={"throttle": 1.5})
 async def menu_pay(msg: Message):
     if msg.from_user.id in ADMIN_IDS:
         return
-    if not allow_message(msg.from_user.id, delay=1.5):
-        return
 
     u = await ensure_user(msg.from_user.id)
     await msg.answer(
@@ -96,17 +113,14 @@ async def menu_pay(msg: Message):
     )
 
 
-@dp.message(F.text == "👤 Obunam")
+@dp.message(F.text == "👤 Obunam", flags={"throttle": 1.5})
 async def menu_my_sub(msg: Message):
     if msg.from_user.id in ADMIN_IDS:
         return
-    if not allow_message(msg.from_user.id, delay=1.5):
-        return
 
-    async with Session() as s:
-        sub = await s.get(Subscription, msg.from_user.id)
+    sub = await get_subscription_status(msg.from_user.id)
 
-    if not sub or not sub.active or sub.expires_at <= datetime.utcnow():
+    if not sub or not sub.is_active():
         await msg.answer("❌ Sizda faol obuna yo‘q.", reply_markup=user_reply_kb())
         return
 
@@ -122,12 +136,10 @@ async def menu_my_sub(msg: Message):
     )
 
 
-@dp.message(F.text == "🔄 Yangilash")
+@dp.message(F.text == "🔄 Yangilash", flags={"throttle": 1.5})
 async def menu_renew(msg: Message):
     if msg.from_user.id in ADMIN_IDS:
         return
-    if not allow_message(msg.from_user.id, delay=1.5):
-        return
 
     u = await ensure_user(msg.from_user.id)
     await msg.answer(
@@ -137,12 +149,10 @@ async def menu_renew(msg: Message):
     )
 
 
-@dp.message(F.text == "ℹ️ Yordam")
+@dp.message(F.text == "ℹ️ Yordam", flags={"throttle": 1.5})
 async def menu_help(msg: Message):
     if msg.from_user.id in ADMIN_IDS:
         return
-    if not allow_message(msg.from_user.id, delay=1.5):
-        return
 
     u = await ensure_user(msg.from_user.id)
     await msg.answer(
@@ -157,13 +167,10 @@ async def menu_help(msg: Message):
 
 
 # ================= PLAN TANLASH =================
-@dp.callback_query(F.data.startswith("plan:"))
+@dp.callback_query(F.data.startswith("plan:"), flags={"throttle": 2.0, "throttle_alert": "⏳ Sekinroq 🙂"})
 async def choose_plan(call):
     if call.from_user.id in ADMIN_IDS:
         return
-    if not allow_click(call.from_user.id, delay=2.0):
-        await call.answer("⏳ Sekinroq 🙂", show_alert=True)
-        return
 
     u = await ensure_user(call.from_user.id)
     days = normalize_plan_days(int(call.data.split(":")[1]))
@@ -181,40 +188,82 @@ async def choose_plan(call):
 
 # ================= INVITE LINK =================
 async def send_invites(tg_id: int):
-    g = await bot.create_chat_invite_link(
+    # to‘lovdan keyingi linklar navbatda birinchi (HIGH)
+    g = await sender.create_chat_invite_link(
         GROUP_ID, member_limit=1,
-        expire_date=datetime.utcnow() + timedelta(hours=1)
+        expire_date=datetime.utcnow() + timedelta(hours=1),
+        priority=HIGH,
     )
-    c = await bot.create_chat_invite_link(
+    c = await sender.create_chat_invite_link(
         CHANNEL_ID, member_limit=1,
-        expire_date=datetime.utcnow() + timedelta(hours=1)
+        expire_date=datetime.utcnow() + timedelta(hours=1),
+        priority=HIGH,
     )
-    await bot.send_message(
+    await sender.send_message(
         tg_id,
         "✅ To‘lov tasdiqlandi!\n\n"
         f"👥 Guruh: {g.invite_link}\n"
-        f"📣 Kanal: {c.invite_link}"
+        f"📣 Kanal: {c.invite_link}",
+        priority=HIGH,
     )
 
 
+# ================= INVITE OUTBOX =================
+_outbox_wakeup = asyncio.Event()
+
+
+def notify_invite_outbox():
+    """Webhook to‘lovni commit qilgach workerni darhol uyg‘otadi"""
+    _outbox_wakeup.set()
+
+
+async def deliver_invite(job):
+    job_id, tg_id, attempts = job
+    try:
+        await send_invites(tg_id)
+    except Exception as e:
+        log.warning("invite %s (tg_id=%s, urinish %s) yuborilmadi: %r", job_id, tg_id, attempts, e)
+        await mark_invite_failed(job_id, attempts, repr(e))
+        return
+    await mark_invite_delivered(job_id)
+
+
+async def run_invite_outbox():
+    while True:
+        try:
+            jobs = await claim_invite_jobs()
+        except Exception as e:
+            log.warning("invite outbox: %r", e)
+            jobs = []
+
+        if jobs:
+            await fan_out(jobs, deliver_invite)
+            continue
+
+        try:
+            await asyncio.wait_for(_outbox_wakeup.wait(), timeout=INVITE_POLL_SEC)
+        except asyncio.TimeoutError:
+            pass
+        _outbox_wakeup.clear()
+
+
 # ================= 10s TEKSHIRUV =================
 async def check_and_kick_if_no_subscription(chat_id: int, user_id: int):
     await asyncio.sleep(10)
 
     try:
-        cm = await bot.get_chat_member(chat_id, user_id)
+        cm = await sender.get_chat_member(chat_id, user_id)
         if cm.status not in ("member", "administrator", "creator"):
             return
     except Exception:
         return
 
-    async with Session() as s:
-        sub = await s.get(Subscription, user_id)
+    sub = await get_subscription_status(user_id)
 
-    if not sub or not sub.active or sub.expires_at <= datetime.utcnow():
+    if not sub or not sub.is_active():
         try:
-            await bot.ban_chat_member(chat_id, user_id)
-            await bot.unban_chat_member(chat_id, user_id)
+            await sender.ban_chat_member(chat_id, user_id)
+            await sender.unban_chat_member(chat_id, user_id)
         except Exception:
             pass
 
@@ -235,18 +284,69 @@ async def on_chat_member_update(event: ChatMemberUpdated):
 
 
 # ================= CRON =================
+async def fan_out(items, fn, concurrency: int = KICK_CONCURRENCY):
+    """fn(item) ni cheklangan parallellik bilan chaqiradi (xatolar yutiladi)"""
+    pending = iter(items)
+
+    async def worker():
+        # bitta umumiy iterator: har bir worker navbatdagi elementni oladi
+        for item in pending:
+            try:
+                await fn(item)
+            except Exception:
+                pass
+
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+
+
+async def kick_users(tg_ids, concurrency: int = KICK_CONCURRENCY) -> set[int]:
+    """
+    Userlarni guruh/kanaldan cheklangan parallellik bilan chiqaradi (LOW prioritet).
+    returns: birorta chatdan chiqarib bo‘lmaganlar
+    """
+    chats = [chat_id for chat_id in (GROUP_ID, CHANNEL_ID) if chat_id]
+    failed = set()
+
+    async def kick(tg_id):
+        for chat_id in chats:
+            try:
+                await sender.ban_chat_member(chat_id, tg_id, priority=LOW)
+            except Exception:
+                failed.add(tg_id)
+
+    await fan_out(tg_ids, kick, concurrency)
+    return failed
+
+
+@timed_job
 async def job_check_subs():
-    subs = await get_active_subscriptions()
-    now = datetime.utcnow()
+    # faqat active + muddati o‘tganlar; active=False — kick muvaffaqiyatli bo‘lgach,
+    # yiqilganlar active qoladi va keyingi sweep’da qayta urinadi
+    due = await due_expired_subscriptions()
+    if due:
+        failed = await kick_users(due)
+        await expire_subscriptions(t for t in due if t not in failed)
+
+
+async def send_reminder(item):
+    tg_id, expires_at, days_left = item
+    head = "⚠️ Obunangiz 1 kundan keyin tugaydi!" if days_left == 1 else "⏰ Obunangiz 3 kundan keyin tugaydi."
+    await sender.send_message(
+        tg_id,
+        f"{head}\n\n"
+        f"🗓 Tugash vaqti: {expires_at:%Y-%m-%d %H:%M} UTC\n\n"
+        "Uzaytirish uchun tarifni tanlang 👇",
+        reply_markup=plans_keyboard(),
+        priority=NORMAL,
+    )
+
 
-    for sub in subs:
-        if sub.expires_at <= now:
-            for chat_id in (GROUP_ID, CHANNEL_ID):
-                try:
-                    await bot.ban_chat_member(chat_id, sub.tg_id)
-                except Exception:
-                    pass
-            await deactivate_subscription(sub.tg_id)
+@timed_job
+async def job_send_reminders():
+    # faqat hozir eslatma kerak bo‘lganlar (flaglar bir UPDATE’da yoqiladi)
+    due = await claim_due_reminders()
+    if due:
+        await fan_out(due, send_reminder)
 
 
 # ================= STARTUP HELPERS =================
@@ -257,9 +357,12 @@ def setup_bot():
 def start_scheduler(app):
     scheduler = AsyncIOScheduler()
     scheduler.add_job(job_check_subs, "interval", hours=1)
+    scheduler.add_job(job_send_reminders, "interval", minutes=REMINDER_INTERVAL_MIN)
     scheduler.start()
     app.state.scheduler = scheduler
+    app.state.invite_worker = asyncio.create_task(run_invite_outbox())
 
 
 async def stop_bot():
+    await sender.close()
     await bot.session.close()
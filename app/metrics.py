@@ -0,0 +1,210 @@
+# app/metrics.py
+"""
+Jarayon ichidagi oddiy metrikalar (tashqi kutubxonasiz) va Prometheus
+text formatidagi eksport (/metrics).
+
+Hot path’da faqat dict lookup + bisect; matn faqat scrape paytida yig‘iladi.
+Tashqi hisoblagichlar (antispam, rate limit, pool) callback orqali o‘qiladi —
+ularga hech narsa qo‘shilmaydi.
+"""
+import functools
+import time
+from bisect import bisect_left
+
+# soniya: 0.5ms ... 10s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Bucket’lar bo‘yicha hisoblagich: observe O(log n), xotira o‘zgarmas"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # oxirgisi — +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """[(le, shu qiymatgacha bo‘lganlar soni), ..., (inf, count)]"""
+        out, acc = [], 0
+        for le, n in zip(self.buckets + (float("inf"),), self._counts):
+            acc += n
+            out.append((le, acc))
+        return out
+
+    def quantile(self, q: float) -> float:
+        """Taxminiy: q ulush tushadigan bucket’ning yuqori chegarasi"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for le, acc in self.cumulative():
+            if acc >= rank:
+                return min(le, self.max)
+        return self.max
+
+    def snapshot(self, scale: float = 1000.0, unit: str = "ms") -> dict:
+        return {
+            "count": self.count,
+            f"avg_{unit}": round(self.sum / self.count * scale, 3) if self.count else 0.0,
+            f"p50_{unit}": round(self.quantile(0.5) * scale, 3),
+            f"p99_{unit}": round(self.quantile(0.99) * scale, 3),
+            f"max_{unit}": round(self.max * scale, 3),
+            "buckets": {
+                ("+Inf" if le == float("inf") else f"{le * scale:g}"): n
+                for le, n in self.cumulative()
+            },
+        }
+
+
+# ------------------- Prometheus -------------------
+REGISTRY: list = []
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name, self.doc, self.labelnames = name, doc, labels
+        self._values: dict[tuple, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for lv, v in self._values.items():
+            out.append(f"{self.name}{_labels(self.labelnames, lv)} {_num(v)}")
+        return out
+
+
+class HistogramFamily:
+    def __init__(self, name: str, doc: str, labels: tuple = (), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.labelnames, self.buckets = name, doc, labels, buckets
+        self._children: dict[tuple, Histogram] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *labels) -> Histogram:
+        h = self._children.get(labels)
+        if h is None:
+            h = self._children[labels] = Histogram(self.buckets)
+        return h
+
+    def observe(self, value: float, *labels):
+        self.labels(*labels).observe(value)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for lv, h in self._children.items():
+            out.extend(render_histogram(self.name, h, self.labelnames, lv))
+        return out
+
+
+class Collected:
+    """Scrape paytida fn() chaqiriladi: {label qiymatlari tuple: son} yoki son"""
+
+    def __init__(self, name: str, doc: str, kind: str, fn, labels: tuple = ()):
+        self.name, self.doc, self.kind, self.fn, self.labelnames = name, doc, kind, fn, labels
+        REGISTRY.append(self)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for lv, v in values.items():
+            out.append(f"{self.name}{_labels(self.labelnames, lv)} {_num(v)}")
+        return out
+
+
+class CollectedHistogram:
+    """Tayyor Histogram’ni (masalan pool checkout) eksport qilish"""
+
+    def __init__(self, name: str, doc: str, hist_fn):
+        self.name, self.doc, self.hist_fn = name, doc, hist_fn
+        REGISTRY.append(self)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        out.extend(render_histogram(self.name, self.hist_fn(), (), ()))
+        return out
+
+
+def render_histogram(name: str, h: Histogram, names: tuple, values: tuple) -> list[str]:
+    out = []
+    for le, n in h.cumulative():
+        le_label = 'le="%s"' % _num(le)
+        out.append(f"{name}_bucket{_labels(names, values, le_label)} {n}")
+    out.append(f"{name}_sum{_labels(names, values)} {_num(h.sum)}")
+    out.append(f"{name}_count{_labels(names, values)} {h.count}")
+    return out
+
+
+def render_prometheus() -> str:
+    lines = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------- ilova metrikalari -------------------
+http_duration = HistogramFamily(
+    "http_request_duration_seconds", "HTTP request latency by route", ("route",))
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("route", "status"))
+
+handler_duration = HistogramFamily(
+    "tg_handler_duration_seconds", "aiogram handler duration", ("handler",))
+handler_errors = Counter(
+    "tg_handler_errors_total", "aiogram handler exceptions", ("handler",))
+
+tg_api_duration = HistogramFamily(
+    "tg_api_request_duration_seconds", "Telegram Bot API request latency", ("method",))
+tg_api_errors = Counter(
+    "tg_api_errors_total", "Telegram Bot API errors", ("method", "error"))
+
+job_duration = HistogramFamily(
+    "job_duration_seconds", "Scheduler job duration", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+job_errors = Counter("job_errors_total", "Scheduler job exceptions", ("job",))
+
+
+def timed_job(fn):
+    """Scheduler job’ini job_duration_seconds{job=fn nomi} bilan o‘lchaydi"""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            job_errors.inc(name)
+            raise
+        finally:
+            job_duration.observe(time.perf_counter() - t0, name)
+
+    return wrapper
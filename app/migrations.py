@@ -0,0 +1,195 @@
+# app/migrations.py
+"""
+Sxema migratsiyalari.
+
+schema_migrations jadvalida qo‘llangan versiyalar saqlanadi. Startup’da
+versiya joriy bo‘lsa — bitta SELECT va tamom. Aks holda advisory lock
+olinadi (bir nechta instance bir vaqtda ko‘tarilsa ham bittasi bajaradi)
+va yetishmagan migratsiyalar tartib bilan, har biri o‘z tranzaksiyasida
+qo‘llanadi.
+
+Migratsiyalar idempotent bo‘lishi kerak: yangi bazada 1-migratsiya
+(create_all) modeldagi hamma narsani yaratib qo‘yadi, keyingilari esa
+eski bazalarga yetishmaganini qo‘shadi.
+
+Index migratsiyalari (ConcurrentIndex) tranzaksiyadan tashqarida,
+autocommit ulanishda CREATE INDEX CONCURRENTLY bilan quriladi — to‘la
+jadvalda ham webhook yozuvlari bloklanmaydi.
+
+    python -m app.migrations          # qo‘llash
+    python -m app.migrations --status # faqat holat
+"""
+import asyncio
+import logging
+import re
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from .database import engine, autocommit_engine, Base
+from .models import (
+    PaymentDailyBackfill,
+    ix_subs_active_expires, ix_payments_created_at,
+    ix_txns_provider_created, ix_payments_provider_ext,
+)
+
+log = logging.getLogger(__name__)
+
+# pg_advisory_lock kaliti (ixtiyoriy, lekin o‘zgarmas son)
+LOCK_KEY = 7_313_001
+
+CREATE_VERSION_TABLE = text("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version integer PRIMARY KEY,
+        name varchar NOT NULL,
+        applied_at timestamp NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+    )
+""")
+
+
+# ------------------- migratsiyalar (sync connection) -------------------
+def m001_base_tables(conn):
+    # faqat yo‘q jadvallarni (o‘z indexlari bilan) yaratadi: bor jadvalga
+    # index qo‘shmaydi — bu ConcurrentIndex migratsiyalarining ishi
+    Base.metadata.create_all(conn)
+
+
+def m004_txn_payme_fields(conn):
+    # Payme holat vaqtlari; yangi bazada create_all allaqachon yaratgan
+    for ddl in (
+        "ALTER TABLE txns ADD COLUMN IF NOT EXISTS cancelled_at timestamp",
+        "ALTER TABLE txns ADD COLUMN IF NOT EXISTS reason integer",
+        "ALTER TABLE txns ADD COLUMN IF NOT EXISTS provider_time bigint",
+    ):
+        conn.execute(text(ddl))
+
+
+def m007_txn_expires_at(conn):
+    # complete_payment natijasi: takroriy perform yozuvsiz shu qiymatni oladi
+    conn.execute(text("ALTER TABLE txns ADD COLUMN IF NOT EXISTS expires_at timestamp"))
+    # eski performed txn’lar: aniq natija yo‘q, eng yaqini — joriy obuna muddati
+    conn.execute(text("""
+        UPDATE txns t SET expires_at = s.expires_at
+        FROM subscriptions s
+        WHERE s.tg_id = t.tg_id AND t.state = 'performed' AND t.expires_at IS NULL
+    """))
+
+
+def m008_rollup_backfill_marker(conn):
+    PaymentDailyBackfill.__table__.create(conn, checkfirst=True)
+    # rollup’i allaqachon to‘ldirilgan zonalar — qayta backfill/lock kerak emas
+    conn.execute(text("""
+        INSERT INTO payment_daily_backfills (tz, filled_at)
+        SELECT DISTINCT tz, now() AT TIME ZONE 'utc' FROM payment_daily
+        ON CONFLICT DO NOTHING
+    """))
+
+
+# ------------------- indexlar (autocommit, CONCURRENTLY) -------------------
+class ConcurrentIndex:
+    """
+    Model’dagi Index’ni CREATE INDEX CONCURRENTLY IF NOT EXISTS bilan quradi.
+    Oldingi urinish yiqilib qolgan INVALID index avval o‘chiriladi (aks holda
+    IF NOT EXISTS uni "bor" deb o‘tkazib yuboradi).
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def ddl(self) -> str:
+        sql = str(CreateIndex(self.index, if_not_exists=True).compile(dialect=postgresql.dialect()))
+        return re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", sql.strip())
+
+    async def apply(self):
+        async with autocommit_engine.connect() as conn:
+            invalid = await conn.scalar(text("""
+                SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = :name AND NOT i.indisvalid
+            """), {"name": self.index.name})
+            if invalid:
+                await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{self.index.name}"'))
+            await conn.execute(text(self.ddl()))
+
+
+# (versiya, nom, funksiya) — faqat oxiriga qo‘shiladi, tartib o‘zgarmaydi
+MIGRATIONS = [
+    (1, "base tables", m001_base_tables),
+    # expiry sweep va eslatmalar: WHERE active AND expires_at <= ...
+    (2, "subscriptions active/expires_at partial index", ConcurrentIndex(ix_subs_active_expires)),
+    # sana oralig‘i bo‘yicha eksport / hisobotlar
+    (3, "payments.created_at index", ConcurrentIndex(ix_payments_created_at)),
+    (4, "txns cancelled_at/reason/provider_time", m004_txn_payme_fields),
+    # Payme GetStatement: WHERE provider = ? AND created_at BETWEEN ...
+    (5, "txns (provider, created_at) index", ConcurrentIndex(ix_txns_provider_created)),
+    (6, "payments (provider, ext_id) index", ConcurrentIndex(ix_payments_provider_ext)),
+    (7, "txns.expires_at", m007_txn_expires_at),
+    (8, "payment_daily backfill marker", m008_rollup_backfill_marker),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+async def current_version(conn) -> int:
+    if await conn.scalar(text("SELECT to_regclass('schema_migrations')")) is None:
+        return 0
+    return await conn.scalar(text("SELECT coalesce(max(version), 0) FROM schema_migrations"))
+
+
+async def run_migrations() -> list[int]:
+    """returns: shu safar qo‘llangan versiyalar"""
+    async with engine.connect() as conn:
+        if await current_version(conn) >= LATEST:
+            return []
+        await conn.rollback()
+
+        await conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": LOCK_KEY})
+        await conn.commit()
+        try:
+            await conn.execute(CREATE_VERSION_TABLE)
+            await conn.commit()
+            done = set((await conn.execute(text("SELECT version FROM schema_migrations"))).scalars())
+            # ochiq tranzaksiya qolmasin: CONCURRENTLY uni kutib qoladi
+            await conn.commit()
+
+            applied = []
+            for version, name, fn in MIGRATIONS:
+                if version in done:
+                    continue
+                t0 = time.perf_counter()
+                if isinstance(fn, ConcurrentIndex):
+                    # CONCURRENTLY tranzaksiya ichida ishlamaydi; advisory lock
+                    # shu (bo‘sh, tranzaksiyasiz) ulanishda qoladi
+                    await fn.apply()
+                else:
+                    await conn.run_sync(fn)
+                await conn.execute(
+                    text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                    {"v": version, "n": name},
+                )
+                await conn.commit()
+                log.info("migration %s (%s): %.2fs", version, name, time.perf_counter() - t0)
+                applied.append(version)
+            return applied
+        finally:
+            # xato bo‘lsa tranzaksiya buzilgan — avval rollback
+            await conn.rollback()
+            await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": LOCK_KEY})
+            await conn.commit()
+
+
+async def _cli(status_only: bool):
+    try:
+        if not status_only:
+            applied = await run_migrations()
+            print("applied:", applied or "nothing")
+        async with engine.connect() as conn:
+            print(f"schema version: {await current_version(conn)} (latest {LATEST})")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_cli("--status" in sys.argv))
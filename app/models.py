@@ -4,7 +4,7 @@ from __future__ import annotations
 from datetime import datetime
 
 from sqlalchemy import (
-    Column, Integer, BigInteger, DateTime, Boolean, String, Index
+    Column, Integer, BigInteger, Date, DateTime, Boolean, String, Index
 )
 from .database import Base
 
@@ -45,6 +45,26 @@ class Payment(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
 
+class PaymentDaily(Base):
+    """Kunlik rollup: har bir to‘lovda +1 (add_payment / complete_payment)"""
+    __tablename__ = "payment_daily"
+
+    tz = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    provider = Column(String, primary_key=True)
+
+    count = Column(Integer, default=0, nullable=False)
+    amount = Column(BigInteger, default=0, nullable=False)
+
+
+class PaymentDailyBackfill(Base):
+    """payment_daily qaysi tz’lar uchun payments’dan to‘ldirilgan (startup tekshiruvi)"""
+    __tablename__ = "payment_daily_backfills"
+
+    tz = Column(String, primary_key=True)
+    filled_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Txn(Base):
     __tablename__ = "txns"
 
@@ -56,10 +76,53 @@ class Txn(Base):
     plan_days = Column(Integer, default=30, nullable=False)
     amount_uzs = Column(Integer, default=0, nullable=False)
 
+    # created / prepared (Click) / performed / cancelled
     state = Column(String, default="created", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     performed_at = Column(DateTime, nullable=True)
+    cancelled_at = Column(DateTime, nullable=True)
+    reason = Column(Integer, nullable=True)           # Payme CancelTransaction reason
+    provider_time = Column(BigInteger, nullable=True)  # Payme "time" (ms), GetStatement uchun
+    expires_at = Column(DateTime, nullable=True)      # yakunlash natijasi, takroriy perform’ga qaytariladi
+
+
+class InviteOutbox(Base):
+    """To‘lov bilan bitta tranzaksiyada yoziladi, invite’larni fon worker yuboradi"""
+    __tablename__ = "invite_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tg_id = Column(BigInteger, index=True, nullable=False)
+    provider = Column(String, nullable=True)
+    ext_id = Column(String, nullable=True)
+
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    delivered_at = Column(DateTime, nullable=True)
 
 
 # provider + ext_id takror bo‘lmasin (dubl tranzaksiya bloklashga ham yordam beradi)
 Index("ix_txns_provider_ext", Txn.provider, Txn.ext_id, unique=True)
+
+# faqat faol obunalar, expires_at bo‘yicha range (eslatmalar va expiry sweep)
+ix_subs_active_expires = Index(
+    "ix_subs_active_expires", Subscription.expires_at,
+    postgresql_where=Subscription.active == True,
+)
+
+# sana oralig‘i bo‘yicha (eksport, hisobotlar)
+ix_payments_created_at = Index("ix_payments_created_at", Payment.created_at)
+
+# Payme GetStatement: provider + vaqt oralig‘i
+ix_txns_provider_created = Index("ix_txns_provider_created", Txn.provider, Txn.created_at)
+
+# to‘lovni txn bo‘yicha topish (Payme qaytarish — CancelTransaction)
+ix_payments_provider_ext = Index("ix_payments_provider_ext", Payment.provider, Payment.ext_id)
+
+# yetkazilmagan invite’lar navbati
+Index(
+    "ix_invite_outbox_pending", InviteOutbox.next_attempt_at,
+    postgresql_where=InviteOutbox.delivered_at.is_(None),
+)
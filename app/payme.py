@@ -0,0 +1,260 @@
+# app/payme.py
+"""
+Payme merchant API (JSON-RPC 2.0), Txn modeli ustida.
+
+Holatlar: 1 — yaratilgan, 2 — bajarilgan, -1 — bajarilmasdan bekor,
+-2 — bajarilgandan keyin bekor (qaytarish). Vaqtlar — ms (UTC).
+Yaratilgan tranzaksiya 12 soat ichida bajarilmasa, keyingi murojaatda
+reason=4 bilan bekor qilinadi.
+
+GetStatement keng oraliqlarda ham (provider, created_at) index bo‘yicha
+o‘qiydi va javobni qatorlar kelishi bilan oqim qilib yozadi.
+"""
+import json
+import re
+from calendar import timegm
+from datetime import datetime
+
+from .config import PAYME_AMOUNT_MULTIPLIER
+from .main import notify_invite_outbox
+from .models import Txn
+from .services import (
+    get_user_by_pay_code,
+    expected_amount_uzs,
+    guess_plan_by_amount,
+    get_txn,
+    get_or_create_txn,
+    complete_payment,
+    cancel_txn,
+    stream_txn_statement,
+)
+
+PROVIDER = "payme"
+TIMEOUT_MS = 12 * 3600 * 1000
+REASON_TIMEOUT = 4
+
+# kod -> (uz, ru, en)
+ERRORS = {
+    -31001: ("Noto‘g‘ri summa", "Неверная сумма", "Incorrect amount"),
+    -31003: ("Tranzaksiya topilmadi", "Транзакция не найдена", "Transaction not found"),
+    -31008: ("Amalni bajarib bo‘lmaydi", "Невозможно выполнить операцию", "Unable to perform operation"),
+    -31050: ("PAY CODE topilmadi", "Код оплаты не найден", "Invalid PAY CODE"),
+    -32504: ("Ruxsat yo‘q", "Недостаточно привилегий", "Insufficient privileges"),
+    -32600: ("Noto‘g‘ri so‘rov", "Неверный запрос", "Invalid request"),
+    -32601: ("Metod topilmadi", "Метод не найден", "Method not found"),
+    -32700: ("JSON xato", "Ошибка разбора JSON", "Parse error"),
+}
+
+
+class PaymeError(Exception):
+    def __init__(self, code: int, data=None):
+        super().__init__(code)
+        self.code = code
+        self.data = data
+
+
+def rpc_result(req_id, result) -> dict:
+    return {"jsonrpc": "2.0", "id": req_id, "result": result}
+
+
+def rpc_error(req_id, code: int, data=None) -> dict:
+    uz, ru, en = ERRORS[code]
+    err = {"code": code, "message": {"uz": uz, "ru": ru, "en": en}}
+    if data is not None:
+        err["data"] = data
+    return {"jsonrpc": "2.0", "id": req_id, "error": err}
+
+
+def to_ms(dt: datetime | None) -> int:
+    return timegm(dt.utctimetuple()) * 1000 + dt.microsecond // 1000 if dt else 0
+
+
+def from_ms(ms: int) -> datetime:
+    return datetime.utcfromtimestamp(ms / 1000)
+
+
+def state_of(state: str, performed_at: datetime | None) -> int:
+    if state == "performed":
+        return 2
+    if state == "cancelled":
+        return -2 if performed_at else -1
+    return 1
+
+
+def _int_param(params: dict, key: str) -> int:
+    try:
+        return int(params[key])
+    except (KeyError, TypeError, ValueError):
+        raise PaymeError(-32600, key)
+
+
+def _expired(txn: Txn, now_ms: int) -> bool:
+    created = txn.provider_time or to_ms(txn.created_at)
+    return now_ms - created > TIMEOUT_MS
+
+
+def _now_ms() -> int:
+    return to_ms(datetime.utcnow())
+
+
+# ------------------- metodlar -------------------
+async def resolve_account(params: dict, strict: bool):
+    """returns: (user, plan_days, amount_uzs)"""
+    account = params.get("account") or {}
+    pay_code = re.sub(r"\D", "", str(account.get("pay_code") or account.get("user_id") or ""))
+    if not pay_code:
+        raise PaymeError(-31050, "pay_code")
+    u = await get_user_by_pay_code(pay_code)
+    if not u:
+        raise PaymeError(-31050, "pay_code")
+
+    amount_tiyin = _int_param(params, "amount")
+    amount_uzs = amount_tiyin // PAYME_AMOUNT_MULTIPLIER
+
+    plan_days = int(account.get("plan_days", 0) or 0)
+    if plan_days not in (7, 30, 90):
+        plan_days = guess_plan_by_amount(amount_uzs)
+        if not plan_days:
+            raise PaymeError(-31001)
+    # testda (PAYME_SECRET="dummy") summa qat’iy tekshirilmaydi
+    if strict and amount_uzs != expected_amount_uzs(plan_days):
+        raise PaymeError(-31001)
+    return u, plan_days, amount_uzs
+
+
+async def check_perform_transaction(params: dict, strict: bool) -> dict:
+    await resolve_account(params, strict)
+    return {"allow": True}
+
+
+async def create_transaction(params: dict, strict: bool) -> dict:
+    ext_id = str(params.get("id") or "")
+    if not ext_id:
+        raise PaymeError(-32600, "id")
+
+    # takroriy so‘rov ham to‘liq tekshiriladi: boshqa summa/hisob bilan replay o‘tmasin
+    u, plan_days, amount_uzs = await resolve_account(params, strict)
+    txn = await get_txn(PROVIDER, ext_id)
+    if txn is None:
+        txn = await get_or_create_txn(
+            PROVIDER, ext_id, u.tg_id, plan_days, amount_uzs,
+            provider_time=_int_param(params, "time"),
+        )
+    if txn.tg_id != u.tg_id:
+        raise PaymeError(-31050, "pay_code")
+    if txn.amount_uzs != amount_uzs:
+        raise PaymeError(-31001)
+
+    if state_of(txn.state, txn.performed_at) != 1:
+        raise PaymeError(-31008)
+    if _expired(txn, _now_ms()):
+        await cancel_txn(PROVIDER, ext_id, REASON_TIMEOUT)
+        raise PaymeError(-31008)
+    return {"create_time": to_ms(txn.created_at), "transaction": str(txn.id), "state": 1}
+
+
+async def perform_transaction(params: dict, strict: bool) -> dict:
+    ext_id = str(params.get("id") or "")
+    txn = await get_txn(PROVIDER, ext_id)
+    if txn is None:
+        raise PaymeError(-31003)
+
+    state = state_of(txn.state, txn.performed_at)
+    if state == 1:
+        if _expired(txn, _now_ms()):
+            await cancel_txn(PROVIDER, ext_id, REASON_TIMEOUT)
+            raise PaymeError(-31008)
+        done = await complete_payment(PROVIDER, ext_id)
+        if not done.ok:
+            raise PaymeError(-31008)  # shu orada bekor qilingan
+        notify_invite_outbox()
+        txn = await get_txn(PROVIDER, ext_id)
+        state = 2
+    if state != 2:
+        raise PaymeError(-31008)
+    return {"transaction": str(txn.id), "perform_time": to_ms(txn.performed_at), "state": 2}
+
+
+async def cancel_transaction(params: dict, strict: bool) -> dict:
+    ext_id = str(params.get("id") or "")
+    reason = _int_param(params, "reason") if params.get("reason") is not None else None
+    txn = await cancel_txn(PROVIDER, ext_id, reason)
+    if txn is None:
+        raise PaymeError(-31003)
+    return {
+        "transaction": str(txn.id),
+        "cancel_time": to_ms(txn.cancelled_at),
+        "state": state_of(txn.state, txn.performed_at),
+    }
+
+
+async def check_transaction(params: dict, strict: bool) -> dict:
+    txn = await get_txn(PROVIDER, str(params.get("id") or ""))
+    if txn is None:
+        raise PaymeError(-31003)
+    return {
+        "create_time": to_ms(txn.created_at),
+        "perform_time": to_ms(txn.performed_at),
+        "cancel_time": to_ms(txn.cancelled_at),
+        "transaction": str(txn.id),
+        "state": state_of(txn.state, txn.performed_at),
+        "reason": txn.reason,
+    }
+
+
+METHODS = {
+    "CheckPerformTransaction": check_perform_transaction,
+    "CreateTransaction": create_transaction,
+    "PerformTransaction": perform_transaction,
+    "CancelTransaction": cancel_transaction,
+    "CheckTransaction": check_transaction,
+}
+
+
+async def dispatch(data: dict, strict: bool) -> dict:
+    """GetStatement’dan boshqa metodlar (u — statement_range + iter_statement)"""
+    req_id = data.get("id")
+    fn = METHODS.get(data.get("method"))
+    if fn is None:
+        return rpc_error(req_id, -32601, data.get("method"))
+    try:
+        return rpc_result(req_id, await fn(data.get("params") or {}, strict))
+    except PaymeError as e:
+        return rpc_error(req_id, e.code, e.data)
+
+
+# ------------------- GetStatement -------------------
+def statement_range(params: dict) -> tuple[datetime, datetime]:
+    start, end = _int_param(params, "from"), _int_param(params, "to")
+    if end < start:
+        raise PaymeError(-32600, "to")
+    return from_ms(start), from_ms(end)
+
+
+def statement_item(row) -> dict:
+    txn_id, ext_id, provider_time, amount_uzs, pay_code, created, performed, cancelled, state, reason = row
+    return {
+        "id": ext_id,
+        "time": provider_time or to_ms(created),
+        "amount": amount_uzs * PAYME_AMOUNT_MULTIPLIER,
+        "account": {"pay_code": pay_code},
+        "create_time": to_ms(created),
+        "perform_time": to_ms(performed),
+        "cancel_time": to_ms(cancelled),
+        "transaction": str(txn_id),
+        "state": state_of(state, performed),
+        "reason": reason,
+        "receivers": None,
+    }
+
+
+async def iter_statement(req_id, since: datetime, until: datetime):
+    """JSON javob bo‘laklari: qatorlar DB’dan kelishi bilan yoziladi"""
+    yield b'{"jsonrpc": "2.0", "id": ' + json.dumps(req_id).encode() + b', "result": {"transactions": ['
+    first = True
+    async for part in stream_txn_statement(PROVIDER, since, until):
+        chunk = ", ".join(json.dumps(statement_item(r), ensure_ascii=False) for r in part)
+        if chunk:
+            yield (chunk if first else ", " + chunk).encode()
+            first = False
+    yield b"]}}"
@@ -0,0 +1,278 @@
+# app/sender.py
+"""
+Telegram'ga chiquvchi so‘rovlar navbati.
+
+- global va chat bo‘yicha token bucket (Telegram: ~30 xabar/s, chatga ~1/s)
+- TelegramRetryAfter bo‘lsa kutib, qayta yuboradi
+- prioritetlar: HIGH (to‘lov invite) > NORMAL > LOW (ommaviy kick)
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from .config import TG_GLOBAL_RATE, TG_CHAT_RATE, TG_MAX_INFLIGHT
+
+log = logging.getLogger(__name__)
+
+HIGH, NORMAL, LOW = 0, 1, 2
+_PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+# chatga xabar yuboradigan metodlar — faqat shularga chat limiti qo‘llanadi
+_PER_CHAT_METHODS = {"send_message", "send_document", "send_photo", "copy_message", "forward_message"}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Token bo‘lsa 0, bo‘lmasa necha soniya kutish kerakligi"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float, now: float):
+        # RetryAfter: shuncha vaqt token bermaydi
+        self.wait_time(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class _Job:
+    __slots__ = ("method", "args", "kwargs", "chat_key", "priority", "future", "attempts", "seq")
+
+    def __init__(self, method, args, kwargs, chat_key, priority, future, seq):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.chat_key = chat_key
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+        # navbatga qayta qo‘yilganda ham tartib saqlanadi
+        self.seq = seq
+
+
+class TgSender:
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        max_inflight: int = 16,
+        max_retries: int = 5,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._bot = None
+        self._queue: asyncio.PriorityQueue | None = None
+        self._task: asyncio.Task | None = None
+        self._slots = asyncio.Semaphore(max_inflight)
+        self._seq = itertools.count()
+        self._global = TokenBucket(global_rate, global_rate, time.monotonic())
+        self._paused_until = 0.0
+        self._chats: dict[int, TokenBucket] = {}
+        # limitga urilgan chatning kutayotgan xabarlari (FIFO)
+        self._chat_waiting: dict[int, deque] = {}
+        self._last_prune = time.monotonic()
+
+        self._queued = {p: 0 for p in _PRIORITY_NAMES}
+        self._delayed = 0
+        self._inflight = 0
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._retry_after = 0
+        # oxirgi 60 soniyadagi yuborilganlar (soniya bo‘yicha halqa)
+        self._ring = [0] * 60
+        self._ring_sec = int(time.monotonic())
+
+    def bind(self, bot):
+        self._bot = bot
+
+    # ---------- public API ----------
+    async def call(self, method: str, *args, priority: int = NORMAL, **kwargs):
+        """bot.<method>(*args, **kwargs) ni navbat orqali bajaradi va natijani qaytaradi"""
+        chat_key = None
+        if method in _PER_CHAT_METHODS:
+            chat_key = kwargs.get("chat_id", args[0] if args else None)
+
+        loop = asyncio.get_running_loop()
+        job = _Job(method, args, kwargs, chat_key, priority, loop.create_future(), next(self._seq))
+        self._ensure_started()
+        self._put(job)
+        return await job.future
+
+    async def send_message(self, chat_id, text: str, priority: int = NORMAL, **kwargs):
+        return await self.call("send_message", chat_id, text, priority=priority, **kwargs)
+
+    async def ban_chat_member(self, chat_id, user_id: int, priority: int = NORMAL, **kwargs):
+        return await self.call("ban_chat_member", chat_id, user_id, priority=priority, **kwargs)
+
+    async def unban_chat_member(self, chat_id, user_id: int, priority: int = NORMAL, **kwargs):
+        return await self.call("unban_chat_member", chat_id, user_id, priority=priority, **kwargs)
+
+    async def get_chat_member(self, chat_id, user_id: int, priority: int = NORMAL):
+        return await self.call("get_chat_member", chat_id, user_id, priority=priority)
+
+    async def create_chat_invite_link(self, chat_id, priority: int = NORMAL, **kwargs):
+        return await self.call("create_chat_invite_link", chat_id, priority=priority, **kwargs)
+
+    def stats(self) -> dict:
+        self._advance_ring(time.monotonic())
+        return {
+            "queued": {_PRIORITY_NAMES[p]: n for p, n in self._queued.items()},
+            "delayed": self._delayed,
+            "inflight": self._inflight,
+            "sent": self._sent,
+            "failed": self._failed,
+            "retried": self._retried,
+            "retry_after": self._retry_after,
+            "sent_per_sec_1m": round(sum(self._ring) / 60, 2),
+            "chat_buckets": len(self._chats),
+        }
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    # ---------- ichki ----------
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _put(self, job: _Job):
+        self._queued[job.priority] += 1
+        self._queue.put_nowait((job.priority, job.seq, job))
+
+    def _release_chat(self, chat_key):
+        waiting = self._chat_waiting.pop(chat_key, ())
+        self._delayed -= len(waiting)
+        for job in waiting:
+            self._put(job)
+
+    def _advance_ring(self, now: float):
+        sec = int(now)
+        if sec != self._ring_sec:
+            for s in range(max(self._ring_sec + 1, sec - 59), sec + 1):
+                self._ring[s % 60] = 0
+            self._ring_sec = sec
+
+    def _chat_bucket(self, chat_key, now: float) -> TokenBucket:
+        b = self._chats.get(chat_key)
+        if b is None:
+            b = self._chats[chat_key] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return b
+
+    def _prune_chats(self, now: float):
+        # 1 daqiqa jim turgan chat bucket’lari allaqachon to‘la — o‘chirsa bo‘ladi
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        idle = [
+            k for k, b in self._chats.items()
+            if now - b.updated > 60 and k not in self._chat_waiting
+        ]
+        for k in idle:
+            del self._chats[k]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            job = item[2]
+            now = time.monotonic()
+
+            # 1) global limit / RetryAfter pauza
+            wait = max(self._paused_until - now, self._global.wait_time(now))
+            if wait > 0:
+                # qaytarib qo‘yamiz: kutish davomida yuqoriroq prioritet kelishi mumkin
+                self._queue.put_nowait(item)
+                await asyncio.sleep(wait)
+                continue
+
+            # 2) chat limiti — navbatni to‘sib qo‘ymaslik uchun chetga olinadi,
+            #    shu chatning keyingi xabarlari ham uning ortidan turadi
+            if job.chat_key is not None:
+                waiting = self._chat_waiting.get(job.chat_key)
+                b = self._chat_bucket(job.chat_key, now)
+                cwait = b.wait_time(now)
+                if waiting is not None or cwait > 0:
+                    self._queued[job.priority] -= 1
+                    self._delayed += 1
+                    if waiting is None:
+                        self._chat_waiting[job.chat_key] = deque([job])
+                        loop.call_later(cwait, self._release_chat, job.chat_key)
+                    else:
+                        waiting.append(job)
+                    continue
+                b.take()
+
+            self._global.take()
+            self._queued[job.priority] -= 1
+            self._prune_chats(now)
+
+            await self._slots.acquire()
+            self._inflight += 1
+            asyncio.create_task(self._execute(job))
+
+    async def _execute(self, job: _Job):
+        try:
+            result = await getattr(self._bot, job.method)(*job.args, **job.kwargs)
+        except TelegramRetryAfter as e:
+            self._retry_after += 1
+            now = time.monotonic()
+            if job.chat_key is not None:
+                self._chat_bucket(job.chat_key, now).pause(e.retry_after, now)
+            else:
+                self._paused_until = max(self._paused_until, now + e.retry_after)
+
+            if job.attempts < self.max_retries and not job.future.done():
+                job.attempts += 1
+                self._retried += 1
+                self._put(job)
+            else:
+                log.warning("telegram %s: retry_after limit oshdi (%s urinish)", job.method, job.attempts)
+                self._fail(job, e)
+        except Exception as e:
+            log.info("telegram %s failed: %r", job.method, e)
+            self._fail(job, e)
+        else:
+            self._sent += 1
+            now = time.monotonic()
+            self._advance_ring(now)
+            self._ring[int(now) % 60] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._inflight -= 1
+            self._slots.release()
+
+    def _fail(self, job: _Job, exc: Exception):
+        self._failed += 1
+        if not job.future.done():
+            job.future.set_exception(exc)
+
+
+sender = TgSender(global_rate=TG_GLOBAL_RATE, chat_rate=TG_CHAT_RATE, max_inflight=TG_MAX_INFLIGHT)
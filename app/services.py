@@ -1,10 +1,16 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone, time as dtime
+import asyncio
 import random
-from sqlalchemy import select
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import select, update, text
 
-from .database import Session
-from .models import User, Subscription, Payment, Txn
-from .config import PLAN_PRICES_UZS
+from .database import Session, autocommit_engine
+from .models import User, Subscription, Payment, PaymentDailyBackfill, Txn, InviteOutbox
+from .config import (
+    PLAN_PRICES_UZS, INVITE_MAX_ATTEMPTS, INVITE_RETRY_BASE_SEC, STATS_TZ, STATS_ROLLUP_TZS,
+)
+from .cache import user_cache, sub_cache, MISSING
 
 from datetime import datetime, timedelta, date
 from sqlalchemy import select
@@ -37,6 +43,91 @@ async def list_payments_since(dt_utc: datetime):
         return out
 
 
+# export ustunlari tartibi (reports.PAYMENT_HEADERS bilan bir xil)
+PAYMENT_EXPORT_COLUMNS = (
+    Payment.id, Payment.created_at, Payment.tg_id, User.pay_code, Payment.provider,
+    Payment.amount, Payment.status, Payment.plan_days, Payment.ext_id,
+)
+
+
+async def stream_payments_since(dt_utc: datetime, batch: int = 2000):
+    """
+    list_payments_since ning oqimli varianti: server-side cursor, har safar
+    ``batch`` ta tuple ro‘yxati. Xotira qator soniga bog‘liq emas.
+    """
+    q = (
+        select(*PAYMENT_EXPORT_COLUMNS)
+        .join(User, User.tg_id == Payment.tg_id, isouter=True)
+        .where(Payment.created_at >= dt_utc)
+        .order_by(Payment.id.desc())
+        .execution_options(yield_per=batch)
+    )
+    async with Session() as s:
+        res = await s.stream(q)
+        async for part in res.partitions():
+            yield [tuple(r) for r in part]
+
+
+# ------------------- keyset pagination -------------------
+TXN_EXPORT_COLUMNS = (
+    Txn.id, Txn.created_at, Txn.performed_at, Txn.tg_id, Txn.provider, Txn.ext_id,
+    Txn.amount_uzs, Txn.plan_days, Txn.state,
+)
+
+
+def payments_query(
+    since: datetime | None = None, until: datetime | None = None,
+    provider: str | None = None, status: str | None = None, tg_id: int | None = None,
+):
+    """Filtrlangan select (birinchi ustun — Payment.id); keyset_page bilan ishlatiladi"""
+    q = select(*PAYMENT_EXPORT_COLUMNS).join(User, User.tg_id == Payment.tg_id, isouter=True)
+    if since is not None:
+        q = q.where(Payment.created_at >= since)
+    if until is not None:
+        q = q.where(Payment.created_at < until)
+    if provider:
+        q = q.where(Payment.provider == provider)
+    if status:
+        q = q.where(Payment.status == status)
+    if tg_id is not None:
+        q = q.where(Payment.tg_id == tg_id)
+    return q
+
+
+def txns_query(
+    since: datetime | None = None, until: datetime | None = None,
+    provider: str | None = None, state: str | None = None,
+):
+    q = select(*TXN_EXPORT_COLUMNS)
+    if since is not None:
+        q = q.where(Txn.created_at >= since)
+    if until is not None:
+        q = q.where(Txn.created_at < until)
+    if provider:
+        q = q.where(Txn.provider == provider)
+    if state:
+        q = q.where(Txn.state == state)
+    return q
+
+
+async def keyset_page(
+    q, id_col, after_id: int | None = None, before_id: int | None = None,
+    limit: int = 1000, desc: bool = False,
+) -> list[tuple]:
+    """
+    OFFSET’siz sahifa: after_id < id < before_id, id bo‘yicha tartiblangan
+    (desc=True — kamayish). Har sahifa — alohida qisqa so‘rov,
+    qanchalik chuqur varaqlansa ham narxi bir xil.
+    """
+    if after_id is not None:
+        q = q.where(id_col > after_id)
+    if before_id is not None:
+        q = q.where(id_col < before_id)
+    q = q.order_by(id_col.desc() if desc else id_col).limit(limit)
+    async with Session() as s:
+        return [tuple(r) for r in (await s.execute(q)).all()]
+
+
 async def list_payments_today_utc():
     now = datetime.utcnow()
     start = datetime(now.year, now.month, now.day)  # UTC today 00:00
@@ -64,55 +155,96 @@ def gen_pay_code() -> str:
     return str(random.randint(10000000, 99999999))  # 8 xonali
 
 
-async def ensure_user(tg_id: int) -> User:
-    async with Session() as s:
-        # ✅ tg_id PRIMARY KEY bo'lgani uchun get() ideal ishlaydi
-        u = await s.get(User, tg_id)
-        if u:
-            return u
+PAY_CODE_ATTEMPTS = 10
 
-        # ✅ unique pay_code
-        while True:
-            code = gen_pay_code()
-            res = await s.execute(select(User).where(User.pay_code == code))
-            if not res.scalars().first():
-                break
 
-        u = User(tg_id=tg_id, pay_code=code)
-        s.add(u)
-        await s.commit()
+# Bitta statement: yangi user’ni qo‘shadi yoki borini qaytaradi.
+# tg_id yoki pay_code band bo‘lsa INSERT jim o‘tkazib yuboriladi.
+ENSURE_USER_SQL = text("""
+    WITH ins AS (
+        INSERT INTO users (tg_id, pay_code, created_at)
+        VALUES (:tg_id, :pay_code, CAST(:now AS timestamp))
+        ON CONFLICT DO NOTHING
+        RETURNING tg_id, pay_code
+    )
+    SELECT tg_id, pay_code FROM ins
+    UNION ALL
+    SELECT tg_id, pay_code FROM users WHERE tg_id = :tg_id
+    LIMIT 1
+""")
+
+
+async def ensure_user(tg_id: int) -> User:
+    u = user_cache.get_by_tg(tg_id)
+    if u:
         return u
 
+    async with autocommit_engine.connect() as conn:
+        for _ in range(PAY_CODE_ATTEMPTS):
+            params = {"tg_id": tg_id, "pay_code": gen_pay_code(), "now": datetime.utcnow()}
+            row = (await conn.execute(ENSURE_USER_SQL, params)).first()
+            if row:
+                u = User(tg_id=row.tg_id, pay_code=row.pay_code)
+                user_cache.put(u)
+                return u
+            # bo‘sh natija: pay_code to‘qnashdi yoki parallel /start hali commit
+            # qilmagan edi — keyingi urinish yangi snapshot va yangi kod bilan
+
+    raise RuntimeError(f"pay_code ajratib bo‘lmadi: tg_id={tg_id}")
+
 
 async def get_user_by_pay_code(pay_code: str):
     pay_code = (pay_code or "").strip()
     if not pay_code:
         return None
+    u = user_cache.get_by_code(pay_code)
+    if u:
+        return u
     async with Session() as s:
         res = await s.execute(select(User).where(User.pay_code == pay_code))
-        return res.scalars().first()
+        u = res.scalars().first()
+        if u:
+            user_cache.put(u)
+        return u
 
 
-async def upsert_subscription(tg_id: int, days: int):
-    now = datetime.utcnow()
-    days = normalize_plan_days(days)
+# Atomar upsert: obuna hali faol bo‘lsa muddat ustiga qo‘shiladi, aks holda
+# hozirdan boshlab qayta yoqiladi. Qator lock’i parallel to‘lovlarda kunlar
+# yo‘qolishiga yo‘l qo‘ymaydi. text(): pg ON CONFLICT core konstruksiyasi
+# SQLAlchemy kompilyatsiya keshiga tushmaydi, bu esa har chaqiruvda ~1ms.
+EXTEND_SUBSCRIPTION_SQL = text("""
+    INSERT INTO subscriptions AS s
+        (tg_id, expires_at, active, warned_3d, warned_1d, last_renewal_notice)
+    VALUES (:tg_id, CAST(:now AS timestamp) + CAST(:delta AS interval), true, false, false, NULL)
+    ON CONFLICT (tg_id) DO UPDATE SET
+        expires_at = CASE
+            WHEN s.active AND s.expires_at > CAST(:now AS timestamp)
+                THEN s.expires_at + CAST(:delta AS interval)
+            ELSE CAST(:now AS timestamp) + CAST(:delta AS interval)
+        END,
+        active = true,
+        warned_3d = false,
+        warned_1d = false,
+        last_renewal_notice = NULL
+    RETURNING expires_at
+""")
+
+
+def extend_subscription_params(tg_id: int, days: int, now: datetime | None = None) -> dict:
+    return {"tg_id": tg_id, "now": now or datetime.utcnow(), "delta": timedelta(days=days)}
+
+
+async def extend_subscription(tg_id: int, days: int) -> datetime:
+    """To‘lov va admin /give uchun umumiy yo‘l (days normalizatsiya qilinmaydi)"""
+    async with autocommit_engine.connect() as conn:
+        res = await conn.execute(EXTEND_SUBSCRIPTION_SQL, extend_subscription_params(tg_id, days))
+        expires_at = res.scalar_one()
+    sub_cache.invalidate(tg_id, SubStatus(True, expires_at))
+    return expires_at
 
-    async with Session() as s:
-        sub = await s.get(Subscription, tg_id)
-        if sub and sub.active and sub.expires_at > now:
-            sub.expires_at = sub.expires_at + timedelta(days=days)
-        else:
-            if not sub:
-                sub = Subscription(tg_id=tg_id, expires_at=now + timedelta(days=days), active=True)
-                s.add(sub)
-            else:
-                sub.expires_at = now + timedelta(days=days)
-                sub.active = True
-                sub.warned_3d = False
-                sub.warned_1d = False
-                sub.last_renewal_notice = None
-        await s.commit()
-        return sub.expires_at
+
+async def upsert_subscription(tg_id: int, days: int):
+    return await extend_subscription(tg_id, normalize_plan_days(days))
 
 
 async def deactivate_subscription(tg_id: int):
@@ -121,18 +253,147 @@ async def deactivate_subscription(tg_id: int):
         if sub:
             sub.active = False
             await s.commit()
+            sub_cache.invalidate(tg_id, SubStatus(False, sub.expires_at))
+
+
+class SubStatus(NamedTuple):
+    active: bool
+    expires_at: datetime
+
+    def is_active(self, now: datetime | None = None) -> bool:
+        return self.active and self.expires_at > (now or datetime.utcnow())
+
+
+async def get_subscription_status(tg_id: int) -> SubStatus | None:
+    """Keshdan o‘qiydi; obunasi yo‘q user uchun None ham keshlanadi"""
+    st = sub_cache.get(tg_id)
+    if st is not MISSING:
+        return st
+
+    version = sub_cache.version
+    async with Session() as s:
+        res = await s.execute(
+            select(Subscription.active, Subscription.expires_at).where(Subscription.tg_id == tg_id)
+        )
+        row = res.first()
+    st = SubStatus(row.active, row.expires_at) if row else None
+    sub_cache.set_if_unchanged(tg_id, st, version)
+    return st
 
 
 async def add_payment(
     tg_id: int, provider: str, amount_uzs: int, status: str,
     plan_days: int, ext_id: str | None = None
 ):
+    now = datetime.utcnow()
     async with Session() as s:
         s.add(Payment(
             tg_id=tg_id, provider=provider, amount=amount_uzs,
-            status=status, plan_days=plan_days, ext_id=ext_id
+            status=status, plan_days=plan_days, ext_id=ext_id, created_at=now
         ))
+        await s.execute(ROLLUP_PAYMENT_SQL, rollup_payment_params(provider, amount_uzs, now))
+        await s.commit()
+
+
+# ------------------- statistika (payment_daily rollup) -------------------
+# UTC vaqtdagi to‘lovni har bir rollup zonasining mahalliy kuniga qo‘shadi
+# (n=-1 — bekor qilingan to‘lovni o‘sha kundan ayiradi)
+ROLLUP_PAYMENT_SQL = text("""
+    INSERT INTO payment_daily AS d (tz, day, provider, count, amount)
+    SELECT z.tz,
+           CAST(timezone(z.tz, timezone('UTC', CAST(:created_at AS timestamp))) AS date),
+           lower(CAST(:provider AS varchar)), CAST(:n AS integer), CAST(:amount AS bigint)
+    FROM unnest(CAST(:tzs AS varchar[])) AS z(tz)
+    ON CONFLICT (tz, day, provider) DO UPDATE
+    SET count = d.count + EXCLUDED.count, amount = d.amount + EXCLUDED.amount
+""")
+
+BACKFILL_ROLLUP_SQL = text("""
+    INSERT INTO payment_daily (tz, day, provider, count, amount)
+    SELECT CAST(:tz AS varchar),
+           CAST(timezone(:tz, timezone('UTC', created_at)) AS date),
+           lower(provider), count(*), coalesce(sum(amount), 0)
+    FROM payments
+    WHERE status <> 'cancelled'
+    GROUP BY 2, 3
+""")
+
+# oxirgi :days kalendar kun (bugun ham kiradi), kun :tz bo‘yicha
+ROLLUP_STATS_SQL = text("""
+    SELECT provider, sum(count), sum(amount)
+    FROM payment_daily
+    WHERE tz = :tz AND day > CAST(timezone(:tz, now()) AS date) - CAST(:days AS integer)
+    GROUP BY provider
+""")
+
+# rollup yuritilmaydigan zona uchun: to‘g‘ridan-to‘g‘ri payments bo‘yicha
+RAW_STATS_SQL = text("""
+    SELECT lower(provider), count(*), coalesce(sum(amount), 0)
+    FROM payments
+    WHERE created_at >= timezone('UTC', timezone(:tz,
+        CAST(CAST(timezone(:tz, now()) AS date) - CAST(:days AS integer) + 1 AS timestamp)))
+      AND status <> 'cancelled'
+    GROUP BY 1
+""")
+
+
+def rollup_payment_params(provider: str, amount_uzs: int, created_at: datetime, n: int = 1) -> dict:
+    return {
+        "tzs": list(STATS_ROLLUP_TZS), "created_at": created_at,
+        "provider": provider or "unknown", "n": n, "amount": n * int(amount_uzs or 0),
+    }
+
+
+async def backfill_payment_daily() -> list[str]:
+    """
+    Rollup’i hali to‘ldirilmagan zonalarni payments’dan to‘ldiradi
+    (birinchi ishga tushish yoki STATS_TZ o‘zgarganda). returns: to‘ldirilgan zonalar.
+    Oddiy startup’da — marker jadvalidan bitta kichik SELECT, lock yo‘q.
+    """
+    async with Session() as s:
+        done = set((await s.execute(select(PaymentDailyBackfill.tz))).scalars().all())
+        if done.issuperset(STATS_ROLLUP_TZS):
+            return []
+        # backfill paytida yangi to‘lov yozilmasin — aks holda ikki marta sanaladi
+        await s.execute(text("LOCK TABLE payments IN SHARE MODE"))
+        done = set((await s.execute(select(PaymentDailyBackfill.tz))).scalars().all())
+        missing = [tz for tz in STATS_ROLLUP_TZS if tz not in done]
+        for tz in missing:
+            # boshqa instance lock’gacha yozib ulgurgan qatorlar — noldan qayta hisoblanadi
+            await s.execute(text("DELETE FROM payment_daily WHERE tz = :tz"), {"tz": tz})
+            await s.execute(BACKFILL_ROLLUP_SQL, {"tz": tz})
+            s.add(PaymentDailyBackfill(tz=tz))
         await s.commit()
+    return missing
+
+
+def stats_day_start(days: int = 1, tz: str = STATS_TZ) -> datetime:
+    """
+    payment_stats(days) oralig‘ining boshi (naive UTC): tz bo‘yicha bugundan
+    days-1 kun oldingi 00:00. Eksportlar ham shu chegara bilan kesadi.
+    """
+    zone = ZoneInfo(tz)
+    day = datetime.now(zone).date() - timedelta(days=days - 1)
+    return datetime.combine(day, dtime.min, tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def payment_stats(days: int = 1, tz: str = STATS_TZ) -> dict[str, dict]:
+    """
+    Oxirgi ``days`` kalendar kun (1 = bugun) bo‘yicha provider kesimida.
+    returns: {"payme": {"count":..,"sum":..}, "click": ..., "all": {...}}
+    """
+    q = ROLLUP_STATS_SQL if tz in STATS_ROLLUP_TZS else RAW_STATS_SQL
+    async with Session() as s:
+        rows = (await s.execute(q, {"tz": tz, "days": days})).all()
+
+    by: dict[str, dict] = {}
+    for provider, count, amount in rows:
+        by[provider] = {"count": int(count), "sum": int(amount)}
+    by["all"] = {
+        "count": sum(v["count"] for v in by.values()),
+        "sum": sum(v["sum"] for v in by.values()),
+    }
+    return by
 
 
 async def get_active_subscriptions():
@@ -141,20 +402,120 @@ async def get_active_subscriptions():
         return res.scalars().all()
 
 
-async def get_or_create_txn(provider: str, ext_id: str, tg_id: int, plan_days: int, amount_uzs: int):
+async def due_expired_subscriptions(now: datetime | None = None) -> list[int]:
+    """
+    Muddati o‘tgan, hali chiqarilmagan obunalar (ix_subs_active_expires).
+    active=True + o‘tgan muddat — "kick kutilmoqda" belgisi: active=False
+    faqat kick’dan keyin qo‘yiladi (expire_subscriptions), shuning uchun ban
+    yiqilsa yoki process sweep o‘rtasida o‘lsa, keyingi sweep qayta urinadi.
+    """
+    now = now or datetime.utcnow()
     async with Session() as s:
-        res = await s.execute(select(Txn).where(Txn.provider == provider, Txn.ext_id == ext_id))
-        txn = res.scalars().first()
+        res = await s.execute(
+            select(Subscription.tg_id)
+            .where(Subscription.active == True, Subscription.expires_at <= now)
+        )
+        return list(res.scalars().all())
+
+
+async def expire_subscriptions(tg_ids, now: datetime | None = None, batch: int = 5000) -> list[int]:
+    """Chiqarilganlarni active=False qiladi; shu orada uzaytirilganlar tegilmaydi."""
+    now = now or datetime.utcnow()
+    tg_ids = list(tg_ids)
+    expired = []
+    async with Session() as s:
+        for i in range(0, len(tg_ids), batch):
+            res = await s.execute(
+                update(Subscription)
+                .where(
+                    Subscription.tg_id.in_(tg_ids[i:i + batch]),
+                    Subscription.active == True,
+                    Subscription.expires_at <= now,
+                )
+                .values(active=False)
+                .returning(Subscription.tg_id)
+                .execution_options(synchronize_session=False)
+            )
+            expired += res.scalars().all()
+        await s.commit()
+    for tg_id in expired:
+        sub_cache.invalidate(tg_id)
+    return expired
+
+
+async def claim_due_reminders(now: datetime | None = None) -> list[tuple[int, datetime, int]]:
+    """
+    3 kun / 1 kun eslatmasi kerak bo‘lgan obunalarni belgilab qaytaradi.
+    returns: [(tg_id, expires_at, 3 yoki 1), ...]
+    """
+    now = now or datetime.utcnow()
+    day = timedelta(days=1)
+    async with Session() as s:
+        # avval 1 kun — ular 3 kunlik eslatmani ham olgan hisoblanadi
+        res_1d = await s.execute(
+            update(Subscription)
+            .where(
+                Subscription.active == True,
+                Subscription.warned_1d == False,
+                Subscription.expires_at > now,
+                Subscription.expires_at <= now + day,
+            )
+            .values(warned_1d=True, warned_3d=True, last_renewal_notice=now)
+            .returning(Subscription.tg_id, Subscription.expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        due = [(tg_id, exp, 1) for tg_id, exp in res_1d.all()]
+
+        res_3d = await s.execute(
+            update(Subscription)
+            .where(
+                Subscription.active == True,
+                Subscription.warned_3d == False,
+                Subscription.expires_at > now + day,
+                Subscription.expires_at <= now + 3 * day,
+            )
+            .values(warned_3d=True, last_renewal_notice=now)
+            .returning(Subscription.tg_id, Subscription.expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        due += [(tg_id, exp, 3) for tg_id, exp in res_3d.all()]
+
+        await s.commit()
+        return due
+
+
+# Parallel takrorlar (bir xil provider/ext_id) unique index’da to‘qnashadi —
+# INSERT jim o‘tkazib yuboriladi, keyingi SELECT birinchisining qatorini oladi
+CREATE_TXN_SQL = text("""
+    INSERT INTO txns (provider, ext_id, tg_id, plan_days, amount_uzs, state, created_at, provider_time)
+    VALUES (:provider, :ext_id, :tg_id, :plan_days, :amount_uzs, 'created',
+            CAST(:now AS timestamp), CAST(:provider_time AS bigint))
+    ON CONFLICT (provider, ext_id) DO NOTHING
+""")
+
+
+async def get_or_create_txn(
+    provider: str, ext_id: str, tg_id: int, plan_days: int, amount_uzs: int,
+    provider_time: int | None = None,
+):
+    q = select(Txn).where(Txn.provider == provider, Txn.ext_id == ext_id)
+    async with Session() as s:
+        txn = (await s.execute(q)).scalars().first()
         if txn:
             return txn
 
-        txn = Txn(
-            provider=provider, ext_id=ext_id, tg_id=tg_id,
-            plan_days=plan_days, amount_uzs=amount_uzs, state="created"
-        )
-        s.add(txn)
+        await s.execute(CREATE_TXN_SQL, {
+            "provider": provider, "ext_id": ext_id, "tg_id": tg_id, "plan_days": plan_days,
+            "amount_uzs": amount_uzs, "now": datetime.utcnow(), "provider_time": provider_time,
+        })
         await s.commit()
-        return txn
+        return (await s.execute(q)).scalars().first()
+
+
+async def get_txn(provider: str, ext_id: str) -> Txn | None:
+    async with Session() as s:
+        res = await s.execute(select(Txn).where(Txn.provider == provider, Txn.ext_id == ext_id))
+        return res.scalars().first()
 
 
 async def update_txn_state(provider: str, ext_id: str, state: str):
@@ -163,8 +524,225 @@ async def update_txn_state(provider: str, ext_id: str, state: str):
         txn = res.scalars().first()
         if not txn:
             return None
+        # yakunlangan txn qayta "prepared" ga tushmaydi (Click action=0 takrori)
+        if txn.state in ("performed", "cancelled"):
+            return txn
         txn.state = state
         if state == "performed":
             txn.performed_at = datetime.utcnow()
         await s.commit()
         return txn
+
+
+class Completion(NamedTuple):
+    """complete_payment natijasi. state: performed / cancelled / missing"""
+    state: str
+    expires_at: datetime | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.state == "performed"
+
+
+# (provider, ext_id) -> ishlayotgan yakunlash; bir vaqtdagi takrorlar shunga qo‘shiladi
+_finalizing: dict[tuple[str, str], asyncio.Task] = {}
+
+
+async def complete_payment(provider: str, ext_id: str) -> Completion:
+    """
+    To‘lovni yakunlash, (provider, ext_id) bo‘yicha idempotent: obuna,
+    Payment va invite faqat bir marta yoziladi, takrorlar saqlangan
+    expires_at’ni oladi. Txn yo‘q yoki bekor qilingan bo‘lsa — yozuvsiz
+    Completion("missing" / "cancelled").
+
+    tg_id / plan_days / summa lock qilingan Txn’dan olinadi — so‘rovdagi
+    qiymatlarni chaqiruvchi txn bilan solishtiradi.
+
+    Bitta process’dagi bir vaqtdagi takrorlar bitta bajarilishni kutadi;
+    boshqa instance’lar bilan poyga — Txn qatoridagi FOR UPDATE lock’da.
+    """
+    key = (provider, ext_id)
+    task = _finalizing.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_complete_payment(provider, ext_id))
+        _finalizing[key] = task
+        task.add_done_callback(lambda _: _finalizing.pop(key, None))
+    # chaqiruvchi bekor qilinsa (klient uzildi) ham yakunlash oxirigacha boradi
+    return await asyncio.shield(task)
+
+
+async def _complete_payment(provider: str, ext_id: str) -> Completion:
+    """Hammasi bitta tranzaksiyada. Telegram’ga murojaat yo‘q (worker yuboradi)."""
+    now = datetime.utcnow()
+    async with Session() as s:
+        res = await s.execute(
+            select(Txn).where(Txn.provider == provider, Txn.ext_id == ext_id).with_for_update()
+        )
+        txn = res.scalars().first()
+        if txn is None:
+            return Completion("missing")
+        if txn.state == "cancelled":
+            return Completion("cancelled")
+        if txn.state == "performed":
+            expires_at = txn.expires_at
+            if expires_at is None:
+                # m007’dan oldin yakunlangan: natija saqlanmagan — joriy obuna muddati
+                expires_at = await s.scalar(
+                    select(Subscription.expires_at).where(Subscription.tg_id == txn.tg_id)
+                )
+            return Completion("performed", expires_at)
+
+        tg_id, plan_days, amount_uzs = txn.tg_id, txn.plan_days, txn.amount_uzs
+        res = await s.execute(
+            EXTEND_SUBSCRIPTION_SQL,
+            extend_subscription_params(tg_id, normalize_plan_days(plan_days), now),
+        )
+        expires_at = res.scalar_one()
+        txn.state = "performed"
+        txn.performed_at = now
+        txn.expires_at = expires_at
+        s.add(Payment(
+            tg_id=tg_id, provider=provider, amount=amount_uzs,
+            status="success", plan_days=plan_days, ext_id=ext_id, created_at=now
+        ))
+        await s.execute(ROLLUP_PAYMENT_SQL, rollup_payment_params(provider, amount_uzs, now))
+        s.add(InviteOutbox(tg_id=tg_id, provider=provider, ext_id=ext_id, next_attempt_at=now))
+        await s.commit()
+
+    sub_cache.invalidate(tg_id, SubStatus(True, expires_at))
+    return Completion("performed", expires_at)
+
+
+async def cancel_txn(provider: str, ext_id: str, reason: int | None) -> Txn | None:
+    """
+    Txn’ni bekor qiladi (qator lock bilan). performed bo‘lsa — qaytarish:
+    Payment "cancelled", obuna plan_days ga qisqaradi, rollup’dan ayriladi,
+    yetkazilmagan invite’lar to‘xtatiladi (attempts = INVITE_MAX_ATTEMPTS).
+    Allaqachon bekor qilingan bo‘lsa o‘zgarmaydi.
+    """
+    now = datetime.utcnow()
+    async with Session() as s:
+        res = await s.execute(
+            select(Txn).where(Txn.provider == provider, Txn.ext_id == ext_id).with_for_update()
+        )
+        txn = res.scalars().first()
+        if txn is None or txn.state == "cancelled":
+            return txn
+
+        refund = txn.state == "performed"
+        txn.state = "cancelled"
+        txn.cancelled_at = now
+        txn.reason = reason
+        expires_at = None
+        if refund:
+            paid = (await s.execute(
+                update(Payment)
+                .where(Payment.provider == provider, Payment.ext_id == ext_id, Payment.status == "success")
+                .values(status="cancelled")
+                .returning(Payment.amount, Payment.created_at)
+                .execution_options(synchronize_session=False)
+            )).all()
+            for amount, created_at in paid:
+                await s.execute(ROLLUP_PAYMENT_SQL, rollup_payment_params(provider, amount, created_at, n=-1))
+            if paid:
+                expires_at = (await s.execute(
+                    update(Subscription)
+                    .where(Subscription.tg_id == txn.tg_id)
+                    .values(expires_at=Subscription.expires_at - timedelta(days=normalize_plan_days(txn.plan_days)))
+                    .returning(Subscription.expires_at)
+                    .execution_options(synchronize_session=False)
+                )).scalar()
+            # yetkazilmagan invite’lar qaytarilgan to‘lov uchun yuborilmasin
+            await s.execute(
+                update(InviteOutbox)
+                .where(
+                    InviteOutbox.provider == provider, InviteOutbox.ext_id == ext_id,
+                    InviteOutbox.delivered_at.is_(None),
+                )
+                .values(attempts=INVITE_MAX_ATTEMPTS, last_error="payment cancelled")
+                .execution_options(synchronize_session=False)
+            )
+        await s.commit()
+
+    if refund:
+        # muddati o‘tib qolgan bo‘lsa job_check_subs chiqarib yuboradi
+        sub_cache.invalidate(txn.tg_id)
+    return txn
+
+
+# Payme GetStatement: ix_txns_provider_created bo‘yicha, ORM obyektlarsiz
+STATEMENT_COLUMNS = (
+    Txn.id, Txn.ext_id, Txn.provider_time, Txn.amount_uzs, User.pay_code,
+    Txn.created_at, Txn.performed_at, Txn.cancelled_at, Txn.state, Txn.reason,
+)
+
+
+async def stream_txn_statement(provider: str, since: datetime, until: datetime, batch: int = 2000):
+    """since <= created_at <= until; tuple ro‘yxatlari (server-side cursor)"""
+    q = (
+        select(*STATEMENT_COLUMNS)
+        .join(User, User.tg_id == Txn.tg_id, isouter=True)
+        .where(Txn.provider == provider, Txn.created_at >= since, Txn.created_at <= until)
+        .order_by(Txn.created_at)
+        .execution_options(yield_per=batch)
+    )
+    async with Session() as s:
+        res = await s.stream(q)
+        async for part in res.partitions():
+            yield [tuple(r) for r in part]
+
+
+# ------------------- invite outbox -------------------
+async def claim_invite_jobs(limit: int = 20, lease: timedelta = timedelta(minutes=2)):
+    """
+    Yuborish vaqti kelgan invite’larni oladi. Qator lease muddatiga suriladi —
+    worker yiqilsa, lease tugagach boshqa urinishda qayta olinadi.
+    returns: [(id, tg_id, attempts), ...]
+    """
+    now = datetime.utcnow()
+    due = (
+        select(InviteOutbox.id)
+        .where(
+            InviteOutbox.delivered_at.is_(None),
+            InviteOutbox.next_attempt_at <= now,
+            InviteOutbox.attempts < INVITE_MAX_ATTEMPTS,
+        )
+        .order_by(InviteOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    async with Session() as s:
+        res = await s.execute(
+            update(InviteOutbox)
+            .where(InviteOutbox.id.in_(due.scalar_subquery()))
+            .values(next_attempt_at=now + lease, attempts=InviteOutbox.attempts + 1)
+            .returning(InviteOutbox.id, InviteOutbox.tg_id, InviteOutbox.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        jobs = [tuple(r) for r in res.all()]
+        await s.commit()
+        return jobs
+
+
+async def mark_invite_delivered(job_id: int):
+    async with Session() as s:
+        await s.execute(
+            update(InviteOutbox)
+            .where(InviteOutbox.id == job_id)
+            .values(delivered_at=datetime.utcnow(), last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        await s.commit()
+
+
+async def mark_invite_failed(job_id: int, attempts: int, error: str):
+    # eksponensial backoff, ko‘pi bilan 1 soat
+    delay = min(INVITE_RETRY_BASE_SEC * 2 ** max(attempts - 1, 0), 3600)
+    async with Session() as s:
+        await s.execute(
+            update(InviteOutbox)
+            .where(InviteOutbox.id == job_id)
+            .values(next_attempt_at=datetime.utcnow() + timedelta(seconds=delay), last_error=error[:500])
+            .execution_options(synchronize_session=False)
+        )
+        await s.commit()
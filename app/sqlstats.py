@@ -0,0 +1,212 @@
+# app/sqlstats.py
+"""
+SQL instrumentatsiya: engine event’lari orqali har bir statement vaqti.
+
+- normallashtirilgan SQL bo‘yicha yig‘indi (/internal/sql): literal va
+  parametrlar "?" ga, IN (...) / VALUES ro‘yxatlari bittaga qisqaradi
+- SQL_SLOW_MS dan sekin so‘rov — WARNING; parametr qiymatlari yozilmaydi,
+  faqat turlari (pay_code, tg_id va h.k. logga tushmasin)
+- har bir Telegram update / HTTP so‘rov uchun so‘rovlar soni va DB vaqti
+  (contextvar orqali; SQLAlchemy greenlet’lari ham shu context’da ishlaydi).
+  SQL_QUERY_WARN dan ko‘p bo‘lsa — WARNING: N+1 shu yerda ko‘rinadi
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from .config import SQL_SLOW_MS, SQL_QUERY_WARN
+from .metrics import HistogramFamily
+
+log = logging.getLogger(__name__)
+
+# normallashtirilgan statement’lar soni cheklangan; undan keyingilar bitta qatorda
+MAX_STATEMENTS = 500
+OTHER = "<other>"
+
+query_duration = HistogramFamily(
+    "db_query_duration_seconds", "SQL statement latency by operation and table", ("op",))
+queries_per_unit = HistogramFamily(
+    "db_queries_per_unit", "SQL statements per Telegram update / HTTP request", ("kind",),
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50))
+db_time_per_unit = HistogramFamily(
+    "db_time_per_unit_seconds", "Total SQL time per Telegram update / HTTP request", ("kind",))
+
+
+# ------------------- normallashtirish -------------------
+_WS = re.compile(r"\s+")
+_STR = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):\w+\b|\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\?(?:, \?)+\)")
+_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+\"?(\w+)", re.I)
+
+# statement matni -> (normal SQL, op label); SQLAlchemy matnlari takrorlanadi
+_norm_cache: dict[str, tuple[str, str]] = {}
+
+
+def normalize(sql: str) -> str:
+    s = _WS.sub(" ", sql).strip()
+    s = _STR.sub("?", s)
+    s = _PARAM.sub("?", s)
+    s = _ROWS.sub(r"\1, ...", s)
+    return _LIST.sub("(?...)", s)
+
+
+def op_label(sql: str) -> str:
+    """"select users", "insert payment_daily" — Prometheus uchun cheklangan label"""
+    verb = sql.split(" ", 1)[0].lower()
+    m = _TABLE.search(sql)
+    return f"{verb} {m.group(1).lower()}" if m else verb
+
+
+def _describe(statement: str) -> tuple[str, str]:
+    hit = _norm_cache.get(statement)
+    if hit is None:
+        norm = normalize(statement)
+        hit = (norm, op_label(norm))
+        if len(_norm_cache) < MAX_STATEMENTS * 4:
+            _norm_cache[statement] = hit
+    return hit
+
+
+def redact(params, executemany: bool = False) -> str:
+    """Qiymatlar o‘rniga turlari: (int, str, datetime)"""
+    if executemany and isinstance(params, (list, tuple)):
+        first = redact(params[0]) if params else "()"
+        return f"{len(params)} x {first}"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+    return type(params).__name__
+
+
+# ------------------- yig‘indi -------------------
+class StatementStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+_stats: dict[str, StatementStats] = {}
+
+
+def _record(sql: str, seconds: float):
+    st = _stats.get(sql)
+    if st is None:
+        if len(_stats) >= MAX_STATEMENTS:
+            sql = OTHER
+        st = _stats.setdefault(sql, StatementStats())
+    st.count += 1
+    st.total += seconds
+    if seconds > st.max:
+        st.max = seconds
+
+
+def top_statements(limit: int = 20, sort: str = "total") -> list[dict]:
+    key = {
+        "total": lambda kv: kv[1].total,
+        "count": lambda kv: kv[1].count,
+        "max": lambda kv: kv[1].max,
+        "avg": lambda kv: kv[1].total / kv[1].count,
+    }.get(sort)
+    if key is None:
+        raise ValueError(f"sort: total|count|max|avg, got {sort!r}")
+    rows = sorted(_stats.items(), key=key, reverse=True)[:limit]
+    return [
+        {
+            "sql": sql,
+            "count": st.count,
+            "total_ms": round(st.total * 1000, 2),
+            "avg_ms": round(st.total / st.count * 1000, 3),
+            "max_ms": round(st.max * 1000, 2),
+        }
+        for sql, st in rows
+    ]
+
+
+def reset_stats():
+    _stats.clear()
+
+
+# ------------------- update / so‘rov doirasi -------------------
+class QueryScope:
+    __slots__ = ("name", "queries", "seconds")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_scope: ContextVar[QueryScope | None] = ContextVar("sql_scope", default=None)
+
+
+def current_scope() -> QueryScope | None:
+    return _scope.get()
+
+
+@contextmanager
+def query_scope(kind: str, name: str = ""):
+    """
+    kind: "update" | "http". Ichma-ich bo‘lsa (inline rejimda webhook ichida
+    update) ichkisining so‘rovlari tashqisiga ham qo‘shiladi.
+    """
+    parent = _scope.get()
+    sc = QueryScope(name or kind)
+    token = _scope.set(sc)
+    try:
+        yield sc
+    finally:
+        _scope.reset(token)
+        _finish(kind, sc, parent)
+
+
+def _finish(kind: str, sc: QueryScope, parent: QueryScope | None):
+    if parent is not None:
+        parent.queries += sc.queries
+        parent.seconds += sc.seconds
+    queries_per_unit.observe(sc.queries, kind)
+    db_time_per_unit.observe(sc.seconds, kind)
+    if SQL_QUERY_WARN and sc.queries >= SQL_QUERY_WARN:
+        log.warning("%s %s: %d queries, %.1f ms in DB", kind, sc.name, sc.queries, sc.seconds * 1000)
+    elif sc.queries:
+        log.debug("%s %s: %d queries, %.1f ms in DB", kind, sc.name, sc.queries, sc.seconds * 1000)
+
+
+# ------------------- engine event’lari -------------------
+def _before(conn, cursor, statement, parameters, context, executemany):
+    # execution context har bir statement uchun yangi — xatoda tozalash shart emas
+    context._sqlstats_t0 = time.perf_counter()
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._sqlstats_t0
+    sql, op = _describe(statement)
+    _record(sql, seconds)
+    query_duration.observe(seconds, op)
+
+    sc = _scope.get()
+    if sc is not None:
+        sc.queries += 1
+        sc.seconds += seconds
+
+    if seconds * 1000 >= SQL_SLOW_MS:
+        log.warning(
+            "slow query %.1f ms [%s]: %s params=%s",
+            seconds * 1000, sc.name if sc else "-", sql, redact(parameters, executemany),
+        )
+
+
+def instrument_engine(engine):
+    """AsyncEngine yoki oddiy Engine; execution_options() nusxalari ham qamraladi"""
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", _before)
+    event.listen(target, "after_cursor_execute", _after)
@@ -0,0 +1,156 @@
+# app/telemetry.py
+"""
+Metrikalarni yig‘uvchi ilgaklar: HTTP route’lar (ASGI), aiogram handlerlar,
+Bot API chaqiruvlari va mavjud hisoblagichlarni /metrics’ga ulash.
+
+Label’lar faqat cheklangan to‘plamdan: route shabloni (/click/{token} —
+token emas), handler funksiyasi nomi, Bot API metodi.
+"""
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from .antispam import message_throttle, click_throttle
+from .database import engine, pool_metrics
+from .sender import sender
+from .updates import update_queue
+from .sqlstats import query_scope, current_scope
+from .metrics import (
+    Collected, CollectedHistogram,
+    http_duration, http_requests,
+    handler_duration, handler_errors,
+    tg_api_duration, tg_api_errors,
+)
+
+
+# ------------------- HTTP -------------------
+class RouteMetricsMiddleware:
+    """
+    Pure ASGI middleware (BaseHTTPMiddleware’dan arzon). Route’ni routing
+    tugagach scope["endpoint"] orqali aniqlaydi; mos kelmaganlar — "other".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths: dict | None = None
+
+    def _route(self, scope) -> str:
+        if self._paths is None:
+            # endpoint -> path shabloni; route’lar startup’gacha qo‘shilib bo‘ladi
+            self._paths = {
+                r.endpoint: r.path for r in scope["app"].routes if hasattr(r, "endpoint")
+            }
+        return self._paths.get(scope.get("endpoint"), "other")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        t0 = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with query_scope("http") as sc:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = sc.name = self._route(scope)
+                http_duration.observe(time.perf_counter() - t0, route)
+                http_requests.inc(route, str(status))
+
+
+# ------------------- aiogram -------------------
+class UpdateQueryScope(BaseMiddleware):
+    """Outer middleware (dp.update): update boshiga SQL so‘rovlar soni / DB vaqti"""
+
+    async def __call__(self, handler, event, data):
+        with query_scope("update", f"update:{event.event_type}"):
+            return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: antispam’dan keyin ulanadi — rad etilganlar o‘lchanmaydi"""
+
+    async def __call__(self, handler, event, data):
+        h = data.get("handler")
+        name = getattr(getattr(h, "callback", None), "__name__", "unknown")
+        sc = current_scope()
+        if sc is not None:
+            sc.name = name  # slow query / N+1 logida handler nomi
+        t0 = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(name)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - t0, name)
+
+
+class BotApiMetrics(BaseRequestMiddleware):
+    """bot.session middleware: har bir Bot API so‘rovi (sender orqali ham)"""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        t0 = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            tg_api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            tg_api_duration.observe(time.perf_counter() - t0, name)
+
+
+def setup_bot_metrics(dp, bot):
+    dp.update.outer_middleware(UpdateQueryScope())
+    mw = HandlerMetricsMiddleware()
+    for observer in (dp.message, dp.callback_query, dp.chat_member):
+        observer.middleware(mw)
+    bot.session.middleware(BotApiMetrics())
+
+
+# ------------------- mavjud hisoblagichlar -------------------
+def register_collectors(webhook_limiter):
+    """Scrape paytida o‘qiladi — hot path’ga qo‘shimcha ish yo‘q"""
+    Collected(
+        "antispam_rejected_total", "Updates dropped by per-user throttle", "counter",
+        lambda: {("message",): message_throttle.rejected, ("callback_query",): click_throttle.rejected},
+        ("kind",),
+    )
+    Collected(
+        "webhook_rate_limited_total", "Payment webhook requests rejected by IP rate limit", "counter",
+        lambda: webhook_limiter.rejected,
+    )
+
+    Collected("update_queue_depth", "Telegram updates waiting in the queue", "gauge", update_queue.depth)
+    Collected(
+        "update_queue_rejected_total", "Updates rejected because the queue was full", "counter",
+        lambda: update_queue.stats()["rejected"],
+    )
+
+    def sender_queued():
+        return {(p,): n for p, n in sender.stats()["queued"].items()}
+
+    Collected("sender_queued", "Outgoing Bot API calls waiting by priority", "gauge", sender_queued, ("priority",))
+    Collected(
+        "sender_retry_after_total", "Bot API 429 responses (RetryAfter)", "counter",
+        lambda: sender.stats()["retry_after"],
+    )
+
+    Collected("db_pool_checked_out", "DB connections in use", "gauge", lambda: engine.pool.checkedout())
+    Collected("db_pool_overflow", "DB connections above pool_size", "gauge", lambda: max(engine.pool.overflow(), 0))
+    Collected("db_pool_waits_total", "Checkouts that had to wait for a free connection", "counter",
+              lambda: pool_metrics.waits)
+    Collected("db_pool_timeouts_total", "Checkouts that hit pool_timeout", "counter",
+              lambda: pool_metrics.timeouts)
+    CollectedHistogram(
+        "db_pool_checkout_seconds", "Time to get a connection from the pool",
+        lambda: pool_metrics.checkout,
+    )
@@ -0,0 +1,125 @@
+# app/updates.py
+"""
+Telegram update’lar uchun chegaralangan navbat (TG_UPDATE_MODE=queue).
+
+Webhook update’ni navbatga qo‘yib darhol 200 qaytaradi, workerlar esa
+dp.feed_update ni bajaradi. Bitta chatning update’lari doim bitta workerga
+tushadi — tartib saqlanadi.
+"""
+import asyncio
+import logging
+import time
+
+from .config import TG_UPDATE_WORKERS, TG_UPDATE_QUEUE_SIZE, TG_UPDATE_PUT_TIMEOUT
+
+log = logging.getLogger(__name__)
+
+
+def update_chat_key(update) -> int:
+    if update.message:
+        return update.message.chat.id
+    if update.callback_query:
+        return update.callback_query.from_user.id
+    if update.chat_member:
+        return update.chat_member.chat.id
+    if update.my_chat_member:
+        return update.my_chat_member.chat.id
+    return update.update_id
+
+
+class UpdateQueue:
+    def __init__(self, workers: int = 8, maxsize: int = 1000, put_timeout: float = 2.0):
+        self.workers = max(workers, 1)
+        self.maxsize = max(maxsize, self.workers)
+        self.put_timeout = put_timeout
+
+        self._handler = None
+        self._shards: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+
+        self._accepted = 0
+        self._rejected = 0
+        self._processed = 0
+        self._failed = 0
+        self._lag_last = 0.0
+        self._lag_max = 0.0
+        self._lag_avg = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, handler):
+        """handler: async fn(update)"""
+        self._handler = handler
+        per_shard = self.maxsize // self.workers
+        self._shards = [asyncio.Queue(maxsize=per_shard) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._shards]
+
+    async def submit(self, update) -> bool:
+        """Navbatga qo‘yadi; navbat to‘lib, put_timeout ichida joy bo‘shamasa False"""
+        q = self._shards[update_chat_key(update) % self.workers]
+        item = (time.monotonic(), update)
+        try:
+            q.put_nowait(item)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(q.put(item), timeout=self.put_timeout)
+            except asyncio.TimeoutError:
+                self._rejected += 1
+                return False
+        self._accepted += 1
+        return True
+
+    async def stop(self, drain_timeout: float = 10.0):
+        # navbatdagilarni imkon qadar tugatib, keyin workerlarni to‘xtatamiz
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(q.join() for q in self._shards)), timeout=drain_timeout
+            )
+        except asyncio.TimeoutError:
+            log.warning("update queue: %s ta update qayta ishlanmay qoldi", self.depth())
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._shards)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "depth": self.depth(),
+            "depth_per_worker": [q.qsize() for q in self._shards],
+            "maxsize": self.maxsize,
+            "accepted": self._accepted,
+            "rejected": self._rejected,
+            "processed": self._processed,
+            "failed": self._failed,
+            "lag_last_ms": round(self._lag_last * 1000, 2),
+            "lag_avg_ms": round(self._lag_avg * 1000, 2),
+            "lag_max_ms": round(self._lag_max * 1000, 2),
+        }
+
+    async def _worker(self, q: asyncio.Queue):
+        while True:
+            enqueued_at, update = await q.get()
+            lag = time.monotonic() - enqueued_at
+            self._lag_last = lag
+            self._lag_max = max(self._lag_max, lag)
+            self._lag_avg += (lag - self._lag_avg) * 0.05  # EWMA
+            try:
+                await self._handler(update)
+                self._processed += 1
+            except Exception:
+                self._failed += 1
+                log.exception("update %s qayta ishlanmadi", update.update_id)
+            finally:
+                q.task_done()
+
+
+update_queue = UpdateQueue(TG_UPDATE_WORKERS, TG_UPDATE_QUEUE_SIZE, TG_UPDATE_PUT_TIMEOUT)
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from .database import Session
 from .models import Subscription
+from .cache import sub_cache
 
 async def activate_subscription(tg_id, days=30):
     async with Session() as s:
@@ -11,3 +12,4 @@ async def activate_subscription(tg_id, days=30):
         )
         await s.merge(sub)
         await s.commit()
+    sub_cache.invalidate(tg_id)
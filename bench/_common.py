@@ -0,0 +1,60 @@
+# bench/_common.py
+"""
+Benchmark yordamchilari.
+
+DIQQAT: benchmarklar jadvallarni tozalaydi — DATABASE_URL faqat alohida
+(test) bazaga qarashi kerak.
+"""
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# app.main Bot() ni import paytida yaratadi, token formati to‘g‘ri bo‘lishi shart
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+
+from sqlalchemy import text
+
+from app.database import engine, Base
+
+
+async def reset_tables(*names: str):
+    """Jadvallarni yaratadi (bo‘lmasa) va ko‘rsatilganlarini tozalaydi"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        if names:
+            await conn.execute(text(f"TRUNCATE {', '.join(names)} RESTART IDENTITY"))
+
+
+async def bulk_insert(table, rows, chunk: int = 10_000):
+    """rows: dict lar iteratori; chunk-chunk qilib executemany bilan yoziladi"""
+    buf = []
+    async with engine.begin() as conn:
+        for r in rows:
+            buf.append(r)
+            if len(buf) >= chunk:
+                await conn.execute(table.insert(), buf)
+                buf = []
+        if buf:
+            await conn.execute(table.insert(), buf)
+
+
+@contextmanager
+def timer(out: dict, key: str = "seconds"):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        out[key] = time.perf_counter() - t0
+
+
+@contextmanager
+def peak_memory(out: dict, key: str = "peak_mb"):
+    """tracemalloc bilan Python heap cho‘qqisi (MB)"""
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        out[key] = peak / 1024 / 1024
@@ -0,0 +1,73 @@
+# bench/antispam.py
+"""
+Antispam store xotirasi (DB kerak emas).
+
+    python -m bench.antispam --users 2000000 --duration 3600
+
+Har bir user bir marta bosadi (eng yomon holat). Eski defaultdict o‘sib
+boradi, TtlStore esa faqat oxirgi 2*ttl dagi userlarni saqlaydi.
+"""
+import argparse
+import time
+import tracemalloc
+from collections import defaultdict
+
+from app.antispam import TtlStore
+
+DELAY = 1.5
+
+
+def legacy_allow(store, uid: int, now: float) -> bool:
+    if now - store[uid] < DELAY:
+        return False
+    store[uid] = now
+    return True
+
+
+def ttl_allow(store: TtlStore, uid: int, now: float) -> bool:
+    if now - store.last(uid, now) < DELAY:
+        return False
+    store.touch(uid, now)
+    return True
+
+
+def replay(allow, store, n_users: int, duration: float):
+    step = duration / n_users
+    now = 1000.0
+    for uid in range(n_users):
+        allow(store, uid, now)
+        now += step
+
+
+def run_case(name, allow, make, n_users: int, duration: float):
+    store = make()
+    t0 = time.perf_counter()
+    replay(allow, store, n_users, duration)
+    elapsed = time.perf_counter() - t0
+
+    store = make()
+    tracemalloc.start()
+    replay(allow, store, n_users, duration)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:>8} {elapsed / n_users * 1e9:>6.0f} ns/event "
+        f"{current / 1024 / 1024:>7.1f} MB end {peak / 1024 / 1024:>7.1f} MB peak keys={len(store)}"
+    )
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2_000_000)
+    ap.add_argument("--duration", type=float, default=3600.0, help="soxta vaqt oralig‘i, s")
+    ap.add_argument("--ttl", type=float, default=10.0)
+    args = ap.parse_args()
+
+    print(f"users={args.users} duration={args.duration}s ttl={args.ttl}s")
+    run_case("legacy", legacy_allow, lambda: defaultdict(float), args.users, args.duration)
+    # rotatsiya soxta soat bo‘yicha boshlansin
+    run_case("ttl", ttl_allow, lambda: TtlStore(args.ttl, now=1000.0), args.users, args.duration)
+
+
+if __name__ == "__main__":
+    cli()
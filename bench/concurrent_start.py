@@ -0,0 +1,82 @@
+# bench/concurrent_start.py
+"""
+Parallel /start (ensure_user) tekshiruvi: dubl yoki unique xatosi bo‘lmasligi kerak.
+
+    DATABASE_URL=... python -m bench.concurrent_start --users 1000 --repeat 3
+    DATABASE_URL=... python -m bench.concurrent_start --users 1000 --code-space 5000   # to‘qnashuvlarni majburlash
+
+Har bir user ``--repeat`` marta bir vaqtda /start bosadi; kesh o‘chiriladi.
+Xato bo‘lsa exit code 1. Xuddi shu tekshiruv pytest’da: tests/test_ensure_user.py
+"""
+import argparse
+import asyncio
+import random
+import sys
+
+from sqlalchemy import func, select
+
+from bench._common import reset_tables, timer
+
+from app import services
+from app.cache import user_cache
+from app.database import Session
+from app.models import User
+
+
+async def run(n_users: int, repeat: int, code_space: int | None) -> bool:
+    await reset_tables("users")
+    user_cache.clear()
+    if code_space:
+        services.gen_pay_code = lambda: str(10_000_000 + random.randrange(code_space))
+
+    tg_ids = [7_000_000 + i for i in range(n_users)] * repeat
+    random.shuffle(tg_ids)
+
+    async def start(tg_id):
+        # har bir chaqiruv DB’ga borsin
+        user_cache.by_tg.pop(tg_id)
+        return await services.ensure_user(tg_id)
+
+    res = {}
+    with timer(res):
+        results = await asyncio.gather(*(start(t) for t in tg_ids), return_exceptions=True)
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    codes: dict[int, set] = {}
+    for r in results:
+        if not isinstance(r, BaseException):
+            codes.setdefault(r.tg_id, set()).add(r.pay_code)
+
+    async with Session() as s:
+        rows = (await s.execute(select(func.count(), func.count(func.distinct(User.pay_code))))).one()
+
+    inconsistent = [t for t, c in codes.items() if len(c) != 1]
+    all_codes = [next(iter(c)) for c in codes.values()]
+    ok = (
+        not errors
+        and not inconsistent
+        and len(set(all_codes)) == len(all_codes) == n_users
+        and rows[0] == rows[1] == n_users
+    )
+    print(
+        f"calls={len(tg_ids)} users={n_users} seconds={res['seconds']:.2f} "
+        f"errors={len(errors)} inconsistent={len(inconsistent)} "
+        f"db_rows={rows[0]} distinct_codes={rows[1]} -> {'OK' if ok else 'FAIL'}"
+    )
+    for e in errors[:5]:
+        print("  ", repr(e))
+    return ok
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--code-space", type=int, default=None, help="pay_code fazosini toraytirish")
+    args = ap.parse_args()
+    ok = asyncio.run(run(args.users, args.repeat, args.code_space))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,133 @@
+# bench/explain.py
+"""
+Asosiy so‘rovlarning EXPLAIN rejalari: migratsiya indexlari bilan va ularsiz.
+
+    DATABASE_URL=... python -m bench.explain
+    DATABASE_URL=... python -m bench.explain --seed 200000 --analyze
+
+"Oldin" rejasi uchun indexlar tranzaksiya ichida DROP qilinib, keyin
+ROLLBACK qilinadi — baza o‘zgarmaydi, lekin DROP INDEX jadvalni qisqa
+vaqtga qulflaydi: faqat test bazada ishlating. --analyze bilan UPDATE’lar
+ham haqiqatan bajariladi (baribir rollback).
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from bench._common import reset_tables, bulk_insert
+
+from sqlalchemy import text, update
+from sqlalchemy.dialects import postgresql
+
+from app.database import engine
+from app.migrations import run_migrations
+from app.models import Subscription, Payment
+from app.services import payments_query, RAW_STATS_SQL
+
+# migratsiyalar qo‘shgan indexlar
+MIGRATION_INDEXES = ("ix_subs_active_expires", "ix_payments_created_at")
+
+
+def queries(now: datetime):
+    day = timedelta(days=1)
+    return [
+        ("expire sweep (job_check_subs)",
+         update(Subscription)
+         .where(Subscription.active == True, Subscription.expires_at <= now)
+         .values(active=False)
+         .returning(Subscription.tg_id)),
+        ("1-day reminders (job_send_reminders)",
+         update(Subscription)
+         .where(
+             Subscription.active == True,
+             Subscription.warned_1d == False,
+             Subscription.expires_at > now,
+             Subscription.expires_at <= now + day,
+         )
+         .values(warned_1d=True, warned_3d=True, last_renewal_notice=now)
+         .returning(Subscription.tg_id, Subscription.expires_at)),
+        ("payments today (XLSX / CSV export)",
+         payments_query(since=now.replace(hour=0, minute=0, second=0, microsecond=0))
+         .order_by(Payment.id.desc())),
+        ("payments, one day range + provider",
+         payments_query(since=now - 2 * day, until=now - day, provider="payme")
+         .order_by(Payment.id).limit(5000)),
+        ("stats without rollup (GROUP BY provider)",
+         RAW_STATS_SQL.bindparams(tz="Europe/Moscow", days=1)),
+    ]
+
+
+def render(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+async def explain_all(conn, analyze: bool):
+    opts = "ANALYZE, BUFFERS" if analyze else "COSTS"
+    for name, stmt in queries(datetime.utcnow()):
+        plan = (await conn.execute(text(f"EXPLAIN ({opts}) {render(stmt)}"))).scalars().all()
+        print(f"\n-- {name}")
+        for line in plan:
+            print("   ", line)
+
+
+async def seed(n: int):
+    now = datetime.utcnow()
+    rnd = random.Random(1)
+    await reset_tables("subscriptions", "payments")
+    # obunalarning ozgina qismi faol va muddati yaqin — real holatga o‘xshash
+    await bulk_insert(Subscription.__table__, (
+        {
+            "tg_id": 1_000_000 + i,
+            "expires_at": now + timedelta(hours=rnd.randint(-24 * 365, 24 * 30)),
+            "active": rnd.random() < 0.2,
+            "warned_3d": False,
+            "warned_1d": False,
+        }
+        for i in range(n)
+    ))
+    await bulk_insert(Payment.__table__, (
+        {
+            "tg_id": 1_000_000 + i % n,
+            "provider": rnd.choice(("payme", "click")),
+            "amount": 50000,
+            "status": "success",
+            "plan_days": 30,
+            "created_at": now - timedelta(seconds=rnd.randint(0, 365 * 86400)),
+        }
+        for i in range(n)
+    ))
+
+
+async def run(n: int, analyze: bool):
+    await run_migrations()
+    if n:
+        print(f"seeding {n} subscriptions + {n} payments...")
+        await seed(n)
+    async with engine.begin() as conn:
+        await conn.execute(text("ANALYZE subscriptions"))
+        await conn.execute(text("ANALYZE payments"))
+
+    print("=" * 20, "BEFORE (migration indexes dropped)", "=" * 20)
+    async with engine.connect() as conn:
+        for ix in MIGRATION_INDEXES:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {ix}"))
+        await explain_all(conn, analyze)
+        await conn.rollback()
+
+    print("\n" + "=" * 20, "AFTER", "=" * 20)
+    async with engine.connect() as conn:
+        await explain_all(conn, analyze)
+        await conn.rollback()
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seed", type=int, default=0, help="jadvallarni tozalab, shuncha qator yozish")
+    ap.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE (rollback bilan)")
+    args = ap.parse_args()
+    asyncio.run(run(args.seed, args.analyze))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,115 @@
+# bench/export.py
+"""
+XLSX eksport benchmarki: vaqt, xotira cho‘qqisi va event loop kechikishi.
+
+    DATABASE_URL=... python -m bench.export --rows 1000000
+    DATABASE_URL=... python -m bench.export --rows 1000000 --legacy
+
+Eksport davomida loop’da 10 ms lik "tick" aylanadi; uning eng katta
+kechikishi — shu vaqtda boshqa update/webhook qancha kutib qolishi.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from bench._common import reset_tables, bulk_insert, timer, peak_memory
+
+from app.models import Payment, User
+from app.reports import build_payments_xlsx
+from app.services import list_payments_since
+from app.exports import export_payments_xlsx
+
+
+async def seed(n: int):
+    await reset_tables("payments", "users")
+    now = datetime.utcnow()
+    rnd = random.Random(1)
+    await bulk_insert(User.__table__, (
+        {"tg_id": 1_000_000 + i, "pay_code": f"{100000 + i}", "created_at": now}
+        for i in range(min(n, 100_000))
+    ))
+    await bulk_insert(Payment.__table__, (
+        {
+            "tg_id": 1_000_000 + i % 100_000,
+            "provider": rnd.choice(("payme", "click")),
+            "amount": 50000,
+            "status": "success",
+            "ext_id": f"ext-{i}",
+            "plan_days": 30,
+            "created_at": now - timedelta(seconds=rnd.randint(0, 29 * 86400)),
+        }
+        for i in range(n)
+    ))
+
+
+async def legacy_export(since: datetime) -> str:
+    # eski yo‘l: hamma qator dict bo‘lib xotirada, Workbook loop ichida
+    rows = await list_payments_since(since)
+    data = build_payments_xlsx(rows, "Last 30 days")
+    path = f"/tmp/bench_export_legacy_{os.getpid()}.xlsx"
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+async def measure_lag(stop: asyncio.Event, out: dict, tick: float = 0.01):
+    worst = 0.0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(tick)
+        worst = max(worst, time.perf_counter() - t0 - tick)
+    out["max_lag_ms"] = worst * 1000
+
+
+async def run_once(fn, since: datetime, out: dict) -> int:
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_lag(stop, out))
+    try:
+        path = await fn(since)
+    finally:
+        stop.set()
+        await lag
+    size = os.path.getsize(path)
+    os.unlink(path)
+    return size
+
+
+async def run(n: int, legacy: bool, skip_seed: bool, memory: bool):
+    if not skip_seed:
+        print(f"seeding {n} payments...")
+        await seed(n)
+
+    since = datetime.utcnow() - timedelta(days=30)
+    fn = legacy_export if legacy else (lambda s: export_payments_xlsx(s, "Last 30 days"))
+
+    res = {}
+    with timer(res):
+        size = await run_once(fn, since, res)
+    line = (
+        f"{'legacy' if legacy else 'stream'} rows={n} {res['seconds']:.1f}s "
+        f"max_lag={res['max_lag_ms']:.0f}ms file={size / 1024 / 1024:.1f}MB"
+    )
+    if memory:
+        # tracemalloc sekinlashtiradi — alohida o‘tish
+        mem = {}
+        with peak_memory(mem):
+            await run_once(fn, since, {})
+        line += f" peak={mem['peak_mb']:.1f}MB"
+    print(line)
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--legacy", action="store_true", help="eski build_payments_xlsx yo‘li")
+    ap.add_argument("--skip-seed", action="store_true", help="avvalgi seed’dan foydalanish")
+    ap.add_argument("--no-memory", action="store_true", help="tracemalloc o‘tishini o‘tkazib yuborish")
+    args = ap.parse_args()
+    asyncio.run(run(args.rows, args.legacy, args.skip_seed, not args.no_memory))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,362 @@
+# bench/load.py
+"""
+Webhook yuklama generatori: haqiqiy FastAPI app (app.api) — jarayon ichida
+(ASGI) yoki --url bilan ishlayotgan uvicorn’ga.
+
+    # sintetik aralash: 200 so‘rov/s, 30 s
+    DATABASE_URL=... python -m bench.load --rate 200 --duration 30 --mix tg=70,click=15,payme=15
+
+    # yozib olingan trafikni (WEBHOOK_CAPTURE_PATH) 5x tezlikda
+    DATABASE_URL=... python -m bench.load --replay capture.jsonl --speed 5 --seed-capture
+
+    # tashqi server (CLICK_SECRET / PAYME_SECRET u yerda "dummy" bo‘lishi kerak)
+    python -m bench.load --url http://127.0.0.1:8000 --token change-me --skip-seed --rate 100
+    python -m bench.load --url https://staging.example --token ... --skip-seed --replay capture.jsonl
+    (--url + --skip-seed: BOT_TOKEN ham, DATABASE_URL ham kerak emas)
+
+Open-loop: so‘rovlar jadval bo‘yicha yuboriladi, server sekinlashsa ham
+kutilmaydi (real webhooklar shunday keladi). --max-inflight dan oshsa so‘rov
+tashlanadi va "dropped" da ko‘rinadi — bu server emas, generator chegarasi.
+
+Jarayon ichida ishlaganda WEBHOOK_RATE_LIMIT (hamma so‘rov bitta IP’dan)
+va PUBLIC_BASE_URL (setWebhook) o‘chiriladi. Handlerlar Bot API’ga
+chiqadi — TELEGRAM_API_URL bilan simulyatorga yo‘naltiring (bench.tgsim).
+DIQQAT: DATABASE_URL faqat test bazaga qarashi kerak.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+TG_BASE = 1_000_000
+CODE_BASE = 10_000_000
+
+TG_ACTIONS = (
+    # (ulush, turi, matn / callback_data)
+    (10, "message", "/start"),
+    (40, "message", "👤 Obunam"),
+    (20, "message", "💳 To‘lov qilish"),
+    (30, "callback", "plan:30"),
+)
+ROUTES = {"tg": "/tg/webhook", "click": "/click/{token}", "payme": "/payme/{token}"}
+
+
+# ------------------- sintetik trafik -------------------
+class Traffic:
+    """Har chaqiruvda (route, body). Click: prepare -> perform, Payme: create -> perform juftlari"""
+
+    def __init__(self, users: int, amount: int, seed: int = 1):
+        self.users = users
+        self.amount = amount
+        self.rnd = random.Random(seed)
+        self.update_id = int(time.time()) * 1000
+        self.seq = 0
+        self.pending = {"click": [], "payme": []}
+        self._tg_weights = [w for w, *_ in TG_ACTIONS]
+
+    def _user(self) -> int:
+        return self.rnd.randrange(self.users)
+
+    def tg(self) -> dict:
+        self.update_id += 1
+        i = self._user()
+        user = {"id": TG_BASE + i, "is_bot": False, "first_name": "load"}
+        _, kind, value = self.rnd.choices(TG_ACTIONS, weights=self._tg_weights)[0]
+        msg = {
+            "message_id": self.update_id % 1_000_000,
+            "date": int(time.time()),
+            "chat": {"id": TG_BASE + i, "type": "private", "first_name": "load"},
+            "from": user,
+        }
+        if kind == "message":
+            return {"update_id": self.update_id, "message": {**msg, "text": value}}
+        return {
+            "update_id": self.update_id,
+            "callback_query": {
+                "id": str(self.update_id), "from": user, "chat_instance": "load",
+                "data": value, "message": {**msg, "text": "Tarifni tanlang 👇"},
+            },
+        }
+
+    def _next(self, provider: str):
+        """(perform’mi, trans_id, pay_code): yarmi — oldin tayyorlanganini yakunlash"""
+        pending = self.pending[provider]
+        if pending and self.rnd.random() < 0.5:
+            return True, *pending.pop(self.rnd.randrange(len(pending)))
+        self.seq += 1
+        item = (f"load-{os.getpid()}-{self.seq}", str(CODE_BASE + self._user()))
+        pending.append(item)
+        return False, *item
+
+    def click(self) -> dict:
+        perform, trans_id, pay_code = self._next("click")
+        return {
+            "click_trans_id": trans_id, "service_id": 1, "merchant_trans_id": pay_code,
+            "amount": self.amount, "action": 1 if perform else 0, "sign_time": "",
+        }
+
+    def payme(self) -> dict:
+        perform, trans_id, pay_code = self._next("payme")
+        self.seq += 1
+        if perform:
+            return {"id": self.seq, "method": "PerformTransaction", "params": {"id": trans_id}}
+        params = {
+            "id": trans_id, "time": int(time.time() * 1000),
+            "amount": self.amount * 100, "account": {"pay_code": pay_code},
+        }
+        return {"id": self.seq, "method": "CreateTransaction", "params": params}
+
+
+def parse_mix(s: str) -> dict[str, float]:
+    mix = {}
+    for part in s.split(","):
+        k, _, v = part.partition("=")
+        if k.strip() not in ROUTES:
+            raise SystemExit(f"--mix: noma’lum route {k!r} (tg, click, payme)")
+        mix[k.strip()] = float(v or 1)
+    return mix
+
+
+# ------------------- o‘lchov -------------------
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.status = defaultdict(Counter)
+        self.dropped = Counter()
+
+    def record(self, route: str, seconds: float, status):
+        self.latency[route].append(seconds)
+        self.status[route][status] += 1
+
+    def report(self, wall: float) -> dict:
+        out = {}
+        for route, vals in sorted(self.latency.items()):
+            vals.sort()
+            pick = lambda q: vals[min(int(q * len(vals)), len(vals) - 1)] * 1000
+            out[route] = {
+                "n": len(vals),
+                "rps": round(len(vals) / wall, 1),
+                "p50_ms": round(pick(0.5), 2),
+                "p95_ms": round(pick(0.95), 2),
+                "p99_ms": round(pick(0.99), 2),
+                "max_ms": round(vals[-1] * 1000, 2),
+                "status": dict(self.status[route]),
+                "dropped": self.dropped[route],
+            }
+        return out
+
+
+def print_report(rep: dict, wall: float):
+    print(f"\n{'route':<16} {'n':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'dropped':>7}  status")
+    for route, r in rep.items():
+        print(
+            f"{route:<16} {r['n']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+            f"{r['p99_ms']:>8.2f} {r['max_ms']:>8.2f} {r['dropped']:>7}  {r['status']}"
+        )
+    print(f"wall {wall:.1f}s")
+
+
+async def send(client: httpx.AsyncClient, token: str, route: str, body: dict, stats: Stats, sem: asyncio.Semaphore):
+    try:
+        t0 = time.perf_counter()
+        try:
+            r = await client.post(route.replace("{token}", token), json=body)
+            status = r.status_code
+        except Exception as e:
+            status = type(e).__name__
+        stats.record(route, time.perf_counter() - t0, status)
+    finally:
+        sem.release()
+
+
+async def drive(client, token: str, schedule, stats: Stats, max_inflight: int) -> float:
+    """schedule: (boshidan soniya, route, body) iteratori — vaqt bo‘yicha tartibda"""
+    sem = asyncio.Semaphore(max_inflight)
+    tasks = set()
+    t_start = time.perf_counter()
+    for at, route, body in schedule:
+        delay = at - (time.perf_counter() - t_start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if sem.locked():
+            stats.dropped[route] += 1
+            continue
+        await sem.acquire()
+        t = asyncio.create_task(send(client, token, route, body, stats, sem))
+        tasks.add(t)
+        t.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return time.perf_counter() - t_start
+
+
+def synthetic_schedule(traffic: Traffic, mix: dict[str, float], rate: float, duration: float):
+    kinds, weights = list(mix), list(mix.values())
+    n = int(rate * duration)
+    for i in range(n):
+        kind = traffic.rnd.choices(kinds, weights=weights)[0]
+        yield i / rate, ROUTES[kind], getattr(traffic, kind)()
+
+
+def read_capture(path: str, limit: int = 0) -> list[dict]:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rows.append(json.loads(line))
+                if limit and len(rows) >= limit:
+                    break
+    return rows
+
+
+def replay_schedule(rows: list[dict], speed: float):
+    if not rows:
+        return
+    t0 = rows[0]["t"]
+    for r in rows:
+        yield max(r["t"] - t0, 0) / speed, r["route"], r["body"]
+
+
+def capture_identities(rows: list[dict]) -> tuple[set[int], set[str]]:
+    """Capture’dagi soxta tg_id va PAY CODE’lar — replay’dan oldin users’ga yoziladi"""
+    tg_ids, codes = set(), set()
+    for r in rows:
+        b = r["body"]
+        if r["route"] == ROUTES["tg"]:
+            for key in ("message", "callback_query"):
+                uid = ((b.get(key) or {}).get("from") or {}).get("id")
+                if isinstance(uid, int):
+                    tg_ids.add(uid)
+        elif r["route"] == ROUTES["click"] and b.get("merchant_trans_id"):
+            codes.add(str(b["merchant_trans_id"]))
+        elif r["route"] == ROUTES["payme"]:
+            acc = (b.get("params") or {}).get("account") or {}
+            code = acc.get("pay_code") or acc.get("user_id")
+            if code:
+                codes.add(str(code))
+    return tg_ids, codes
+
+
+# ------------------- seed -------------------
+async def seed_users(n: int):
+    from bench._common import reset_tables, bulk_insert
+    from app.models import User, Subscription
+
+    await reset_tables("users", "subscriptions", "payments", "payment_daily", "txns", "invite_outbox")
+    await bulk_insert(User.__table__, (
+        {"tg_id": TG_BASE + i, "pay_code": str(CODE_BASE + i)} for i in range(n)
+    ))
+    await bulk_insert(Subscription.__table__, (
+        {"tg_id": TG_BASE + i, "expires_at": time_from_now(days=(i % 60) - 20), "active": i % 60 >= 20,
+         "warned_3d": False, "warned_1d": False}
+        for i in range(n)
+    ))
+
+
+async def seed_capture_users(tg_ids: set[int], codes: set[str]):
+    from sqlalchemy.dialects.postgresql import insert
+    from app.database import engine
+    from app.models import User
+
+    # tg_id’si noma’lum PAY CODE’lar uchun: kod’dan hosil qilingan soxta tg_id
+    rows = [{"tg_id": t, "pay_code": f"c{t}"} for t in tg_ids]
+    rows += [{"tg_id": 8_000_000_000 + int(c), "pay_code": c} for c in codes if c.isdigit()]
+    async with engine.begin() as conn:
+        for i in range(0, len(rows), 5000):
+            await conn.execute(insert(User).on_conflict_do_nothing(), rows[i:i + 5000])
+    print(f"seeded {len(tg_ids)} tg users + {len(codes)} pay codes from capture")
+
+
+def time_from_now(days: int):
+    from datetime import datetime, timedelta
+    return datetime.utcnow() + timedelta(days=days)
+
+
+# ------------------- run -------------------
+async def api_engine_dispose():
+    from app.database import engine
+    await engine.dispose()
+
+
+async def run(args):
+    rows = read_capture(args.replay, args.limit) if args.replay else None
+
+    if not args.skip_seed:
+        if rows is not None:
+            if args.seed_capture:
+                await seed_capture_users(*capture_identities(rows))
+        else:
+            print(f"seeding {args.users} users...")
+            await seed_users(args.users)
+
+    if rows is not None:
+        schedule = replay_schedule(rows, args.speed)
+        span = (rows[-1]["t"] - rows[0]["t"]) / args.speed if rows else 0
+        print(f"replaying {len(rows)} requests over {span:.1f}s (x{args.speed})")
+    else:
+        from app.config import PLAN_PRICES_UZS
+        traffic = Traffic(args.users, PLAN_PRICES_UZS[30], args.seed)
+        schedule = synthetic_schedule(traffic, parse_mix(args.mix), args.rate, args.duration)
+        print(f"synthetic {args.rate:g} req/s for {args.duration:g}s, mix {args.mix}")
+
+    stats = Stats()
+    if args.url:
+        # tashqi server: app.main (Bot) import qilinmaydi — token/DB shart emas
+        token = args.token or os.getenv("WEBHOOK_TOKEN", "change-me")
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            wall = await drive(client, token, schedule, stats, args.max_inflight)
+    else:
+        from app import api  # Bot shu yerda yaratiladi
+        await api.app.router.startup()
+        try:
+            transport = httpx.ASGITransport(app=api.app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=args.timeout) as client:
+                wall = await drive(client, args.token or api.WEBHOOK_TOKEN, schedule, stats, args.max_inflight)
+        finally:
+            await api.app.router.shutdown()
+            await api_engine_dispose()
+
+    rep = stats.report(wall)
+    print_report(rep, wall)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "wall_s": round(wall, 2), "routes": rep}, f, indent=2)
+        print(f"written: {args.json}")
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", help="tashqi server (default: jarayon ichida ASGI)")
+    ap.add_argument("--token", default="", help="WEBHOOK_TOKEN (default: env / config’dagi)")
+    ap.add_argument("--rate", type=float, default=100.0, help="so‘rov/soniya (sintetik)")
+    ap.add_argument("--duration", type=float, default=20.0, help="soniya (sintetik)")
+    ap.add_argument("--mix", default="tg=70,click=15,payme=15")
+    ap.add_argument("--users", type=int, default=10_000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--skip-seed", action="store_true")
+    ap.add_argument("--replay", help="WEBHOOK_CAPTURE_PATH fayli")
+    ap.add_argument("--speed", type=float, default=1.0, help="replay tezligi (N x)")
+    ap.add_argument("--limit", type=int, default=0, help="capture’dan faqat birinchi N qator")
+    ap.add_argument("--seed-capture", action="store_true", help="capture’dagi user/PAY CODE’larni bazaga yozish")
+    ap.add_argument("--max-inflight", type=int, default=500)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--json", help="natijani JSON faylga")
+    args = ap.parse_args()
+
+    if not args.url:
+        # config import’dan oldin: bitta IP’dan yuklama, setWebhook kerak emas
+        os.environ.setdefault("WEBHOOK_RATE_LIMIT", "1000000000")
+        os.environ["PUBLIC_BASE_URL"] = ""
+        # jarayon ichidagi Bot haqiqiy token talab qilmaydi (chiquvchi so‘rovlar —
+        # TELEGRAM_API_URL=bench.tgsim yoki shunchaki xato bilan qaytadi)
+        os.environ.setdefault("BOT_TOKEN", "123456:LOAD")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,107 @@
+# bench/ratelimit.py
+"""
+Webhook rate limiter mikrobenchmarki (DB kerak emas).
+
+    python -m bench.ratelimit --ips 100000 --requests 1000000
+
+Eski yo‘l (IP bo‘yicha timestamp ro‘yxati + har so‘rovda allowlist parse)
+bilan yangi RateLimiter/IpAllowlist solishtiriladi: ns/so‘rov va xotira.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from app.ratelimit import RateLimiter, IpAllowlist
+
+ALLOWLIST = "185.234.113.0/24, 91.204.239.0/24, 213.230.116.57, 213.230.65.85, 195.158.31.134"
+
+
+class LegacyLimiter:
+    def __init__(self, limit: int = 40, window: int = 60):
+        self.limit = limit
+        self.window = window
+        self._rate = {}
+
+    def allow(self, ip: str, now: float) -> bool:
+        arr = self._rate.get(ip, [])
+        arr = [t for t in arr if now - t < self.window]
+        if len(arr) >= self.limit:
+            self._rate[ip] = arr
+            return False
+        arr.append(now)
+        self._rate[ip] = arr
+        return True
+
+
+def legacy_ip_allowed(ip: str) -> bool:
+    allowed = {x.strip() for x in ALLOWLIST.split(",") if x.strip()}
+    return ip in allowed
+
+
+def make_traffic(n_ips: int, n_requests: int, seed: int = 1):
+    rnd = random.Random(seed)
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(n_ips)]
+    # bir nechta "issiq" IP (provayder) + ko‘p tasodifiy skaner
+    hot = ips[:5]
+    return [rnd.choice(hot) if rnd.random() < 0.3 else rnd.choice(ips) for _ in range(n_requests)]
+
+
+# soxta soat boshlanishi; RateLimiter avlodlari ham shu soat bilan aylanadi
+START = 1000.0
+
+
+def replay(traffic, limiter_allow, ip_check, duration: float):
+    # so‘rovlar duration soniyaga teng taqsimlanadi
+    step = duration / len(traffic)
+    now = START
+    for ip in traffic:
+        ip_check(ip)
+        limiter_allow(ip, now)
+        now += step
+
+
+def run_case(name, traffic, make, duration: float):
+    limiter_allow, ip_check = make()
+    t0 = time.perf_counter()
+    replay(traffic, limiter_allow, ip_check, duration)
+    elapsed = time.perf_counter() - t0
+
+    limiter_allow, ip_check = make()
+    tracemalloc.start()
+    replay(traffic, limiter_allow, ip_check, duration)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>8} {elapsed / len(traffic) * 1e9:>8.0f} ns/req {peak / 1024 / 1024:>8.1f} MB peak")
+    return limiter_allow.__self__
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ips", type=int, default=100_000)
+    ap.add_argument("--requests", type=int, default=1_000_000)
+    ap.add_argument("--duration", type=float, default=600.0, help="soxta vaqt oralig‘i, s")
+    args = ap.parse_args()
+
+    traffic = make_traffic(args.ips, args.requests)
+    print(f"ips={args.ips} requests={args.requests}")
+
+    legacy = run_case(
+        "legacy", traffic, lambda: (LegacyLimiter().allow, legacy_ip_allowed), args.duration
+    )
+    allowlist = IpAllowlist(ALLOWLIST)
+    bucket = run_case(
+        "bucket", traffic, lambda: (RateLimiter(40, 60, now=START).allow, allowlist.allows), args.duration
+    )
+    print(f"legacy keys={len(legacy._rate)} bucket keys={len(bucket)}")
+
+    # 2 oyna jimlikdan keyin faqat yangi kelgan IP qoladi; legacy o‘smoqda davom etadi
+    end = START + args.duration
+    for i in (1, 2):
+        bucket.allow("203.0.113.1", end + i * bucket.window)
+    print(f"after {2 * bucket.window:.0f}s idle: bucket keys={len(bucket)}")
+    assert len(bucket) == 1, "RateLimiter jim IP’larni o‘chirmadi"
+
+
+if __name__ == "__main__":
+    cli()
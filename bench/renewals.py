@@ -0,0 +1,94 @@
+# bench/renewals.py
+"""
+Parallel obuna uzaytirish: kunlar yo‘qolmasligini tekshiradi va latency’ni o‘lchaydi.
+
+    DATABASE_URL=... python -m bench.renewals --parallel 50 --days 30
+    DATABASE_URL=... python -m bench.renewals --legacy    # eski read-modify-write bilan solishtirish
+
+Bitta user uchun ``--parallel`` ta to‘lov bir vaqtda keladi; yakuniy muddat
+boshlang‘ich + parallel * days bo‘lishi kerak. Xato bo‘lsa exit code 1.
+Xuddi shu tekshiruv pytest’da: tests/test_renewals.py
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bench._common import reset_tables, bulk_insert
+
+from app.database import Session
+from app.models import Subscription
+from app.services import extend_subscription
+
+
+async def legacy_extend(tg_id: int, days: int):
+    # eski yo‘l: get -> Python’da hisoblash -> commit
+    now = datetime.utcnow()
+    async with Session() as s:
+        sub = await s.get(Subscription, tg_id)
+        if sub and sub.active and sub.expires_at > now:
+            sub.expires_at = sub.expires_at + timedelta(days=days)
+        else:
+            sub.expires_at = now + timedelta(days=days)
+            sub.active = True
+        await s.commit()
+        return sub.expires_at
+
+
+async def seed(tg_id: int) -> datetime:
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    await reset_tables("subscriptions")
+    await bulk_insert(Subscription.__table__, [{
+        "tg_id": tg_id, "expires_at": start, "active": True, "warned_3d": False, "warned_1d": False,
+    }])
+    return start
+
+
+async def read_expiry(tg_id: int) -> datetime:
+    async with Session() as s:
+        return (await s.get(Subscription, tg_id)).expires_at
+
+
+async def run(parallel: int, days: int, rounds: int, legacy: bool) -> bool:
+    extend = legacy_extend if legacy else extend_subscription
+    tg_id = 42
+
+    # 1) to‘g‘rilik: parallel uzaytirishlar
+    start = await seed(tg_id)
+    await asyncio.gather(*(extend(tg_id, days) for _ in range(parallel)))
+    got = await read_expiry(tg_id)
+    want = start + timedelta(days=days * parallel)
+    lost_days = (want - got).days
+    ok = got == want
+
+    # 2) latency: ketma-ket chaqiruvlar
+    lat = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        await extend(tg_id, 1)
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+
+    print(
+        f"mode={'legacy' if legacy else 'atomic'} parallel={parallel} lost_days={lost_days} "
+        f"p50={statistics.median(lat):.2f}ms p99={lat[int(len(lat) * 0.99) - 1]:.2f}ms "
+        f"-> {'OK' if ok else 'FAIL'}"
+    )
+    return ok
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--parallel", type=int, default=50)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--rounds", type=int, default=500, help="latency uchun ketma-ket chaqiruvlar")
+    ap.add_argument("--legacy", action="store_true")
+    args = ap.parse_args()
+    ok = asyncio.run(run(args.parallel, args.days, args.rounds, args.legacy))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    cli()
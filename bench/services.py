@@ -0,0 +1,307 @@
+# bench/services.py
+"""
+Servis qatlami mikrobenchmarklari: har bir operatsiya uchun p50/p99 va
+xotira (tracemalloc), natija JSON faylga — keyingi run’lar bilan solishtirish.
+
+    DATABASE_URL=... python -m bench.services
+    DATABASE_URL=... python -m bench.services --users 200000 --payments 500000
+    DATABASE_URL=... python -m bench.services --skip-seed --compare bench_results/services_20240101_120000.json
+
+Seed: users, subscriptions, payments (30 kunga yoyilgan, payment_daily
+rollup bilan), txns. Keshlar (user_cache, sub_cache) har o‘lchovdan oldin
+tozalanadi — DB yo‘li o‘lchanadi.
+
+Hisobot holatlari admin panel va /internal/export ishlatadigan yo‘llar:
+payment_stats (rollup), export_payments_xlsx, iter_csv_gz.
+
+Xotira alohida o‘tishda (tracemalloc sekinlashtiradi): alloc_peak_kb —
+bitta chaqiruvdagi eng katta Python heap o‘sishi, retained_blocks_per_op —
+chaqiruvdan keyin qolgan bloklar (o‘sib borsa — leak).
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bench._common import reset_tables, bulk_insert
+
+from sqlalchemy import text
+
+from app.cache import user_cache, sub_cache
+from app.database import engine
+from app.exports import export_payments_xlsx, iter_csv_gz
+from app.migrations import run_migrations
+from app.models import User, Subscription, Payment, Txn
+from app.reports import PAYMENT_HEADERS
+from app.services import (
+    ensure_user,
+    get_user_by_pay_code,
+    upsert_subscription,
+    get_or_create_txn,
+    update_txn_state,
+    payment_stats,
+    payments_query,
+    backfill_payment_daily,
+)
+
+TG_BASE = 1_000_000
+NEW_TG_BASE = 900_000_000  # ensure_user (yangi user) uchun — seed bilan to‘qnashmaydi
+CODE_BASE = 10_000_000
+
+
+# ------------------- seed -------------------
+async def seed(users: int, payments: int, txns: int):
+    now = datetime.utcnow()
+    rnd = random.Random(1)
+    await reset_tables("users", "subscriptions", "payments", "payment_daily", "txns", "invite_outbox")
+    await bulk_insert(User.__table__, (
+        {"tg_id": TG_BASE + i, "pay_code": str(CODE_BASE + i), "created_at": now}
+        for i in range(users)
+    ))
+    await bulk_insert(Subscription.__table__, (
+        {
+            "tg_id": TG_BASE + i,
+            "expires_at": now + timedelta(hours=rnd.randint(-24 * 90, 24 * 30)),
+            "active": rnd.random() < 0.3,
+            "warned_3d": False,
+            "warned_1d": False,
+        }
+        for i in range(users)
+    ))
+    await bulk_insert(Payment.__table__, (
+        {
+            "tg_id": TG_BASE + rnd.randrange(users),
+            "provider": rnd.choice(("payme", "click")),
+            "amount": rnd.choice((20000, 50000, 120000)),
+            "status": "success",
+            "ext_id": f"seed-{i}",
+            "plan_days": 30,
+            "created_at": now - timedelta(seconds=rnd.randint(0, 30 * 86400)),
+        }
+        for i in range(payments)
+    ))
+    await bulk_insert(Txn.__table__, (
+        {
+            "provider": "payme" if i % 2 else "click",
+            "ext_id": f"seed-{i}",
+            "tg_id": TG_BASE + rnd.randrange(users),
+            "plan_days": 30,
+            "amount_uzs": 50000,
+            "state": rnd.choice(("created", "prepared", "performed")),
+            "created_at": now - timedelta(seconds=rnd.randint(0, 30 * 86400)),
+        }
+        for i in range(txns)
+    ))
+    await backfill_payment_daily()
+    async with engine.begin() as conn:
+        for t in ("users", "subscriptions", "payments", "payment_daily", "txns"):
+            await conn.execute(text(f"ANALYZE {t}"))
+
+
+# ------------------- holatlar -------------------
+def clear_caches():
+    user_cache.clear()
+    sub_cache.clear()
+
+
+def build_cases(args, rnd: random.Random, shared: dict):
+    """(nom, takror soni, op(i) -> coroutine yoki qiymat, sync ekanmi)"""
+    users, txns, n = args.users, args.txns, args.iterations
+    run_tag = f"{os.getpid()}-{int(time.time())}"
+
+    def existing_tg():
+        return TG_BASE + rnd.randrange(users)
+
+    def seeded_txn(i):
+        j = rnd.randrange(txns)
+        return ("payme" if j % 2 else "click"), f"seed-{j}"
+
+    def since(days: int) -> datetime:
+        return datetime.utcnow() - timedelta(days=days)
+
+    async def xlsx(i):
+        os.unlink(await export_payments_xlsx(since(1), "bench"))
+
+    async def csv_gz(i):
+        async for _ in iter_csv_gz(payments_query(since(1)), Payment.id, PAYMENT_HEADERS):
+            pass
+
+    return [
+        ("ensure_user/existing", n, lambda i: ensure_user(existing_tg()), False),
+        ("ensure_user/new", n, lambda i: ensure_user(NEW_TG_BASE + shared["new_users"] + i), False),
+        ("get_user_by_pay_code", n, lambda i: get_user_by_pay_code(str(CODE_BASE + rnd.randrange(users))), False),
+        ("upsert_subscription", n, lambda i: upsert_subscription(existing_tg(), 30), False),
+        ("get_or_create_txn/new", n,
+         lambda i: get_or_create_txn("payme", f"bench-{run_tag}-{i}", existing_tg(), 30, 50000), False),
+        ("get_or_create_txn/existing", n,
+         lambda i: get_or_create_txn(*seeded_txn(i), existing_tg(), 30, 50000), False),
+        ("update_txn_state", n, lambda i: update_txn_state(*seeded_txn(i), "prepared"), False),
+        ("payment_stats/1d", n, lambda i: payment_stats(days=1), False),
+        ("payment_stats/30d", n, lambda i: payment_stats(days=30), False),
+        ("export_payments_xlsx/1d", args.heavy_iterations, xlsx, False),
+        ("iter_csv_gz/1d", args.heavy_iterations, csv_gz, False),
+    ]
+
+
+async def call(op, i, is_sync: bool):
+    if is_sync:
+        return op(i)
+    return await op(i)
+
+
+def percentile(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(int(q * len(sorted_vals)), len(sorted_vals) - 1)
+    return sorted_vals[k]
+
+
+async def time_case(op, n: int, is_sync: bool) -> dict:
+    samples = []
+    for i in range(n):
+        clear_caches()
+        t0 = time.perf_counter()
+        await call(op, i, is_sync)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "n": n,
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "mean_ms": round(sum(samples) / n * 1000, 3),
+        "min_ms": round(samples[0] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+async def memory_case(op, n: int, is_sync: bool, offset: int) -> dict:
+    peak = 0
+    gc.collect()
+    blocks0 = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        for i in range(n):
+            clear_caches()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            await call(op, offset + i, is_sync)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    clear_caches()
+    gc.collect()
+    return {
+        "alloc_peak_kb": round(peak / 1024, 1),
+        "retained_blocks_per_op": round((sys.getallocatedblocks() - blocks0) / n, 1),
+    }
+
+
+# ------------------- natija -------------------
+def git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def print_table(results: dict, baseline: dict | None):
+    head = f"{'case':<28} {'n':>5} {'p50 ms':>9} {'p99 ms':>9} {'peak KB':>9} {'blocks/op':>9}"
+    if baseline:
+        head += f" {'p50 vs base':>11} {'p99 vs base':>11}"
+    print(head)
+    for name, r in results.items():
+        line = (
+            f"{name:<28} {r['n']:>5} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} "
+            f"{r.get('alloc_peak_kb', 0):>9.1f} {r.get('retained_blocks_per_op', 0):>9.1f}"
+        )
+        b = (baseline or {}).get(name)
+        if b:
+            for key in ("p50_ms", "p99_ms"):
+                line += f" {r[key] / b[key] if b[key] else 0:>10.2f}x"
+        print(line)
+
+
+async def run(args):
+    await run_migrations()
+    if not args.skip_seed:
+        print(f"seeding users={args.users} payments={args.payments} txns={args.txns}...")
+        await seed(args.users, args.payments, args.txns)
+
+    async with engine.connect() as conn:
+        pg_version = await conn.scalar(text("SHOW server_version"))
+        # oldingi run’lar qo‘shgan yangi userlar — ensure_user/new har safar yangi tg_id oladi
+        new_users = await conn.scalar(
+            text("SELECT count(*) FROM users WHERE tg_id >= :b"), {"b": NEW_TG_BASE},
+        )
+
+    rnd = random.Random(args.seed)
+    shared = {"new_users": new_users}
+    only = set(args.only or ())
+    results = {}
+    for name, n, op, is_sync in build_cases(args, rnd, shared):
+        if only and name not in only and name.split("/")[0] not in only:
+            continue
+        # isitish: prepared statement keshi, pool ulanishlari
+        for i in range(min(args.warmup, n)):
+            await call(op, n * 3 + i, is_sync)
+        res = await time_case(op, n, is_sync)
+        if not args.no_memory:
+            res.update(await memory_case(op, min(n, args.memory_iterations), is_sync, offset=n))
+        results[name] = res
+        print(f"  {name}: p50 {res['p50_ms']:.3f} ms, p99 {res['p99_ms']:.3f} ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git": git_rev(),
+            "python": platform.python_version(),
+            "postgres": pg_version,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join("bench_results", f"services_{datetime.utcnow():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print()
+    print_table(results, baseline)
+    print(f"\nwritten: {out}")
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=100_000)
+    ap.add_argument("--payments", type=int, default=300_000)
+    ap.add_argument("--txns", type=int, default=300_000)
+    ap.add_argument("--skip-seed", action="store_true", help="avvalgi seed’dan foydalanish (hajmlar mos bo‘lsin)")
+    ap.add_argument("--iterations", type=int, default=500, help="nuqtaviy operatsiyalar uchun")
+    ap.add_argument("--heavy-iterations", type=int, default=5, help="xlsx/csv eksport uchun")
+    ap.add_argument("--memory-iterations", type=int, default=50)
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--no-memory", action="store_true", help="tracemalloc o‘tishini o‘tkazib yuborish")
+    ap.add_argument("--only", nargs="*", help="faqat shu holatlar (masalan: ensure_user payment_stats)")
+    ap.add_argument("--seed", type=int, default=1, help="tasodifiy tanlovlar uchun")
+    ap.add_argument("--out", help="JSON fayl (default: bench_results/services_<vaqt>.json)")
+    ap.add_argument("--compare", help="oldingi JSON bilan p50/p99 nisbati")
+    args = ap.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,119 @@
+# bench/sweep.py
+"""
+job_check_subs benchmarki: sweep vaqti va xotira cho‘qqisi.
+
+    DATABASE_URL=... python -m bench.sweep --sizes 10000 100000
+    DATABASE_URL=... python -m bench.sweep --sizes 10000 --legacy
+    DATABASE_URL=... python -m bench.sweep --sizes 10000 --ban-ms 20 --ban-rate 30
+
+Telegram chaqirilmaydi: ikkala yo‘l ham bitta soxta bot’ning ban_chat_member’ini
+chaqiradi (``--ban-ms`` kechikish, ``--ban-rate`` — umumiy so‘rov/s limiti).
+Chat id’lar ``--chats`` dan (env’dagi GROUP_ID/CHANNEL_ID emas), sender’ning
+o‘z limitlari olib tashlanadi — ikkala yo‘l bir xil sondagi ban’ni bir xil
+tezlikda qiladi, farq faqat sweep’ning o‘zida.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from bench._common import reset_tables, bulk_insert, timer, peak_memory
+
+from app import main
+from app.models import Subscription
+from app.sender import TgSender, TokenBucket
+from app.services import get_active_subscriptions, deactivate_subscription
+
+
+async def seed(n: int, expired_ratio: float):
+    now = datetime.utcnow()
+    n_expired = int(n * expired_ratio)
+    await reset_tables("subscriptions")
+    await bulk_insert(Subscription.__table__, (
+        {
+            "tg_id": 1_000_000 + i,
+            "expires_at": now - timedelta(hours=1) if i < n_expired else now + timedelta(days=10),
+            "active": True,
+            "warned_3d": False,
+            "warned_1d": False,
+        }
+        for i in range(n)
+    ))
+    return n_expired
+
+
+async def legacy_job_check_subs():
+    # eski yo‘l: hammasini yuklab, Python’da filtrlab, bittalab ban + deactivate
+    subs = await get_active_subscriptions()
+    now = datetime.utcnow()
+    for sub in subs:
+        if sub.expires_at <= now:
+            for chat_id in (main.GROUP_ID, main.CHANNEL_ID):
+                try:
+                    await main.bot.ban_chat_member(chat_id, sub.tg_id)
+                except Exception:
+                    pass
+            await deactivate_subscription(sub.tg_id)
+
+
+class FakeBot:
+    """main.bot.ban_chat_member o‘rniga: kechikish + ixtiyoriy umumiy rate limit"""
+
+    def __init__(self, ban_ms: float, rate: float):
+        self.ban_ms = ban_ms
+        self.bucket = TokenBucket(rate, max(rate, 1.0), time.monotonic()) if rate else None
+        self.calls = 0
+
+    async def ban_chat_member(self, chat_id, user_id, *args, **kwargs):
+        if self.bucket:
+            while wait := self.bucket.wait_time(time.monotonic()):
+                await asyncio.sleep(wait)
+            self.bucket.take()
+        self.calls += 1
+        if self.ban_ms:
+            await asyncio.sleep(self.ban_ms / 1000)
+        return True
+
+
+async def run(sizes, expired_ratio: float, ban_ms: float, ban_rate: float, chats, legacy: bool):
+    fake = FakeBot(ban_ms, ban_rate)
+    main.bot.ban_chat_member = fake.ban_chat_member
+    main.GROUP_ID, main.CHANNEL_ID = chats
+    # yangi yo‘l sender orqali boradi: uning 30/s bucket’i eski yo‘lda yo‘q —
+    # pacing faqat FakeBot’da, ikkala yo‘l uchun bir xil
+    main.sender = TgSender(global_rate=1e9, chat_rate=1e9, chat_burst=1e9)
+    main.sender.bind(main.bot)
+    job = legacy_job_check_subs if legacy else main.job_check_subs
+
+    print(f"{'subs':>8} {'expired':>8} {'seconds':>9} {'peak_mb':>8} {'bans':>8} {'expected':>8}")
+    for n in sizes:
+        res = {}
+        n_expired = await seed(n, expired_ratio)
+        fake.calls = 0
+        with timer(res):
+            await job()
+        bans = fake.calls
+
+        await seed(n, expired_ratio)
+        with peak_memory(res):
+            await job()
+
+        expected = n_expired * len(chats)
+        print(f"{n:>8} {n_expired:>8} {res['seconds']:>9.3f} {res['peak_mb']:>8.2f} {bans:>8} {expected:>8}")
+    await main.sender.close()
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--expired-ratio", type=float, default=0.1)
+    ap.add_argument("--ban-ms", type=float, default=0.0, help="soxta ban kechikishi (ms)")
+    ap.add_argument("--ban-rate", type=float, default=0.0, help="soxta bot limiti, so‘rov/s (0 — cheklovsiz)")
+    ap.add_argument("--chats", type=int, nargs=2, default=[-1001, -1002], metavar=("GROUP_ID", "CHANNEL_ID"))
+    ap.add_argument("--legacy", action="store_true", help="eski job_check_subs bilan solishtirish")
+    args = ap.parse_args()
+    asyncio.run(run(args.sizes, args.expired_ratio, args.ban_ms, args.ban_rate, args.chats, args.legacy))
+
+
+if __name__ == "__main__":
+    cli()
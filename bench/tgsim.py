@@ -0,0 +1,253 @@
+# bench/tgsim.py
+"""
+Telegram Bot API simulyatori (lokal HTTP): latency taqsimoti, 429
+(retry_after) va 5xx xatolar, har bir metod bo‘yicha hisoblagichlar.
+
+    python -m bench.tgsim --port 8081 --latency lognormal:60:0.5 --global-rate 30 --chat-rate 1
+    TELEGRAM_API_URL=http://127.0.0.1:8081 uvicorn app.api:app ...
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python -m bench.load ...
+
+    curl -s 127.0.0.1:8081/stats        # hisoblagichlar (JSON)
+    curl -s -X POST 127.0.0.1:8081/reset
+
+Latency: fixed:MS | uniform:MIN:MAX | exp:MEAN | lognormal:MEDIAN:SIGMA
+(ms). --method-latency bilan metod bo‘yicha: sendMessage=lognormal:80:0.6
+
+429 lar Telegram’dagidek: global (--global-rate, so‘rov/s) va chat
+bo‘yicha (--chat-rate, xabar/s) token bucket’lar, ustiga --p429 tasodifiy.
+Javoblar aiogram parse qila oladigan minimal obyektlar.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+from app.metrics import Histogram
+
+# chat bo‘yicha limitga tushadigan metodlar (xabar yuborish)
+CHAT_LIMITED = {"sendMessage", "sendDocument", "sendPhoto", "editMessageText"}
+
+
+# ------------------- latency -------------------
+def parse_latency(spec: str):
+    """ms’da qiymat qaytaradigan funksiya"""
+    kind, *args = spec.split(":")
+    a = [float(x) for x in args]
+    if kind == "fixed":
+        return lambda rnd: a[0]
+    if kind == "uniform":
+        return lambda rnd: rnd.uniform(a[0], a[1])
+    if kind == "exp":
+        return lambda rnd: rnd.expovariate(1 / a[0]) if a[0] else 0.0
+    if kind == "lognormal":
+        mu = math.log(a[0]) if a[0] > 0 else 0.0
+        return lambda rnd: rnd.lognormvariate(mu, a[1])
+    raise SystemExit(f"latency: noma’lum taqsimot {spec!r}")
+
+
+class Bucket:
+    def __init__(self, rate: float, now: float):
+        self.rate = rate
+        self.tokens = max(rate, 1.0)
+        self.ts = now
+
+    def take(self, now: float) -> float:
+        """0 — ruxsat, aks holda necha soniyadan keyin token bo‘ladi"""
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+# ------------------- javoblar -------------------
+def _int(v, default=0):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
+
+
+class FakeTelegram:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.delay = parse_latency(args.latency)
+        self.method_delay = {}
+        for item in args.method_latency or ():
+            name, _, spec = item.partition("=")
+            self.method_delay[name] = parse_latency(spec)
+        now = time.monotonic()
+        self.global_bucket = Bucket(args.global_rate, now) if args.global_rate else None
+        self.chat_buckets: dict[str, Bucket] = {}
+        self.msg_id = 0
+        self.link_id = 0
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.counters = defaultdict(lambda: defaultdict(int))
+        self.latency = defaultdict(Histogram)
+
+    # -- Bot API obyektlari --
+    def bot_user(self) -> dict:
+        return {"id": 1, "is_bot": True, "first_name": "SimBot", "username": "sim_bot"}
+
+    def user(self, uid) -> dict:
+        return {"id": _int(uid, 1), "is_bot": False, "first_name": "user"}
+
+    def message(self, chat_id, **extra) -> dict:
+        self.msg_id += 1
+        cid = _int(chat_id, 1)
+        chat = {"id": cid, "type": "private" if cid > 0 else "supergroup"}
+        if cid < 0:
+            chat["title"] = "chat"
+        return {"message_id": self.msg_id, "date": int(time.time()), "chat": chat, "from": self.bot_user(), **extra}
+
+    def result(self, method: str, p: dict):
+        if method == "getMe":
+            return self.bot_user()
+        if method in ("sendMessage", "editMessageText"):
+            return self.message(p.get("chat_id"), text=p.get("text", ""))
+        if method == "sendDocument":
+            return self.message(p.get("chat_id"), document={"file_id": "doc", "file_unique_id": "doc"})
+        if method == "createChatInviteLink":
+            self.link_id += 1
+            return {
+                "invite_link": f"https://t.me/+sim{self.link_id}",
+                "creator": self.bot_user(),
+                "creates_join_request": False, "is_primary": False, "is_revoked": False,
+                **({"member_limit": _int(p["member_limit"])} if p.get("member_limit") else {}),
+            }
+        if method == "getChatMember":
+            status = self.args.member_status
+            extra = {"until_date": 0} if status == "kicked" else {}
+            return {"status": status, "user": self.user(p.get("user_id")), **extra}
+        if method == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        # banChatMember, unbanChatMember, answerCallbackQuery, setWebhook, deleteWebhook, ...
+        return True
+
+    # -- xatolar --
+    def throttle(self, method: str, p: dict) -> float:
+        now = time.monotonic()
+        if self.global_bucket:
+            wait = self.global_bucket.take(now)
+            if wait:
+                return wait
+        if self.args.chat_rate and method in CHAT_LIMITED:
+            chat = str(p.get("chat_id"))
+            b = self.chat_buckets.get(chat)
+            if b is None:
+                b = self.chat_buckets[chat] = Bucket(self.args.chat_rate, now)
+            wait = b.take(now)
+            if wait:
+                return wait
+        if self.args.p429 and self.rnd.random() < self.args.p429:
+            return float(self.args.retry_after)
+        return 0.0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            p = await request.json()
+        else:
+            p = dict(await request.post())
+        c = self.counters[method]
+        c["calls"] += 1
+
+        lat = self.method_delay.get(method, self.delay)(self.rnd)
+        t0 = time.perf_counter()
+        if lat > 0:
+            await asyncio.sleep(lat / 1000)
+
+        wait = self.throttle(method, p)
+        if wait:
+            c["429"] += 1
+            # Telegram butun soniyalarda beradi
+            retry_after = max(int(math.ceil(wait)), 1)
+            body = {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }
+            status = 429
+        elif self.args.p5xx and self.rnd.random() < self.args.p5xx:
+            c["5xx"] += 1
+            status = self.rnd.choice((500, 502))
+            body = {"ok": False, "error_code": status, "description": "Internal Server Error"}
+        else:
+            c["ok"] += 1
+            status = 200
+            body = {"ok": True, "result": self.result(method, p)}
+
+        self.latency[method].observe(time.perf_counter() - t0)
+        return web.json_response(body, status=status)
+
+    def stats(self) -> dict:
+        out = {}
+        for method, c in sorted(self.counters.items()):
+            snap = self.latency[method].snapshot()
+            snap.pop("buckets")
+            snap.pop("count")
+            out[method] = {**c, **snap}
+        return {"uptime_s": round(time.time() - self.started, 1), "methods": out}
+
+
+def make_app(sim: FakeTelegram) -> web.Application:
+    async def stats(request):
+        return web.json_response(sim.stats())
+
+    async def reset(request):
+        sim.reset()
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_get("/stats", stats)
+    app.router.add_post("/reset", reset)
+    app.router.add_route("*", "/bot{token}/{method}", sim.handle)
+    return app
+
+
+async def run(args):
+    sim = FakeTelegram(args)
+    runner = web.AppRunner(make_app(sim), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Bot API simulator: http://{args.host}:{args.port} (TELEGRAM_API_URL)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        print(json.dumps(sim.stats(), indent=2))
+        await runner.cleanup()
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", default="lognormal:40:0.5", help="ms: fixed:50 | uniform:20:80 | exp:40 | lognormal:40:0.5")
+    ap.add_argument("--method-latency", nargs="*", help="sendMessage=lognormal:80:0.6 ...")
+    ap.add_argument("--global-rate", type=float, default=30.0, help="so‘rov/s, 0 — cheklovsiz")
+    ap.add_argument("--chat-rate", type=float, default=1.0, help="bitta chatga xabar/s, 0 — cheklovsiz")
+    ap.add_argument("--p429", type=float, default=0.0, help="tasodifiy 429 ehtimoli")
+    ap.add_argument("--retry-after", type=int, default=3, help="tasodifiy 429 dagi retry_after, s")
+    ap.add_argument("--p5xx", type=float, default=0.0, help="tasodifiy 500/502 ehtimoli")
+    ap.add_argument("--member-status", default="member", choices=("member", "left", "kicked"),
+                    help="getChatMember javobi")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    cli()
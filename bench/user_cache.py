@@ -0,0 +1,78 @@
+# bench/user_cache.py
+"""
+ensure_user / get_user_by_pay_code keshi: bitta update’ga nechta DB so‘rovi.
+
+    DATABASE_URL=... python -m bench.user_cache --users 20000 --updates 50000
+
+Faollik notekis (kam sonli user ko‘p bosadi) — Pareto taqsimoti bilan.
+"""
+import argparse
+import asyncio
+import random
+
+from sqlalchemy import event
+
+from bench._common import reset_tables, bulk_insert, timer
+
+from app.cache import user_cache
+from app.database import engine
+from app.models import User
+from app.services import ensure_user, get_user_by_pay_code
+
+_queries = {"n": 0}
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    _queries["n"] += 1
+
+
+def pick_users(n_users: int, n_updates: int, seed: int = 1):
+    rnd = random.Random(seed)
+    return [min(int(rnd.paretovariate(1.2)) - 1, n_users - 1) for _ in range(n_updates)]
+
+
+async def run(n_users: int, n_updates: int, webhook_share: float):
+    await reset_tables("users")
+    await bulk_insert(User.__table__, (
+        {"tg_id": 5_000_000 + i, "pay_code": str(10_000_000 + i)} for i in range(n_users)
+    ))
+    picks = pick_users(n_users, n_updates)
+
+    print(f"{'mode':>8} {'updates':>8} {'queries':>8} {'q/update':>9} {'seconds':>8} {'hit_ratio':>9}")
+    for mode in ("no-cache", "cache"):
+        user_cache.clear()
+        user_cache.by_tg.hits = user_cache.by_tg.misses = 0
+        user_cache.by_code.hits = user_cache.by_code.misses = 0
+        _queries["n"] = 0
+        # har rejim bir xil so‘rovlar aralashmasini ko‘radi
+        rnd = random.Random(2)
+        res = {}
+        with timer(res):
+            for i in picks:
+                if mode == "no-cache":
+                    user_cache.clear()
+                if rnd.random() < webhook_share:
+                    await get_user_by_pay_code(str(10_000_000 + i))
+                else:
+                    await ensure_user(5_000_000 + i)
+        st = user_cache.stats()
+        hits = st["by_tg_id"]["hits"] + st["by_pay_code"]["hits"]
+        total = hits + st["by_tg_id"]["misses"] + st["by_pay_code"]["misses"]
+        print(
+            f"{mode:>8} {n_updates:>8} {_queries['n']:>8} {_queries['n'] / n_updates:>9.3f} "
+            f"{res['seconds']:>8.2f} {hits / total if total else 0:>9.3f}"
+        )
+
+
+def cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20_000)
+    ap.add_argument("--updates", type=int, default=50_000)
+    ap.add_argument("--webhook-share", type=float, default=0.1, help="pay_code bo‘yicha qidiruv ulushi")
+    args = ap.parse_args()
+    asyncio.run(run(args.users, args.updates, args.webhook_share))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,23 @@
+import asyncio
+import os
+
+import pytest
+
+# app.main import’da Bot(BOT_TOKEN) yaratadi; testlar Telegram’ga murojaat qilmaydi
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+
+# requires_db bilan belgilangan testlar (tests/test_*.py) haqiqiy Postgres talab qiladi: DATABASE_URL=... pytest
+requires_db = pytest.mark.skipif(not os.getenv("DATABASE_URL"), reason="DATABASE_URL yo‘q")
+
+
+def run_db(coro_fn):
+    """Har test o‘z event loop’ida: oxirida pool yopiladi (ulanishlar loop’ga bog‘langan)"""
+    from app.database import engine
+
+    async def main():
+        try:
+            return await coro_fn()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
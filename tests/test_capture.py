@@ -0,0 +1,18 @@
+from app.capture import Pseudonymizer, sanitize_update
+
+
+def _callback(data: str) -> dict:
+    return {"update_id": 1, "callback_query": {"id": "1", "from": {"id": 5}, "data": data}}
+
+
+def test_payments_browser_tg_id_is_pseudonymized():
+    p = Pseudonymizer(b"salt")
+    out = sanitize_update(_callback("pb:n:0:payme:success:123456789"), p)["callback_query"]
+    assert out["data"] == f"pb:n:0:payme:success:{p.user_id(123456789)}"
+    assert "123456789" not in out["data"]
+
+
+def test_other_callback_data_is_kept():
+    p = Pseudonymizer(b"salt")
+    for data in ("pb:n:0:::", "plan:30"):
+        assert sanitize_update(_callback(data), p)["callback_query"]["data"] == data
@@ -0,0 +1,109 @@
+import itertools
+import time
+
+import pytest
+
+from tests.conftest import requires_db, run_db
+
+pytestmark = requires_db
+
+_ids = itertools.count(int(time.time() * 1000) % 10**9)
+
+
+def _ext(prefix: str) -> str:
+    return f"test-{prefix}-{next(_ids)}"
+
+
+async def _setup_txn(ext_id: str, tg_id: int):
+    from app.migrations import run_migrations
+    from app.services import ensure_user, upsert_subscription, get_or_create_txn
+
+    await run_migrations()
+    await ensure_user(tg_id)
+    await upsert_subscription(tg_id, 30)
+    await get_or_create_txn("click", ext_id, tg_id, 30, 50000)
+
+
+async def _count(sql: str, ext_id: str) -> int:
+    from sqlalchemy import text
+    from app.database import engine
+
+    async with engine.connect() as conn:
+        return await conn.scalar(text(sql), {"e": ext_id})
+
+
+def test_repeat_returns_stored_result_without_writes():
+    from app.services import complete_payment
+
+    async def main():
+        ext, tg = _ext("repeat"), 800_000_000 + next(_ids) % 10**6
+        await _setup_txn(ext, tg)
+        first = await complete_payment("click", ext)
+        again = await complete_payment("click", ext)
+        assert first.ok and again == first
+        assert await _count("SELECT count(*) FROM payments WHERE ext_id = :e", ext) == 1
+        assert await _count("SELECT count(*) FROM invite_outbox WHERE ext_id = :e", ext) == 1
+
+    run_db(main)
+
+
+def test_performed_txn_without_stored_expiry():
+    """m007’dan oldin yakunlangan txn: expires_at NULL — cancelled emas"""
+    from sqlalchemy import update, select
+    from app.database import Session
+    from app.models import Txn, Subscription
+    from app.services import complete_payment
+
+    async def main():
+        ext, tg = _ext("legacy"), 800_000_000 + next(_ids) % 10**6
+        await _setup_txn(ext, tg)
+        async with Session() as s:
+            await s.execute(
+                update(Txn).where(Txn.provider == "click", Txn.ext_id == ext)
+                .values(state="performed", expires_at=None)
+            )
+            await s.commit()
+            sub_expires = await s.scalar(select(Subscription.expires_at).where(Subscription.tg_id == tg))
+
+        done = await complete_payment("click", ext)
+        assert done.state == "performed"
+        assert done.expires_at == sub_expires
+        assert await _count("SELECT count(*) FROM payments WHERE ext_id = :e", ext) == 0
+
+    run_db(main)
+
+
+@pytest.mark.parametrize("state", ["cancelled", "missing"])
+def test_not_completable(state):
+    from app.services import complete_payment, cancel_txn
+
+    async def main():
+        ext, tg = _ext(state), 800_000_000 + next(_ids) % 10**6
+        if state == "cancelled":
+            await _setup_txn(ext, tg)
+            await cancel_txn("click", ext, None)
+        else:
+            from app.migrations import run_migrations
+            await run_migrations()
+        done = await complete_payment("click", ext)
+        assert done.state == state and not done.ok
+        assert await _count("SELECT count(*) FROM payments WHERE ext_id = :e", ext) == 0
+
+    run_db(main)
+
+
+def test_refund_stops_pending_invite():
+    from app.config import INVITE_MAX_ATTEMPTS
+    from app.services import complete_payment, cancel_txn
+
+    async def main():
+        ext, tg = _ext("refund"), 800_000_000 + next(_ids) % 10**6
+        await _setup_txn(ext, tg)
+        assert (await complete_payment("click", ext)).ok
+        await cancel_txn("click", ext, 5)
+        assert await _count(
+            "SELECT count(*) FROM invite_outbox WHERE ext_id = :e AND delivered_at IS NULL"
+            f" AND attempts < {INVITE_MAX_ATTEMPTS}", ext,
+        ) == 0
+
+    run_db(main)
@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("tz, ok", [
+    ("Asia/Tashkent", True), ("UTC", True), ("Asia/Tashknet", False), ("../etc", False),
+])
+def test_stats_tz_is_validated_at_import(tz, ok):
+    env = {**os.environ, "STATS_TZ": tz}
+    res = subprocess.run(
+        [sys.executable, "-c", "import app.config"], env=env, capture_output=True, text=True
+    )
+    assert (res.returncode == 0) == ok, res.stderr
+    if not ok:
+        assert "STATS_TZ" in res.stderr
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from tests.conftest import requires_db, run_db
+
+
+def test_queue_pool_internals_used_by_timed_pool():
+    # TimedQueuePool private API’ga tayanadi — SQLAlchemy yangilansa shu yerda yiqiladi
+    assert callable(getattr(AsyncAdaptedQueuePool, "_do_get", None))
+    pool = AsyncAdaptedQueuePool(lambda: None, pool_size=1, max_overflow=0)
+    for attr in ("_max_overflow", "_overflow", "_pool"):
+        assert hasattr(pool, attr), attr
+    assert callable(getattr(pool._pool, "empty", None))
+
+
+@requires_db
+def test_timed_pool_counts_waits_and_timeouts():
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.database import DATABASE_URL, TimedQueuePool, pool_metrics
+
+    async def main():
+        eng = create_async_engine(
+            DATABASE_URL, poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.2,
+        )
+        before = (pool_metrics.checkout.snapshot()["count"], pool_metrics.waits, pool_metrics.timeouts)
+        try:
+            async with eng.connect():
+                with pytest.raises(exc.TimeoutError):
+                    async with eng.connect():
+                        pass
+        finally:
+            await eng.dispose()
+        count, waits, timeouts = pool_metrics.checkout.snapshot()["count"], pool_metrics.waits, pool_metrics.timeouts
+        assert count >= before[0] + 2
+        assert waits == before[1] + 1
+        assert timeouts == before[2] + 1
+
+    run_db(main)
@@ -0,0 +1,54 @@
+import asyncio
+import random
+
+import pytest
+
+from tests.conftest import requires_db, run_db
+
+pytestmark = requires_db
+
+
+@pytest.mark.parametrize("narrow", [False, True])
+def test_parallel_start_one_pay_code_per_user(monkeypatch, narrow):
+    """Parallel /start: har user’ga bitta pay_code, dubl yoki unique xatosi yo‘q"""
+    from sqlalchemy import func, select
+    from app import services
+    from app.cache import user_cache
+    from app.database import Session
+    from app.migrations import run_migrations
+    from app.models import User
+
+    n_users, repeat = 200, 3
+    base_tg = 810_000_000 + random.randrange(10**6) * 1000
+    if narrow:
+        # to‘qnashuvlarni majburlash: har run o‘z tor oralig‘ida
+        base_code = random.randrange(10_000_000, 99_000_000)
+        monkeypatch.setattr(
+            services, "gen_pay_code", lambda: str(base_code + random.randrange(n_users * 4))
+        )
+
+    async def start(tg_id):
+        # har bir chaqiruv DB’ga borsin
+        user_cache.by_tg.pop(tg_id)
+        return await services.ensure_user(tg_id)
+
+    async def main():
+        await run_migrations()
+        tg_ids = [base_tg + i for i in range(n_users)] * repeat
+        random.shuffle(tg_ids)
+        users = await asyncio.gather(*(start(t) for t in tg_ids))
+
+        codes: dict[int, set] = {}
+        for u in users:
+            codes.setdefault(u.tg_id, set()).add(u.pay_code)
+        assert all(len(c) == 1 for c in codes.values())
+        assert len({next(iter(c)) for c in codes.values()}) == n_users
+
+        async with Session() as s:
+            rows, distinct = (await s.execute(
+                select(func.count(), func.count(func.distinct(User.pay_code)))
+                .where(User.tg_id.between(base_tg, base_tg + n_users - 1))
+            )).one()
+        assert rows == distinct == n_users
+
+    run_db(main)
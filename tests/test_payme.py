@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from tests.conftest import requires_db, run_db
+
+pytestmark = requires_db
+
+
+def test_create_replay_is_revalidated():
+    from app import payme
+    from app.migrations import run_migrations
+    from app.services import ensure_user
+
+    async def main():
+        await run_migrations()
+        u = await ensure_user(800_100_001)
+        other = await ensure_user(800_100_002)
+        params = {
+            "id": f"test-create-{time.time_ns()}", "time": int(time.time() * 1000),
+            "amount": 50_000 * 100, "account": {"pay_code": u.pay_code},
+        }
+        first = await payme.create_transaction(params, strict=False)
+        assert await payme.create_transaction(params, strict=False) == first
+
+        for bad, code in (
+            ({"amount": 20_000 * 100}, -31001),
+            ({"account": {"pay_code": other.pay_code}}, -31050),
+        ):
+            with pytest.raises(payme.PaymeError) as e:
+                await payme.create_transaction({**params, **bad}, strict=False)
+            assert e.value.code == code
+
+    run_db(main)
+
+
+def test_cancel_with_bad_reason_is_rpc_error():
+    from app import payme
+
+    async def main():
+        req = {"id": 7, "method": "CancelTransaction", "params": {"id": "x", "reason": "abc"}}
+        res = await payme.dispatch(req, strict=False)
+        assert res["error"]["code"] == -32600 and res["error"]["data"] == "reason"
+
+    run_db(main)
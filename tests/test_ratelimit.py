@@ -0,0 +1,43 @@
+from app.ratelimit import IpAllowlist, RateLimiter
+
+
+def test_exact_ipv6_matches_any_spelling():
+    al = IpAllowlist("2001:DB8::1, 203.0.113.7")
+    assert al.allows("2001:db8::1")
+    assert al.allows("2001:DB8::1")
+    assert al.allows("2001:0db8:0000:0000:0000:0000:0000:0001")
+    assert al.allows(" 2001:0DB8::0001 ")
+    assert not al.allows("2001:db8::2")
+
+
+def test_exact_ipv4_and_mapped():
+    al = IpAllowlist("203.0.113.7")
+    assert al.allows("203.0.113.7")
+    assert al.allows("::ffff:203.0.113.7")
+    assert not al.allows("203.0.113.8")
+
+
+def test_ranges():
+    al = IpAllowlist("10.0.0.0/8, 2001:db8::/32")
+    assert al.allows("10.1.2.3")
+    assert al.allows("2001:0DB8:ffff::1")
+    assert not al.allows("11.0.0.1")
+    assert not al.allows("2001:db9::1")
+
+
+def test_garbage_is_rejected():
+    al = IpAllowlist("10.0.0.0/8, 2001:db8::1")
+    for ip in ("", "unknown", "10.0.0", "2001:db8::zz", "10.0.0.1, 10.0.0.2"):
+        assert not al.allows(ip)
+    assert not IpAllowlist("")
+
+
+def test_idle_keys_are_evicted():
+    rl = RateLimiter(40, 60, now=0.0)
+    for i in range(100):
+        rl.allow(f"10.0.0.{i}", 1.0)
+    assert len(rl) == 100
+    rl.allow("10.0.1.1", 61.0)
+    assert len(rl) == 101   # bir oyna: eski avlodda hali bor
+    rl.allow("10.0.1.1", 122.0)
+    assert len(rl) == 1
@@ -0,0 +1,35 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from tests.conftest import requires_db, run_db
+
+pytestmark = requires_db
+
+
+def test_parallel_renewals_lose_no_days():
+    """Bitta user’ga bir vaqtda kelgan to‘lovlar: har biri o‘z kunlarini qo‘shadi"""
+    from sqlalchemy import delete
+    from app.database import Session
+    from app.migrations import run_migrations
+    from app.models import Subscription
+    from app.services import extend_subscription
+
+    parallel, days = 50, 30
+    tg_id = 820_000_000 + random.randrange(10**6)
+
+    async def main():
+        await run_migrations()
+        start = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+        async with Session() as s:
+            await s.execute(delete(Subscription).where(Subscription.tg_id == tg_id))
+            s.add(Subscription(tg_id=tg_id, expires_at=start, active=True))
+            await s.commit()
+
+        await asyncio.gather(*(extend_subscription(tg_id, days) for _ in range(parallel)))
+
+        async with Session() as s:
+            got = (await s.get(Subscription, tg_id)).expires_at
+        assert got == start + timedelta(days=days * parallel)
+
+    run_db(main)
@@ -0,0 +1,56 @@
+import random
+from datetime import datetime, timedelta
+
+from tests.conftest import requires_db, run_db
+
+pytestmark = requires_db
+
+
+class FlakySender:
+    """ban_chat_member: `failing` dagilar uchun xato, qolganlar — muvaffaqiyat"""
+
+    def __init__(self, failing):
+        self.failing = set(failing)
+        self.banned = set()
+
+    async def ban_chat_member(self, chat_id, user_id, **kwargs):
+        if user_id in self.failing:
+            raise RuntimeError("ban failed")
+        self.banned.add(user_id)
+        return True
+
+
+def test_failed_kick_is_retried_next_sweep(monkeypatch):
+    from app import main
+    from app.database import Session
+    from app.migrations import run_migrations
+    from app.models import Subscription
+
+    ok_id = 830_000_000 + random.randrange(10**6) * 2
+    bad_id = ok_id + 1
+
+    async def active(tg_id):
+        async with Session() as s:
+            return (await s.get(Subscription, tg_id)).active
+
+    async def sweep_twice():
+        await run_migrations()
+        past = datetime.utcnow() - timedelta(hours=1)
+        async with Session() as s:
+            for tg_id in (ok_id, bad_id):
+                await s.merge(Subscription(tg_id=tg_id, expires_at=past, active=True))
+            await s.commit()
+
+        flaky = FlakySender([bad_id])
+        monkeypatch.setattr(main, "sender", flaky)
+        monkeypatch.setattr(main, "GROUP_ID", -1001)
+        monkeypatch.setattr(main, "CHANNEL_ID", -1002)
+        await main.job_check_subs()
+        assert ok_id in flaky.banned and not await active(ok_id)
+        assert await active(bad_id)  # kick kutilmoqda
+
+        flaky.failing.clear()
+        await main.job_check_subs()
+        assert bad_id in flaky.banned and not await active(bad_id)
+
+    run_db(sweep_twice)